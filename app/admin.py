@@ -6,7 +6,7 @@ users, devices, potholes, and alerts.
 """
 
 from django.contrib import admin
-from .models import User, IOTDevice, Pothole, Alert
+from .models import User, IOTDevice, Pothole, Alert, VideoStream, StreamNode
 
 
 @admin.register(User)
@@ -66,10 +66,10 @@ class PotholeAdmin(admin.ModelAdmin):
     """
     Admin configuration for Pothole model.
     """
-    list_display = ['id', 'severity', 'status', 'depth', 'device', 'user', 'detected_at']
+    list_display = ['id', 'severity', 'status', 'depth', 'sighting_count', 'device', 'user', 'detected_at', 'last_seen_at']
     list_filter = ['severity', 'status', 'detected_at']
     search_fields = ['id', 'address']
-    readonly_fields = ['id', 'detected_at']
+    readonly_fields = ['id', 'detected_at', 'sighting_count', 'last_seen_at']
     
     fieldsets = (
         ('Pothole Information', {
@@ -81,6 +81,9 @@ class PotholeAdmin(admin.ModelAdmin):
         ('Location', {
             'fields': ('latitude', 'longitude', 'address')
         }),
+        ('Sightings', {
+            'fields': ('sighting_count', 'last_seen_at')
+        }),
         ('Timestamps', {
             'fields': ('detected_at',),
             'classes': ('collapse',)
@@ -111,6 +114,42 @@ class AlertAdmin(admin.ModelAdmin):
         }),
     )
 
+@admin.register(VideoStream)
+class VideoStreamAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for VideoStream model (STREAM_SHARDING).
+    """
+    list_display = ['stream_id', 'video_source', 'frame_interval', 'lease_owner', 'lease_expires_at', 'created_at']
+    list_filter = ['lease_owner', 'created_at']
+    search_fields = ['stream_id', 'video_source']
+    readonly_fields = ['id', 'created_at', 'lease_owner', 'lease_expires_at', 'status']
+    
+    fieldsets = (
+        ('Stream Information', {
+            'fields': ('stream_id', 'video_source', 'detection_api_url', 'frame_interval')
+        }),
+        ('Associations', {
+            'fields': ('device_id', 'user_id')
+        }),
+        ('Lease', {
+            'fields': ('lease_owner', 'lease_expires_at', 'status')
+        }),
+        ('Timestamps', {
+            'fields': ('created_at',),
+            'classes': ('collapse',)
+        }),
+    )
+
+
+@admin.register(StreamNode)
+class StreamNodeAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for StreamNode model.
+    """
+    list_display = ['node_id', 'capacity', 'stream_count', 'heartbeat_at', 'started_at']
+    search_fields = ['node_id']
+    readonly_fields = ['node_id', 'stream_count', 'heartbeat_at', 'started_at']
+
 # Custom Admin for API Visibility
 class LoginAPI(User):
     """
@@ -0,0 +1,61 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs a stream node: claims a share of the VideoStream rows through database "
+        "leases (STREAM_SHARDING) and runs those streams in this process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--node-id',
+            default=getattr(settings, 'STREAM_NODE_ID', ''),
+            help='Node identifier (default: settings.STREAM_NODE_ID, else hostname:pid)',
+        )
+        parser.add_argument(
+            '--capacity',
+            type=int,
+            default=getattr(settings, 'STREAM_NODE_CAPACITY', 50),
+            help='Maximum number of streams on this node; also its share of new streams',
+        )
+        parser.add_argument(
+            '--lease',
+            type=float,
+            default=getattr(settings, 'STREAM_LEASE_S', 30.0),
+            help='Lease period in seconds; heartbeats run every third of it',
+        )
+
+    def handle(self, *args, **options):
+        from app.utils.frame_queue import init_frame_queue, shutdown_frame_queue
+        from app.utils.stream_shard import StreamNodeAgent
+
+        if options['capacity'] < 1:
+            raise CommandError("--capacity must be at least 1")
+        if options['lease'] <= 0:
+            raise CommandError("--lease must be positive")
+
+        agent = StreamNodeAgent(
+            node_id=options['node_id'] or None,
+            capacity=options['capacity'],
+            lease_s=options['lease'],
+        )
+        init_frame_queue()
+        agent.start()
+        self.stdout.write(self.style.SUCCESS(
+            f"Stream node {agent.node_id} running (capacity {agent.capacity}, lease {agent.lease_s:g}s)"
+        ))
+
+        stopping = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stopping.set())
+        stopping.wait()
+
+        self.stdout.write("Releasing streams...")
+        agent.stop()
+        shutdown_frame_queue()
+        self.stdout.write(self.style.SUCCESS(f"Stream node {agent.node_id} stopped"))
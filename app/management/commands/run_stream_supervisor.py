@@ -0,0 +1,50 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the stream supervisor: owns all video streams, the frame queue and capture "
+        "workers, and serves web workers over the STREAM_SUPERVISOR_SOCKET Unix socket."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--socket',
+            default=getattr(settings, 'STREAM_SUPERVISOR_SOCKET', ''),
+            help='Unix socket path to listen on (default: settings.STREAM_SUPERVISOR_SOCKET)',
+        )
+
+    def handle(self, *args, **options):
+        from app.utils.frame_queue import init_frame_queue, shutdown_frame_queue
+        from app.utils.stream_supervisor import SupervisorServer
+        from app.utils.video_processor import get_all_streams_status, stop_video_stream
+
+        socket_path = options['socket']
+        if not socket_path:
+            raise CommandError("Set STREAM_SUPERVISOR_SOCKET or pass --socket")
+
+        try:
+            server = SupervisorServer(socket_path)
+        except (RuntimeError, OSError) as e:
+            raise CommandError(str(e))
+
+        init_frame_queue()
+        server.serve_in_thread()
+        self.stdout.write(self.style.SUCCESS(f"Stream supervisor listening on {socket_path}"))
+
+        stopping = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stopping.set())
+        stopping.wait()
+
+        self.stdout.write("Stopping streams...")
+        server.shutdown()
+        for stream_id in list(get_all_streams_status()):
+            stop_video_stream(stream_id)
+        shutdown_frame_queue()
+        server.server_close()
+        self.stdout.write(self.style.SUCCESS("Stream supervisor stopped"))
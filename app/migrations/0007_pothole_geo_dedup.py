@@ -0,0 +1,55 @@
+# Generated by Django 4.2.27 on 2026-10-16 19:28
+
+from django.db import migrations, models
+
+
+def backfill_geo_fields(apps, schema_editor):
+    from app.utils.geo import geo_cell
+
+    Pothole = apps.get_model('app', 'Pothole')
+    for pothole in Pothole.objects.only('id', 'latitude', 'longitude', 'detected_at').iterator():
+        Pothole.objects.filter(pk=pothole.pk).update(
+            geo_cell=geo_cell(pothole.latitude, pothole.longitude),
+            last_seen_at=pothole.detected_at,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_iotdevice_esp_ip_iotdevice_last_latitude_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeoCellLock',
+            fields=[
+                ('cell', models.BigIntegerField(help_text='Lat/lon grid cell id', primary_key=True, serialize=False)),
+            ],
+            options={
+                'verbose_name': 'Geo Cell Lock',
+                'verbose_name_plural': 'Geo Cell Locks',
+                'db_table': 'geo_cell_locks',
+            },
+        ),
+        migrations.AddField(
+            model_name='pothole',
+            name='geo_cell',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='Lat/lon grid cell used for proximity lookups', null=True),
+        ),
+        migrations.AddField(
+            model_name='pothole',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, help_text='Most recent detection timestamp', null=True),
+        ),
+        migrations.AddField(
+            model_name='pothole',
+            name='sighting_count',
+            field=models.PositiveIntegerField(default=1, help_text='Number of times this pothole was detected'),
+        ),
+        migrations.AddIndex(
+            model_name='pothole',
+            index=models.Index(fields=['status', 'geo_cell'], name='potholes_status_geo_cell_idx'),
+        ),
+        migrations.RunPython(backfill_geo_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.27 on 2026-10-16 19:50
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_pothole_geo_dedup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StreamNode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('node_id', models.CharField(help_text='Node identifier (default hostname:pid)', max_length=200, unique=True)),
+                ('capacity', models.PositiveIntegerField(default=50, help_text='Maximum number of streams; also the hashing weight')),
+                ('stream_count', models.PositiveIntegerField(default=0, help_text='Streams held at the last heartbeat')),
+                ('started_at', models.DateTimeField(auto_now_add=True, help_text='Node start timestamp')),
+                ('heartbeat_at', models.DateTimeField(help_text='Last heartbeat timestamp')),
+            ],
+            options={
+                'verbose_name': 'Stream Node',
+                'verbose_name_plural': 'Stream Nodes',
+                'db_table': 'stream_nodes',
+                'ordering': ['node_id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='VideoStream',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stream_id', models.CharField(help_text='Unique identifier for the stream', max_length=200, unique=True)),
+                ('video_source', models.CharField(help_text='RTSP/HTTP URL or file path', max_length=1000)),
+                ('detection_api_url', models.CharField(help_text="Detection endpoint used in 'http' detection mode", max_length=500)),
+                ('frame_interval', models.FloatField(default=30, help_text='Seconds between sampled frames', validators=[django.core.validators.MinValueValidator(0.0)])),
+                ('device_id', models.IntegerField(blank=True, help_text='Device credited with detections', null=True)),
+                ('user_id', models.IntegerField(blank=True, help_text='User credited with detections', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Stream creation timestamp')),
+                ('lease_owner', models.CharField(blank=True, db_index=True, default='', help_text="Node running the stream ('' = unassigned)", max_length=200)),
+                ('lease_expires_at', models.DateTimeField(blank=True, help_text="Lease expiry; renewed by the owner's heartbeat", null=True)),
+                ('status', models.JSONField(blank=True, default=dict, help_text='Stream status last published by the owner')),
+            ],
+            options={
+                'verbose_name': 'Video Stream',
+                'verbose_name_plural': 'Video Streams',
+                'db_table': 'video_streams',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-16 20:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_stream_sharding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='iotdevice',
+            name='last_location_at',
+            field=models.DateTimeField(blank=True, help_text='When the last GPS fix was received', null=True),
+        ),
+    ]
@@ -48,6 +48,7 @@ class IOTDevice(models.Model):
     # Live tracking fields
     last_latitude = models.FloatField(default=0.0, validators=[MinValueValidator(-90.0), MaxValueValidator(90.0)])
     last_longitude = models.FloatField(default=0.0, validators=[MinValueValidator(-180.0), MaxValueValidator(180.0)])
+    last_location_at = models.DateTimeField(blank=True, null=True, help_text="When the last GPS fix was received")
     esp_ip = models.GenericIPAddressField(blank=True, null=True, help_text="Current IP of the ESP8266/ESP32")
     
     class Meta:
@@ -88,15 +89,99 @@ class Pothole(models.Model):
     latitude = models.FloatField(validators=[MinValueValidator(-90.0), MaxValueValidator(90.0)], help_text="Latitude coordinate")
     longitude = models.FloatField(validators=[MinValueValidator(-180.0), MaxValueValidator(180.0)], help_text="Longitude coordinate")
     address = models.CharField(max_length=500, blank=True, null=True, help_text="Human-readable address")
+    geo_cell = models.BigIntegerField(null=True, blank=True, editable=False, help_text="Lat/lon grid cell used for proximity lookups")
+    
+    # Repeat detections of the same hole are merged into this row
+    sighting_count = models.PositiveIntegerField(default=1, help_text="Number of times this pothole was detected")
+    last_seen_at = models.DateTimeField(blank=True, null=True, help_text="Most recent detection timestamp")
     
     class Meta:
         db_table = 'potholes'
         verbose_name = 'Pothole'
         verbose_name_plural = 'Potholes'
         ordering = ['-detected_at']
+        indexes = [
+            models.Index(fields=['status', 'geo_cell'], name='potholes_status_geo_cell_idx'),
+        ]
     
     def __str__(self):
         return f"Pothole {self.id} - {self.severity} severity"
+    
+    def save(self, *args, **kwargs):
+        from .utils.geo import geo_cell
+        if self.latitude is not None and self.longitude is not None:
+            self.geo_cell = geo_cell(self.latitude, self.longitude)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and ({'latitude', 'longitude'} & set(update_fields)):
+                kwargs['update_fields'] = set(update_fields) | {'geo_cell'}
+        super().save(*args, **kwargs)
+
+
+class GeoCellLock(models.Model):
+    """
+    One row per lat/lon grid cell that has seen a pothole report. Merge-on-write
+    locks the rows around a point so two first sightings of the same hole
+    cannot both insert a new Pothole.
+    """
+    cell = models.BigIntegerField(primary_key=True, help_text="Lat/lon grid cell id")
+
+    class Meta:
+        db_table = 'geo_cell_locks'
+        verbose_name = 'Geo Cell Lock'
+        verbose_name_plural = 'Geo Cell Locks'
+
+    def __str__(self):
+        return f"Cell {self.cell}"
+
+
+class VideoStream(models.Model):
+    """
+    Stream definition for multi-node sharding (STREAM_SHARDING).
+
+    Stream nodes claim rows through the lease fields and renew them on every
+    heartbeat; an expired lease lets another node take the stream over.
+    """
+    stream_id = models.CharField(max_length=200, unique=True, help_text="Unique identifier for the stream")
+    video_source = models.CharField(max_length=1000, help_text="RTSP/HTTP URL or file path")
+    detection_api_url = models.CharField(max_length=500, help_text="Detection endpoint used in 'http' detection mode")
+    frame_interval = models.FloatField(default=30, validators=[MinValueValidator(0.0)], help_text="Seconds between sampled frames")
+    device_id = models.IntegerField(blank=True, null=True, help_text="Device credited with detections")
+    user_id = models.IntegerField(blank=True, null=True, help_text="User credited with detections")
+    created_at = models.DateTimeField(auto_now_add=True, help_text="Stream creation timestamp")
+
+    # Lease held by the node currently running the stream
+    lease_owner = models.CharField(max_length=200, blank=True, default='', db_index=True, help_text="Node running the stream ('' = unassigned)")
+    lease_expires_at = models.DateTimeField(blank=True, null=True, help_text="Lease expiry; renewed by the owner's heartbeat")
+    status = models.JSONField(default=dict, blank=True, help_text="Stream status last published by the owner")
+
+    class Meta:
+        db_table = 'video_streams'
+        verbose_name = 'Video Stream'
+        verbose_name_plural = 'Video Streams'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Stream {self.stream_id} ({self.lease_owner or 'unassigned'})"
+
+
+class StreamNode(models.Model):
+    """
+    A `run_stream_node` process; live while its heartbeat is younger than one lease period.
+    """
+    node_id = models.CharField(max_length=200, unique=True, help_text="Node identifier (default hostname:pid)")
+    capacity = models.PositiveIntegerField(default=50, help_text="Maximum number of streams; also the hashing weight")
+    stream_count = models.PositiveIntegerField(default=0, help_text="Streams held at the last heartbeat")
+    started_at = models.DateTimeField(auto_now_add=True, help_text="Node start timestamp")
+    heartbeat_at = models.DateTimeField(help_text="Last heartbeat timestamp")
+
+    class Meta:
+        db_table = 'stream_nodes'
+        verbose_name = 'Stream Node'
+        verbose_name_plural = 'Stream Nodes'
+        ordering = ['node_id']
+
+    def __str__(self):
+        return f"Node {self.node_id} ({self.stream_count}/{self.capacity})"
 
 
 class Alert(models.Model):
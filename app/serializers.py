@@ -59,6 +59,7 @@ class IOTDeviceSerializer(serializers.ModelSerializer):
     ownerId = serializers.PrimaryKeyRelatedField(source='owner', queryset=User.objects.all())
     lastLatitude = serializers.FloatField(source='last_latitude', read_only=True)
     lastLongitude = serializers.FloatField(source='last_longitude', read_only=True)
+    lastLocationAt = serializers.DateTimeField(source='last_location_at', read_only=True)
     espIp = serializers.IPAddressField(source='esp_ip', read_only=True)
     
     class Meta:
@@ -66,7 +67,7 @@ class IOTDeviceSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'deviceType', 'macId', 'status',
             'registeredAt', 'registeredBy', 'ownerId',
-            'lastLatitude', 'lastLongitude', 'espIp'
+            'lastLatitude', 'lastLongitude', 'lastLocationAt', 'espIp'
         ]
         read_only_fields = ['id', 'registeredAt']
     
@@ -103,6 +104,8 @@ class PotholeSerializer(serializers.ModelSerializer):
     deviceId = serializers.PrimaryKeyRelatedField(source='device', queryset=IOTDevice.objects.all())
     userId = serializers.PrimaryKeyRelatedField(source='user', queryset=User.objects.all())
     detectedAt = serializers.DateTimeField(source='detected_at', read_only=True)
+    sightingCount = serializers.IntegerField(source='sighting_count', read_only=True)
+    lastSeenAt = serializers.DateTimeField(source='last_seen_at', read_only=True)
     # image field will automatically be handled by ImageField in ModelSerializer
     
     # Location as nested object for better API structure
@@ -113,9 +116,10 @@ class PotholeSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'deviceId', 'userId', 'depth', 'severity',
             'image', 'detectedAt', 'status',
-            'latitude', 'longitude', 'address', 'location'
+            'latitude', 'longitude', 'address', 'location',
+            'sightingCount', 'lastSeenAt'
         ]
-        read_only_fields = ['id', 'detectedAt']
+        read_only_fields = ['id', 'detectedAt', 'sightingCount', 'lastSeenAt']
     
     def validate_severity(self, value):
         """Validate severity level"""
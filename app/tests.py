@@ -1,3 +1,1319 @@
-from django.test import TestCase
+import asyncio
+import os
+import queue
+import socket
+import tempfile
+import time
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import httpx
+import numpy as np
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import IOTDevice, Pothole, User, VideoStream
+from .utils import detector as detector_module
+from .utils import local_detector, opencv_capture, stream_supervisor, video_processor
+from .utils.async_client import AsyncGradioClient
+from .utils.capture_pool import CapturePool, _RelaySink
+from .utils.detector import (
+    BaseDetector,
+    DetectionError,
+    PotholeDetector,
+    build_detections,
+    compute_detections,
+    decode_image,
+    get_detector_stats,
+    reduced_decode_flag,
+    render_annotation,
+)
+from .utils.frame_cache import PerceptualHashCache, dhash, dhash_jpeg, hamming
+from .utils.frame_quality import FrameQualityGate, gray_thumbnail
+from .utils.frame_queue import FrameQueue, TaskStatus, get_queue_stats, init_frame_queue
+from .utils.frame_relay import FrameRing, LiveResponseBody, acquire_viewer_slot, iter_frames
+from .utils.geo import haversine_m, record_pothole_sighting
+from .utils.local_detector import LocalPotholeDetector
+from .utils.mjpeg import MJPEGParser, parse_boundary
+from .utils.mosaic import split_boxes
+from .utils.opencv_capture import run_opencv_capture
+from .utils.pipeline import process_image
+from .utils.resilience import CircuitBreaker
+from .utils.sampling import AdaptiveInterval, DeviceTrack, DistanceInterval
+from .utils.scene_change import SceneChangeGate
+from .utils.stream_manager import StreamManager
+from .utils.stream_shard import StreamNodeAgent, pick_node
+from .utils.stream_supervisor import SupervisorClient, SupervisorServer, SupervisorUnavailable
+from .utils.tracker import IoUTracker
+from .utils.upload_tuner import UploadTuner
+from .utils.video_processor import VideoStreamProcessor, _ProcessorSink
+
+
+def road_image(seed=0, size=(240, 320)):
+    """Textured BGR frame: random 8x8 blocks, so it has edges and survives JPEG."""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, (size[0] // 8, size[1] // 8, 3), dtype=np.uint8)
+    return cv2.resize(small, (size[1], size[0]), interpolation=cv2.INTER_NEAREST)
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def detection(x, confidence=0.9):
+    return {"bbox": [x, 100, x + 50, 150], "confidence": confidence, "depth": 1.0, "severity": "low"}
+
+
+def jpeg(img):
+    return cv2.imencode(".jpg", img)[1].tobytes()
+
+
+def video_file(frames=20, fps=10):
+    """MJPG .avi of distinct road_image() frames at 160x120."""
+    path = os.path.join(tempfile.mkdtemp(), "road.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (160, 120))
+    for i in range(frames):
+        writer.write(road_image(i, size=(120, 160)))
+    writer.release()
+    return path
+
+
+class FakeEngine:
+    """Returns a fixed YOLOv8 output of shape (1, 4 + classes, anchors) for any input."""
+
+    name = "fake"
+
+    def __init__(self, boxes):
+        # boxes: rows of (cx, cy, w, h, score) in letterbox space
+        self.output = np.array(boxes, dtype=np.float32).T[np.newaxis]
+        self.calls = 0
+
+    def forward(self, blob):
+        self.calls += 1
+        return self.output
+
+
+def local_detector_with(engine):
+    with mock.patch.object(local_detector, "_load_engine", return_value=engine):
+        return LocalPotholeDetector(model_path="model.onnx")
+
+
+class LocalDetectorTests(SimpleTestCase):
+    # A 640x480 image is letterboxed into 640x640 with 80 px of padding above and below
+    BOXES = [
+        (320, 320, 100, 50, 0.9),
+        (322, 321, 100, 50, 0.8),  # overlaps the first one and is suppressed
+        (100, 200, 40, 40, 0.1),  # below the confidence threshold
+    ]
+
+    def test_infer_maps_boxes_back_to_image_and_suppresses_overlaps(self):
+        detector = local_detector_with(FakeEngine(self.BOXES))
+
+        boxes = detector._infer(np.zeros((480, 640, 3), dtype=np.uint8))
+
+        self.assertEqual(len(boxes), 1)
+        x1, y1, x2, y2, confidence, class_id = boxes[0]
+        self.assertEqual([x1, y1, x2, y2], [270.0, 215.0, 370.0, 265.0])
+        self.assertAlmostEqual(confidence, 0.9, places=5)
+        self.assertEqual(class_id, 0)
+
+    def test_detect_returns_annotated_detections(self):
+        detector = local_detector_with(FakeEngine(self.BOXES))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "road.jpg")
+            cv2.imwrite(path, np.zeros((480, 640, 3), dtype=np.uint8))
+
+            detections, annotated = detector.detect(path)
+
+        self.assertEqual(len(detections), 1)
+        self.assertEqual(detections[0]["bbox"], [270.0, 215.0, 370.0, 265.0])
+        self.assertEqual(detections[0]["severity"], "low")
+        self.assertIsNotNone(cv2.imdecode(np.frombuffer(annotated, np.uint8), cv2.IMREAD_COLOR))
+
+    def test_nothing_above_threshold_returns_no_boxes(self):
+        detector = local_detector_with(FakeEngine([(100, 200, 40, 40, 0.1)]))
+
+        self.assertEqual(len(detector._infer(np.zeros((480, 640, 3), dtype=np.uint8))), 0)
+
+    def test_engine_failure_raises_detection_error(self):
+        engine = FakeEngine(self.BOXES)
+        engine.forward = mock.Mock(side_effect=RuntimeError("bad input"))
+        detector = local_detector_with(engine)
+
+        with self.assertLogs("app.utils.local_detector", "ERROR"), self.assertRaises(DetectionError):
+            detector.detect_array(np.zeros((480, 640, 3), dtype=np.uint8))
+
+    def test_missing_model_fails_at_load(self):
+        with self.assertRaises(FileNotFoundError):
+            LocalPotholeDetector(model_path="/nonexistent/pothole.onnx")
+
+
+class RemoteDetectorTests(SimpleTestCase):
+    def test_http_session_is_shared_and_blocks_when_pool_is_exhausted(self):
+        with mock.patch.object(detector_module, "_http_session", None):
+            session = detector_module.get_http_session(pool_maxsize=5)
+
+            self.assertIs(detector_module.get_http_session(pool_maxsize=50), session)
+            adapter = session.get_adapter("https://rohithgangarapu-potholeyolov8-new.hf.space")
+            self.assertEqual(adapter._pool_maxsize, 5)
+            self.assertTrue(adapter._pool_block)
+
+    def test_detect_runs_upload_and_result_stages(self):
+        detector = PotholeDetector(upload_workers=1, max_in_flight=2, transport="sync")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "road.jpg")
+            cv2.imwrite(path, np.zeros((480, 640, 3), dtype=np.uint8))
+            with mock.patch.object(detector, "_start_task", return_value="event-1") as start, \
+                    mock.patch.object(detector, "_await_result", return_value=[[10, 10, 50, 50, 0.9, 0]]) as wait:
+                detections, annotated = detector.detect(path)
+
+        start.assert_called_once()
+        wait.assert_called_once_with("event-1")
+        self.assertEqual(len(detections), 1)
+        self.assertEqual(detections[0]["bbox"], [10.0, 10.0, 50.0, 50.0])
+        self.assertIsNotNone(annotated)
+
+    def test_failed_upload_raises_detection_error(self):
+        detector = PotholeDetector(upload_workers=1, max_in_flight=1, transport="sync")
+        with mock.patch.object(detector, "_start_task", return_value=None), \
+                mock.patch.object(detector, "_await_result") as wait:
+            with self.assertRaises(DetectionError):
+                detector.detect_array(np.zeros((480, 640, 3), dtype=np.uint8))
+        wait.assert_not_called()
+
+
+class SingleDecodeTests(SimpleTestCase):
+    def test_detect_bytes_decodes_once_and_maps_boxes_to_the_source(self):
+        detector = PotholeDetector(upload_workers=1, max_in_flight=1, transport="sync")
+        _, encoded = cv2.imencode(".jpg", np.zeros((960, 1280, 3), dtype=np.uint8))
+        # Boxes come back in the 640x480 upload space
+        with mock.patch.object(detector, "_start_task", return_value="event-1"), \
+                mock.patch.object(detector, "_await_result", return_value=[[10, 20, 50, 60, 0.9, 0]]), \
+                mock.patch.object(detector_module.cv2, "imdecode", wraps=cv2.imdecode) as imdecode, \
+                mock.patch.object(detector_module.cv2, "imread") as imread:
+            detections, annotated = detector.detect_bytes(encoded.tobytes())
+
+        self.assertEqual(imdecode.call_count, 1)
+        imread.assert_not_called()
+        self.assertEqual(detections[0]["bbox"], [20.0, 40.0, 100.0, 120.0])
+        self.assertIsNotNone(annotated)
+
+    def test_undecodable_bytes_raise_detection_error(self):
+        detector = PotholeDetector(upload_workers=1, max_in_flight=1, transport="sync")
+        with mock.patch.object(detector, "_start_task") as start:
+            with self.assertRaises(DetectionError):
+                detector.detect_bytes(b"not an image")
+        start.assert_not_called()
+
+
+class MosaicDetectorTests(SimpleTestCase):
+    def test_frames_share_one_call_and_boxes_go_back_to_their_frame(self):
+        calls = []
+        raw = Future()
+
+        def fake_submit_raw(self, img):
+            calls.append(img.shape)
+            return raw
+
+        with mock.patch.object(PotholeDetector, "_submit_raw", fake_submit_raw):
+            detector = PotholeDetector(batch_size=4, batch_max_wait=5.0)
+            futures = [detector.submit_array(np.zeros((240, 320, 3), dtype=np.uint8)) for _ in range(4)]
+
+            # A 2x2 grid of 320x240 tiles; this box lies in the top-right tile
+            raw.set_result([[330, 10, 370, 50, 0.9, 0]])
+            results = [future.result(timeout=5) for future in futures]
+
+        self.assertEqual(calls, [(480, 640, 3)])
+        self.assertEqual([len(detections) for detections, _ in results], [0, 1, 0, 0])
+        self.assertEqual(results[1][0][0]["bbox"], [10.0, 10.0, 50.0, 50.0])
+
+
+def gradio_transport(sse_body):
+    """httpx transport answering upload, task creation and the SSE read like the Gradio Space."""
+
+    def handler(request):
+        if request.url.path.endswith("/upload"):
+            return httpx.Response(200, json=["/tmp/gradio/frame.jpg"])
+        if request.method == "POST":
+            return httpx.Response(200, json={"event_id": "event-1"})
+        return httpx.Response(200, text=sse_body, headers={"content-type": "text/event-stream"})
+
+    return httpx.MockTransport(handler)
+
+
+class AsyncClientTests(SimpleTestCase):
+    def client_for(self, sse_body):
+        client = AsyncGradioClient("http://space/gradio_api/upload", "http://space/gradio_api/call/predict")
+        client._client = httpx.AsyncClient(transport=gradio_transport(sse_body))
+        return client
+
+    def test_complete_event_returns_raw_boxes(self):
+        client = self.client_for(
+            "event: generating\ndata: null\n\n"
+            "event: complete\ndata: [{\"path\": \"annotated.jpg\"}, [[1, 2, 3, 4, 0.9, 0]]]\n\n"
+        )
+
+        self.assertEqual(client.submit(b"jpeg").result(timeout=5), [[1, 2, 3, 4, 0.9, 0]])
+
+    def test_error_event_returns_none(self):
+        client = self.client_for("event: error\ndata: \"GPU quota exceeded\"\n\n")
+
+        with self.assertLogs("app.utils.async_client", "ERROR"):
+            self.assertIsNone(client.submit(b"jpeg").result(timeout=5))
+
+    def test_stream_without_complete_event_is_a_failure(self):
+        client = self.client_for("event: heartbeat\ndata: null\n\n")
+
+        with self.assertLogs("app.utils.async_client", "ERROR"):
+            self.assertIsNone(client.submit(b"jpeg").result(timeout=5))
+
+
+class FrameCacheTests(SimpleTestCase):
+    def test_dhash_cache_hits_near_duplicates(self):
+        cache = PerceptualHashCache(max_entries=4, max_distance=5)
+        frame = road_image(1)
+        h = dhash(frame)
+        self.assertIsNone(cache.lookup(h))
+        cache.reserve(h)
+        self.assertEqual(cache.lookup(dhash(cv2.GaussianBlur(frame, (3, 3), 0))), {})
+        cache.store(h, {"detections": []})
+        self.assertEqual(cache.lookup(h), {"detections": []})
+        self.assertIsNone(cache.lookup(dhash(road_image(2))))
+        cache.discard(h)
+        self.assertIsNone(cache.lookup(h))
+
+    def run_stream_frames(self, first_detection_count):
+        """Detects one frame, then samples a near-duplicate with a new dark patch. Returns the sent task count."""
+        proc = VideoStreamProcessor("cache-test", "x.mp4", "http://x/detect/", detection_mode="http")
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {"status": "success", "detection_count": first_detection_count}
+        frame = road_image(1)
+        near_duplicate = frame.copy()
+        near_duplicate[200:216, 280:296] = 0
+
+        with mock.patch.object(video_processor.requests, "post", return_value=response), \
+                mock.patch.object(video_processor, "add_frame_processing_task") as add_task:
+            proc._enqueue_detection(frame, time.time())
+            _, task, *args = add_task.call_args[0]
+            task(*args)
+            proc._enqueue_detection(near_duplicate, time.time())
+
+        self.assertLessEqual(bin(dhash(frame) ^ dhash(near_duplicate)).count("1"), 5)
+        return add_task.call_count
+
+    def test_pothole_free_frame_answers_near_duplicates(self):
+        self.assertEqual(self.run_stream_frames(first_detection_count=0), 1)
+
+    def test_frame_with_potholes_is_detected_again(self):
+        # A new pothole next to a known one may not move the hash, so the frame is sent again
+        self.assertEqual(self.run_stream_frames(first_detection_count=1), 2)
+
+    def test_failed_detection_is_not_cached(self):
+        proc = VideoStreamProcessor("cache-test", "x.mp4", "http://x/detect/", detection_mode="http")
+        response = mock.Mock(status_code=500)
+        response.json.return_value = {"status": "error", "message": "Detection failed"}
+        frame = road_image(1)
+
+        with mock.patch.object(video_processor.requests, "post", return_value=response):
+            with self.assertRaises(video_processor.DetectionError):
+                proc._process_frame(b"jpeg", 1, dhash(frame))
+
+        self.assertIsNone(proc._frame_cache.lookup(dhash(frame)))
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_on_errors_and_closes_after_a_good_probe(self):
+        breaker = CircuitBreaker(min_requests=4, cooldown=0.05)
+        with self.assertLogs("app.utils.resilience", "INFO"):
+            for _ in range(4):
+                breaker.record(0.1, False)
+            self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+            self.assertFalse(breaker.allow_request())
+
+            time.sleep(0.06)
+            # Half-open: exactly one probe goes through
+            self.assertTrue(breaker.allow_request())
+            self.assertFalse(breaker.allow_request())
+            breaker.record(0.1, True)
+
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow_request())
+
+    def test_failed_probe_opens_again(self):
+        breaker = CircuitBreaker(min_requests=2, cooldown=0.0)
+        with self.assertLogs("app.utils.resilience", "WARNING"):
+            breaker.record(0.1, False)
+            breaker.record(0.1, False)
+            self.assertTrue(breaker.allow_request())
+            breaker.record(0.1, False)
+
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(breaker.trips, 2)
+
+    def test_slow_calls_open_the_circuit(self):
+        breaker = CircuitBreaker(p95_threshold=1.0, min_requests=3)
+        with self.assertLogs("app.utils.resilience", "WARNING"):
+            for _ in range(3):
+                breaker.record(2.0, True)
+
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+
+class DetectorDeadlineTests(SimpleTestCase):
+    def test_deadline_fails_the_frame_and_cancels_the_attempt(self):
+        detector = PotholeDetector(transport="sync", deadline=0.05)
+        pending = Future()
+        with mock.patch.object(detector, "_dispatch_raw", return_value=pending):
+            with self.assertRaises(DetectionError):
+                detector.detect_array(np.zeros((480, 640, 3), dtype=np.uint8))
+
+        self.assertTrue(wait_for(pending.cancelled))
+        self.assertEqual(detector.get_stats()["deadline_misses"], 1)
+
+    def test_open_circuit_fails_fast(self):
+        breaker = CircuitBreaker()
+        breaker.state, breaker.opened_at = CircuitBreaker.OPEN, time.monotonic()
+        detector = PotholeDetector(transport="sync", breaker=breaker)
+        with mock.patch.object(detector, "_dispatch_raw") as dispatch:
+            with self.assertRaises(DetectionError):
+                detector.detect_array(np.zeros((480, 640, 3), dtype=np.uint8))
+
+        dispatch.assert_not_called()
+
+    def test_hedge_wins_when_first_call_is_slow(self):
+        breaker = CircuitBreaker(min_requests=5)
+        for _ in range(5):
+            breaker.record(0.02, True)
+        detector = PotholeDetector(transport="sync", deadline=5.0, hedge=True, breaker=breaker)
+        slow, fast = Future(), Future()
+        fast.set_result([[10, 10, 50, 50, 0.9, 0]])
+
+        with mock.patch.object(detector, "_dispatch_raw", side_effect=[slow, fast]), \
+                self.assertLogs("app.utils.detector", "INFO"):
+            detections, _ = detector.detect_array(np.zeros((480, 640, 3), dtype=np.uint8))
+
+        self.assertEqual(len(detections), 1)
+        self.assertTrue(wait_for(slow.cancelled))
+        stats = detector.get_stats()
+        self.assertEqual((stats["hedges_sent"], stats["hedges_won"]), (1, 1))
+
+
+class DetectorStatsEndpointTests(SimpleTestCase):
+    @override_settings(DETECTOR_BACKEND="local", DETECTOR_MODEL_PATH="/nonexistent/pothole.onnx")
+    def test_missing_local_model_is_reported_as_unavailable(self):
+        with mock.patch.object(detector_module, "_detector_instance", None):
+            response = self.client.get(reverse("frame-processing-stats"))
+
+        self.assertEqual(response.status_code, 200)
+        detector_stats = response.json()["data"]["detector"]
+        self.assertFalse(detector_stats["available"])
+        self.assertIn("not found", detector_stats["error"])
+
+
+class PostProcessingTests(SimpleTestCase):
+    def test_severity_follows_relative_area(self):
+        # 100x100 image: depth is 50 * relative area
+        detections = compute_detections((100, 100, 3), [
+            [0, 0, 10, 10, 0.9, 0],   # depth 0.5
+            [0, 0, 40, 40, 0.8, 0],   # depth 8
+            [0, 0, 60, 60, 0.7, 0],   # depth 18
+            [0, 0, 5],                # malformed, dropped
+        ])
+
+        self.assertEqual([d["severity"] for d in detections], ["low", "medium", "high"])
+        self.assertEqual([d["depth"] for d in detections], [0.5, 8.0, 18.0])
+        self.assertEqual(detections[1]["bbox"], [0.0, 0.0, 40.0, 40.0])
+
+    def test_array_and_list_input_agree(self):
+        rows = [[5, 5, 25, 30, 0.9, 0], [50, 40, 90, 80, 0.6, 0]]
+
+        self.assertEqual(
+            compute_detections((100, 100, 3), np.array(rows)),
+            compute_detections((100, 100, 3), rows),
+        )
+
+    def test_annotation_is_rendered_only_when_needed(self):
+        img = np.zeros((100, 100, 3), dtype=np.uint8)
+
+        self.assertEqual(build_detections(img, []), ([], None))
+        detections, annotated = build_detections(img, [[5, 5, 25, 30, 0.9, 0]], annotate=False)
+        self.assertIsNone(annotated)
+        self.assertIsNotNone(render_annotation(img, detections))
+        # The caller's image is never drawn on
+        self.assertFalse(img.any())
+
+    def test_split_boxes_assigns_each_box_to_its_tile(self):
+        tiles = [(0, 0, 320, 240), (320, 0, 320, 240)]
+        per_frame = split_boxes(
+            [[10, 10, 50, 50, 0.9, 0], [300, 20, 400, 60, 0.8, 0]],
+            tiles,
+            [(480, 640, 3), (240, 320, 3)],
+        )
+
+        # Frame 0 is twice the tile size; the second box's centre is in tile 1 and is clipped to it
+        np.testing.assert_allclose(per_frame[0], [[20, 20, 100, 100, 0.9, 0]])
+        np.testing.assert_allclose(per_frame[1], [[0, 20, 80, 60, 0.8, 0]])
+
+
+class FixedBoxDetector(BaseDetector):
+    """Finds one box covering the central quarter of whatever image it is given."""
+
+    decode_target = (640, 480)
+
+    def __init__(self):
+        self.shapes = []
+
+    def detect_array(self, img, annotate=True):
+        self.shapes.append(img.shape)
+        h, w = img.shape[:2]
+        return build_detections(img, [[w / 4, h / 4, w * 3 / 4, h * 3 / 4, 0.9, 0]], annotate=annotate)
+
+
+class ReducedDecodeTests(SimpleTestCase):
+    def test_largest_factor_that_still_covers_the_target(self):
+        self.assertEqual(reduced_decode_flag((4000, 3000), (640, 480)), (4, cv2.IMREAD_REDUCED_COLOR_4))
+        self.assertEqual(reduced_decode_flag((5120, 3840), (640, 480)), (8, cv2.IMREAD_REDUCED_COLOR_8))
+        # Portrait photo against a landscape target: sides are compared long-to-long
+        self.assertEqual(reduced_decode_flag((1500, 2000), (640, 480)), (2, cv2.IMREAD_REDUCED_COLOR_2))
+        self.assertEqual(reduced_decode_flag((800, 600), (640, 480)), (1, cv2.IMREAD_COLOR))
+
+    def test_decode_image_returns_scale_back_to_full_resolution(self):
+        data = cv2.imencode(".jpg", np.zeros((1920, 2560, 3), dtype=np.uint8))[1].tobytes()
+
+        img, scale = decode_image(data, (640, 480))
+
+        self.assertEqual(img.shape, (480, 640, 3))
+        self.assertEqual(scale, (4.0, 4.0))
+
+    def test_detect_bytes_decodes_once_and_annotates_the_reduced_image(self):
+        detector = FixedBoxDetector()
+        data = cv2.imencode(".jpg", np.zeros((1920, 2560, 3), dtype=np.uint8))[1].tobytes()
+
+        with mock.patch.object(detector_module.cv2, "imdecode", wraps=cv2.imdecode) as imdecode:
+            detections, annotated = detector.detect_bytes(data)
+
+        self.assertEqual(imdecode.call_count, 1)
+        self.assertEqual(detector.shapes, [(480, 640, 3)])
+        # Boxes come back in full-resolution coordinates, the drawing stays at decode size
+        self.assertEqual(detections[0]["bbox"], [640.0, 480.0, 1920.0, 1440.0])
+        self.assertEqual(cv2.imdecode(np.frombuffer(annotated, np.uint8), cv2.IMREAD_COLOR).shape, (480, 640, 3))
+
+
+class UploadTunerTests(SimpleTestCase):
+    def tuner(self):
+        # Ladder: 640x480@q75 ... 384x288@q50 in five levels; 2 s per upload
+        return UploadTuner(budget_s=2.0, probe_interval=3)
+
+    def test_over_budget_upload_steps_down_to_a_fitting_level(self):
+        tuner = self.tuner()
+        top = tuner.current()
+        with self.assertLogs("app.utils.upload_tuner", "INFO"):
+            # 50 kB in 5 s: 10 kB/s, so only a level of at most ~20 kB fits the budget
+            tuner.record_upload(top, 50_000, 5.0, True)
+
+        self.assertGreater(tuner.level, 0)
+        self.assertEqual(tuner.step_downs, 1)
+
+    def test_timeout_steps_down(self):
+        tuner = self.tuner()
+        with self.assertLogs("app.utils.upload_tuner", "INFO"):
+            tuner.record_upload(tuner.current(), 50_000, 1.0, False, timed_out=True)
+
+        self.assertEqual(tuner.level, len(tuner.ladder) - 1)
+
+    def test_other_upload_failures_keep_the_level(self):
+        tuner = self.tuner()
+        for _ in range(5):
+            tuner.record_upload(tuner.current(), 50_000, 0.1, False)
+
+        self.assertEqual((tuner.level, tuner.step_downs), (0, 0))
+
+    def test_steps_back_up_once_the_next_level_fits_comfortably(self):
+        tuner = self.tuner()
+        with self.assertLogs("app.utils.upload_tuner", "INFO"):
+            tuner.record_upload(tuner.current(), 50_000, 5.0, True)
+            level = tuner.level
+            # The link recovers: small uploads now take a fraction of the budget
+            for _ in range(3):
+                tuner.record_upload(tuner.current(), 20_000, 0.05, True)
+
+        self.assertEqual(tuner.level, level - 1)
+        self.assertEqual(tuner.step_ups, 1)
+
+    def test_async_upload_timeout_is_reported_as_such(self):
+        def handler(request):
+            raise httpx.ReadTimeout("upload stalled", request=request)
+
+        client = AsyncGradioClient("http://space/gradio_api/upload", "http://space/gradio_api/call/predict")
+        client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        uploads = []
+
+        with self.assertLogs("app.utils.async_client", "ERROR"):
+            result = client.submit(b"jpeg", on_upload=lambda *upload: uploads.append(upload)).result(timeout=5)
+
+        self.assertIsNone(result)
+        nbytes, _, ok, timed_out = uploads[0]
+        self.assertEqual((nbytes, ok, timed_out), (4, False, True))
+
+
+class IoUTrackerTests(SimpleTestCase):
+    def test_track_reported_once_when_confirmed(self):
+        tracker = IoUTracker(min_hits=2, max_misses=1)
+        self.assertEqual(tracker.push(1, [detection(10, 0.5)], "f1"), [])
+        reported = tracker.push(2, [detection(14, 0.8)], "f2")
+        self.assertEqual(len(reported), 1)
+        self.assertEqual(reported[0].best_frame, "f2")
+        self.assertEqual(tracker.push(3, [detection(18, 0.6)], "f3"), [])
+        self.assertEqual(tracker.get_stats()["tracks_confirmed"], 1)
+
+    def test_unconfirmed_track_reported_when_it_expires(self):
+        tracker = IoUTracker(min_hits=3, max_misses=1)
+        tracker.push(1, [detection(10)], "f1")
+        self.assertEqual(tracker.push(2, [], "f2"), [])
+        reported = tracker.push(3, [], "f3")
+        self.assertEqual([t.best_frame for t in reported], ["f1"])
+        self.assertEqual(tracker.get_stats(), {"active_tracks": 0, "tracks_confirmed": 0, "tracks_unconfirmed": 1})
+
+    def test_out_of_order_frames_applied_in_order(self):
+        tracker = IoUTracker(min_hits=2, max_misses=1)
+        self.assertEqual(tracker.push(2, [detection(14)], "f2"), [])
+        self.assertEqual(len(tracker.push(1, [detection(10)], "f1")), 1)
+
+    def test_flush_reports_open_tracks(self):
+        tracker = IoUTracker(min_hits=5)
+        tracker.push(1, [detection(10), detection(300)], "f1")
+        self.assertEqual(len(tracker.flush()), 2)
+        self.assertEqual(tracker.flush(), [])
+
+    def test_streams_track_by_default(self):
+        self.assertEqual(video_processor._track_min_hits(settings), 2)
+        with override_settings(STREAM_TRACKER_ENABLED=False):
+            self.assertEqual(video_processor._track_min_hits(settings), 0)
+
+
+class PotholeSightingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="u", email="u@example.com", phone="1", password="x")
+        self.device = IOTDevice.objects.create(
+            device_type="esp32", mac_id="aa:bb", registered_by=self.user, owner=self.user
+        )
+
+    def sight(self, latitude, longitude, severity="low", depth=1.0, radius_m=10.0):
+        return record_pothole_sighting(
+            device=self.device, user=self.user, depth=depth, severity=severity, image=None,
+            latitude=latitude, longitude=longitude, radius_m=radius_m,
+        )
+
+    def test_nearby_sighting_merges_and_keeps_worse_severity(self):
+        first, created = self.sight(12.9716, 77.5946)
+        self.assertTrue(created)
+        # ~4 m away
+        merged, created = self.sight(12.97163, 77.5946, severity="high", depth=6.0)
+        self.assertFalse(created)
+        self.assertEqual(merged.pk, first.pk)
+        self.assertEqual((merged.sighting_count, merged.severity, merged.depth), (2, "high", 6.0))
+        self.assertEqual(Pothole.objects.count(), 1)
+
+    def test_distant_or_unlocated_sightings_insert(self):
+        self.sight(12.9716, 77.5946)
+        self.assertGreater(haversine_m(12.9716, 77.5946, 12.9721, 77.5946), 50)
+        self.assertTrue(self.sight(12.9721, 77.5946)[1])
+        self.assertTrue(self.sight(0.0, 0.0)[1])
+        self.assertTrue(self.sight(0.0, 0.0)[1])
+        self.assertTrue(self.sight(12.9716, 77.5946, radius_m=0)[1])
+        self.assertEqual(Pothole.objects.count(), 5)
+
+    def test_resolved_pothole_is_not_merged_into(self):
+        pothole, _ = self.sight(12.9716, 77.5946)
+        Pothole.objects.filter(pk=pothole.pk).update(status="fixed")
+        self.assertTrue(self.sight(12.9716, 77.5946)[1])
+
+    @override_settings(MEDIA_ROOT="/tmp/pothole-test-media", POTHOLE_DEDUP_RADIUS_M=10.0)
+    def test_each_detection_in_one_photo_is_recorded(self):
+        detector = mock.Mock()
+        detector.detect_bytes.return_value = (
+            [
+                {"bbox": [10, 10, 60, 60], "confidence": 0.9, "depth": 2.0, "severity": "low"},
+                {"bbox": [200, 100, 260, 160], "confidence": 0.8, "depth": 5.0, "severity": "medium"},
+            ],
+            None,
+        )
+
+        def upload():
+            photo = SimpleUploadedFile("road.jpg", jpeg(road_image()), content_type="image/jpeg")
+            return self.client.post(
+                reverse("pothole-upload-image") + "?latitude=12.9716&longitude=77.5946",
+                {"photo": photo, "deviceId": self.device.pk},
+            )
+
+        with mock.patch.object(detector_module, "_detector_instance", detector):
+            first = upload().json()
+            second = upload().json()
+
+        self.assertEqual((first["recorded_count"], first["merged_count"]), (2, 0))
+        self.assertEqual((second["recorded_count"], second["merged_count"]), (0, 2))
+        self.assertEqual(list(Pothole.objects.values_list("sighting_count", flat=True)), [2, 2])
+
+
+class StreamPipelineTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="u", email="u@example.com", phone="1", password="x")
+        self.device = IOTDevice.objects.create(
+            device_type="esp32", mac_id="aa:bb", registered_by=self.user, owner=self.user,
+            last_latitude=12.9716, last_longitude=77.5946,
+        )
+
+    def test_in_process_frame_is_recorded_without_a_loopback_post(self):
+        proc = VideoStreamProcessor(
+            "pipeline-test", "x.mp4", "http://x/", device_id=self.device.pk, cache_size=0, track_min_hits=0
+        )
+        result = Future()
+        result.set_result(([detection(10)], None))
+
+        with mock.patch("app.utils.video_processor.requests.post") as post:
+            payload = proc._finish_frame(result, jpeg(road_image()), 1, None, None, 0.0, 0.0)
+
+        post.assert_not_called()
+        self.assertEqual(payload["detection_count"], 1)
+        self.assertEqual(list(Pothole.objects.values_list("pk", flat=True)), payload["pothole_ids"])
+        self.assertEqual(proc.get_status()["potholes_recorded"], 1)
+
+    def test_detections_without_a_reporter_are_not_recorded(self):
+        detector = mock.Mock()
+        detector.detect_bytes.return_value = ([detection(10)], None)
+        with mock.patch.object(detector_module, "_detector_instance", detector):
+            outcome = process_image(jpeg(road_image()), image_name="f.jpg", latitude=1.0, longitude=2.0)
+
+        self.assertTrue(outcome.missing_reporter)
+        self.assertEqual(outcome.potholes, [])
+        self.assertFalse(Pothole.objects.exists())
+
+
+class MosaicBatchingTests(SimpleTestCase):
+    def test_stream_frames_fill_one_mosaic(self):
+        """Frames sampled back to back share one remote call once submission no longer blocks the workers."""
+        calls = []
+        raw = Future()
+        raw.meta = {}
+
+        def fake_submit_raw(self, img):
+            calls.append(img.shape)
+            return raw
+
+        with mock.patch.object(PotholeDetector, "_submit_raw", fake_submit_raw):
+            det = PotholeDetector(batch_size=4, batch_max_wait=5.0)
+        init_frame_queue()
+        proc = VideoStreamProcessor("mosaic-test", "x.mp4", "http://x/", cache_size=0, track_min_hits=0)
+
+        with mock.patch.object(detector_module, "_detector_instance", det):
+            for i in range(4):
+                proc._enqueue_detection(np.full((120, 160, 3), i * 40, dtype=np.uint8), time.time())
+
+            # Two frame workers used to hold two frames each in detect_array()
+            self.assertTrue(wait_for(lambda: len(calls) == 1))
+            self.assertEqual(calls, [(480, 640, 3)])
+
+            raw.set_result([])
+            self.assertTrue(wait_for(lambda: proc.get_status()["frames_sent"] == 4))
+
+        status = proc.get_status()
+        self.assertEqual(status["frames_failed"], 0)
+        self.assertEqual(len(calls), 1)
+
+
+class FrameQueueTests(SimpleTestCase):
+    def test_result_store_evicts_oldest_finished_tasks(self):
+        queue = FrameQueue(max_workers=1, max_results=3)
+        for i in range(3):
+            queue.add_task(f"t{i}", print)
+        queue.result_store["t0"].status = TaskStatus.COMPLETED
+        queue.result_store["t1"].status = TaskStatus.FAILED
+
+        queue.add_task("t3", print)
+        queue.add_task("t4", print)
+        self.assertEqual(list(queue.result_store), ["t2", "t3", "t4"])
+
+        # Pending tasks are kept even past the bound, so their status stays available
+        queue.add_task("t5", print)
+        self.assertEqual(len(queue.result_store), 4)
+        self.assertIsNone(queue.get_task_status("t0"))
+
+
+class JpegPassthroughTests(SimpleTestCase):
+    def test_source_jpeg_is_queued_without_re_encoding(self):
+        proc = VideoStreamProcessor("passthrough-test", "x.mp4", "http://x/")
+        data = jpeg(road_image(3))
+
+        with mock.patch.object(video_processor, "add_frame_processing_task") as add_task, \
+                mock.patch.object(video_processor.cv2, "imencode") as imencode:
+            self.assertTrue(proc._enqueue_detection(None, time.time(), jpeg_bytes=data))
+
+        imencode.assert_not_called()
+        _, _, queued, frame_number, frame_hash, _, _ = add_task.call_args[0]
+        self.assertIs(queued, data)
+        self.assertEqual(frame_number, 1)
+        self.assertEqual(frame_hash, dhash_jpeg(data))
+
+    def test_dhash_from_reduced_decode_matches_full_decode(self):
+        data = jpeg(road_image(3, size=(480, 640)))
+        full = dhash(cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR))
+        self.assertLessEqual(hamming(dhash_jpeg(data), full), 5)
+
+    def test_undecodable_frame_counts_as_failed(self):
+        proc = VideoStreamProcessor("passthrough-test", "x.mp4", "http://x/")
+        with mock.patch.object(video_processor, "add_frame_processing_task") as add_task:
+            self.assertFalse(proc._enqueue_detection(None, time.time(), jpeg_bytes=b"\xff\xd8garbage\xff\xd9"))
+
+        add_task.assert_not_called()
+        self.assertEqual(proc.get_status()["frames_failed"], 1)
+
+
+class ChunkedStream:
+    """readinto() source returning at most `chunk` bytes per call, like a socket."""
+
+    def __init__(self, data, chunk):
+        self.data, self.chunk, self.pos = data, chunk, 0
+
+    def readinto(self, view):
+        n = min(len(view), self.chunk, len(self.data) - self.pos)
+        view[:n] = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+
+class MJPEGParserTests(SimpleTestCase):
+    def setUp(self):
+        self.frames = [jpeg(road_image(i)) for i in range(3)]
+
+    def multipart(self, content_length=True):
+        parts = []
+        for frame in self.frames:
+            headers = b"--frame\r\nContent-Type: image/jpeg\r\n"
+            if content_length:
+                headers += b"Content-Length: %d\r\n" % len(frame)
+            parts.append(headers + b"\r\n" + frame + b"\r\n")
+        return b"".join(parts)
+
+    def parse(self, parser, data, chunk):
+        return [bytes(view) for view in parser.iter_frames(ChunkedStream(data, chunk))]
+
+    def test_boundary_from_content_type(self):
+        self.assertEqual(parse_boundary('multipart/x-mixed-replace; boundary="--frame"'), b"frame")
+        self.assertIsNone(parse_boundary("image/jpeg"))
+
+    def test_multipart_frames_survive_every_chunk_size(self):
+        for content_length in (True, False):
+            data = self.multipart(content_length)
+            # Without a length the last part only ends once the next delimiter arrives
+            tail = b"" if content_length else b"--frame\r\n"
+            for chunk in (1, 2, 3, 7, 64, 1000, len(data)):
+                with self.subTest(content_length=content_length, chunk=chunk):
+                    parser = MJPEGParser(b"frame", read_size=64, initial_capacity=128)
+                    self.assertEqual(self.parse(parser, data + tail, chunk), self.frames)
+                    self.assertEqual(parser.resyncs, 0)
+
+    def test_wrong_content_length_falls_back_to_the_delimiter(self):
+        data = self.multipart().replace(b"Content-Length: %d" % len(self.frames[0]), b"Content-Length: 10", 1)
+        parser = MJPEGParser(b"frame")
+        self.assertEqual(self.parse(parser, data, 1000), self.frames)
+
+    def test_bare_jpeg_stream_without_boundary(self):
+        # The last frame's EOI is the last byte received
+        data = b"".join(self.frames)
+        for chunk in (1, 5, 333, len(data)):
+            with self.subTest(chunk=chunk):
+                self.assertEqual(self.parse(MJPEGParser(None), data, chunk), self.frames)
+
+
+class StreamManagerTests(SimpleTestCase):
+    def setUp(self):
+        self.manager = StreamManager(decode_workers=1, lag_interval=0.05)
+        self.addCleanup(self.stop_loop)
+        self.frames = [jpeg(road_image(i)) for i in range(3)]
+
+    def stop_loop(self):
+        async def cancel_all():
+            for task in asyncio.all_tasks():
+                if task is not asyncio.current_task():
+                    task.cancel()
+
+        self.manager.submit(cancel_all()).result(timeout=2)
+        self.manager.loop.call_soon_threadsafe(self.manager.loop.stop)
+
+    def test_tasks_run_on_the_loop_and_cancel(self):
+        async def answer():
+            return 42
+
+        self.assertEqual(self.manager.submit(answer()).result(timeout=2), 42)
+        self.manager.spawn("s1", asyncio.sleep(60))
+        self.assertTrue(wait_for(lambda: self.manager.get_stats()["streams"] == 1))
+        self.manager.cancel("s1")
+        self.assertEqual(self.manager.get_stats()["streams"], 0)
+
+    def test_feed_splits_pushed_chunks(self):
+        data = b"".join(b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + f + b"\r\n" for f in self.frames)
+        data += b"--frame\r\n"
+        parser = MJPEGParser(b"frame")
+        received = []
+        for i in range(0, len(data), 500):
+            received.extend(bytes(view) for view in parser.feed(data[i:i + 500]))
+        self.assertEqual(received, self.frames)
+
+    def test_mjpeg_stream_is_read_on_the_shared_loop(self):
+        body = b"".join(
+            b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % len(f) + f + b"\r\n"
+            for f in self.frames
+        )
+
+        async def chunks():
+            for i in range(0, len(body), 4096):
+                yield body[i:i + 4096]
+
+        camera = httpx.MockTransport(lambda request: httpx.Response(
+            200, headers={"content-type": "multipart/x-mixed-replace; boundary=frame"}, content=chunks(),
+        ))
+
+        async def use_camera():
+            self.manager.client = httpx.AsyncClient(transport=camera)
+
+        self.manager.submit(use_camera()).result(timeout=2)
+        proc = VideoStreamProcessor("loop-test", "http://camera/stream", "http://x/", frame_interval=0, cache_size=0)
+
+        with mock.patch.object(video_processor, "get_stream_manager", return_value=self.manager), \
+                mock.patch.object(video_processor, "add_frame_processing_task") as add_task:
+            self.assertTrue(proc.start())
+            self.assertTrue(wait_for(lambda: add_task.call_count == 3))
+            self.assertEqual(proc.get_status()["capture"], "event_loop")
+            self.assertIsNone(proc._thread)
+            proc.stop()
+
+        self.assertEqual([call[0][2] for call in add_task.call_args_list], self.frames)
+        self.assertEqual(self.manager.get_stats()["streams"], 0)
+
+
+class CapturePoolTests(SimpleTestCase):
+    def test_relay_sink_ships_sampled_frames_as_jpeg(self):
+        results = queue.Queue()
+        sink = _RelaySink("s1", results, jpeg_quality=80, frame_interval=1.0)
+        sink.state(True, None)
+        sink.state(True, None)
+        self.assertTrue(sink.sample(road_image(), 12.5))
+
+        self.assertEqual(results.get_nowait(), ("opened", "s1", True, None))
+        kind, stream_id, data, now = results.get_nowait()
+        self.assertEqual((kind, stream_id, now), ("frame", "s1", 12.5))
+        self.assertEqual(cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR).shape, (240, 320, 3))
+        self.assertTrue(results.empty())
+
+    def test_streams_are_captured_in_worker_processes(self):
+        pool = CapturePool(processes=2, jpeg_quality=80)
+        self.addCleanup(pool.shutdown)
+        path = video_file()
+        samples = {"a": [], "b": []}
+        stats = {"a": [], "b": []}
+
+        for stream_id in samples:
+            error = pool.start_stream(
+                stream_id, path, 0, lambda data, now, s=stream_id: samples[s].append(data), stats[stream_id].append,
+            )
+            self.assertIsNone(error)
+
+        # The second stream goes to the idle worker
+        self.assertEqual({pool.stream_worker("a"), pool.stream_worker("b")}, {0, 1})
+        self.assertTrue(wait_for(lambda: len(samples["a"]) == 20 and len(samples["b"]) == 20, timeout=20))
+        self.assertTrue(wait_for(lambda: any(s.get("last_error") for s in stats["a"]), timeout=5))
+
+        frame = cv2.imdecode(np.frombuffer(samples["a"][0], dtype=np.uint8), cv2.IMREAD_COLOR)
+        self.assertEqual(frame.shape, (120, 160, 3))
+        self.assertEqual([w["streams"] for w in pool.get_stats()["workers"]], [1, 1])
+
+    def test_unopenable_source_fails_synchronously(self):
+        pool = CapturePool(processes=1)
+        self.addCleanup(pool.shutdown)
+        error = pool.start_stream("missing", "/nonexistent/road.mp4", 1, lambda *a: None, lambda s: None)
+        self.assertIn("/nonexistent/road.mp4", error)
+        self.assertIsNone(pool.stream_worker("missing"))
+
+
+class RecordingSink:
+    def __init__(self):
+        self.reads, self.samples, self.states = 0, [], []
+
+    def frame_read(self, now):
+        self.reads += 1
+
+    def sample(self, frame, now):
+        self.samples.append(frame)
+        return True
+
+    def state(self, connection_active, error):
+        self.states.append((connection_active, error))
+
+
+class CapturePacingTests(SimpleTestCase):
+    def sequential_frames(self, path):
+        cap = cv2.VideoCapture(path)
+        frames = []
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                return frames
+            frames.append(frame)
+
+    def test_file_samples_seek_to_each_timestamp(self):
+        path = video_file(frames=130, fps=10)
+        sink = RecordingSink()
+        run_opencv_capture(path, 6, sink, lambda: True)
+
+        # 60 frames apart: only the three sampled frames are decoded
+        self.assertEqual(sink.reads, 3)
+        frames = self.sequential_frames(path)
+        for sample, index in zip(sink.samples, (0, 60, 120)):
+            np.testing.assert_array_equal(sample, frames[index])
+        self.assertEqual(sink.states[-1][0], False)
+
+    def test_short_intervals_grab_and_retrieve_only_sampled_frames(self):
+        path = video_file(frames=30, fps=10)
+        sink = RecordingSink()
+        retrieve = mock.Mock(wraps=cv2.VideoCapture.retrieve)
+        with mock.patch.object(opencv_capture.cv2.VideoCapture, "retrieve", lambda cap, *a: retrieve(cap, *a)):
+            run_opencv_capture(path, 1, sink, lambda: True)
+
+        self.assertEqual(sink.reads, 30)
+        self.assertEqual(len(sink.samples), 3)
+        self.assertEqual(retrieve.call_count, 3)
+        frames = self.sequential_frames(path)
+        np.testing.assert_array_equal(sink.samples[1], frames[10])
+
+    def test_file_source_waits_for_queue_room_instead_of_dropping(self):
+        proc = VideoStreamProcessor("paced-test", video_file(), "http://x/", max_queue_size=1, cache_size=0)
+        proc.is_running = True
+        self.assertTrue(proc._paced)
+        queue = mock.Mock()
+        queue.task_queue.qsize.side_effect = [1, 1, 0, 0]
+
+        with mock.patch.object(video_processor, "frame_queue", queue), \
+                mock.patch.object(video_processor, "QUEUE_WAIT_POLL_S", 0), \
+                mock.patch.object(video_processor, "add_frame_processing_task") as add_task:
+            self.assertTrue(_ProcessorSink(proc).sample(road_image(), time.time()))
+
+        add_task.assert_called_once()
+        self.assertEqual(proc.get_status()["frames_dropped"], 0)
+
+    def test_live_source_frame_is_dropped_when_the_queue_is_full(self):
+        proc = VideoStreamProcessor("live-test", "rtsp://camera/stream", "http://x/", max_queue_size=1, cache_size=0)
+        self.assertFalse(proc._paced)
+        queue = mock.Mock()
+        queue.task_queue.qsize.return_value = 1
+
+        with mock.patch.object(video_processor, "frame_queue", queue), \
+                mock.patch.object(video_processor, "add_frame_processing_task") as add_task:
+            self.assertFalse(_ProcessorSink(proc).sample(road_image(), time.time()))
+
+        add_task.assert_not_called()
+        self.assertEqual(proc.get_status()["frames_dropped"], 1)
+
+    def test_file_sources_stay_out_of_the_capture_pool(self):
+        proc = VideoStreamProcessor("pool-test", video_file(), "http://x/", frame_interval=60)
+        pool = mock.Mock()
+        with mock.patch.object(video_processor, "get_capture_pool", return_value=pool):
+            self.assertTrue(proc.start())
+            proc.stop()
+
+        pool.start_stream.assert_not_called()
+
+
+class StreamSupervisorTests(SimpleTestCase):
+    def setUp(self):
+        self.socket_path = os.path.join(tempfile.mkdtemp(), "streams.sock")
+
+    def serve(self):
+        # The server marks this process as the supervisor; the tests are also its client
+        serving = mock.patch.object(stream_supervisor, "_serving", False)
+        server = SupervisorServer(self.socket_path)
+        serving.start()
+        self.addCleanup(serving.stop)
+        server.serve_in_thread()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_one_json_line_request_per_connection(self):
+        self.serve()
+        client = SupervisorClient(self.socket_path)
+        self.assertEqual(client.call("ping"), {"pid": os.getpid()})
+        self.assertIsNone(client.call("status", stream_id="missing"))
+        with self.assertRaisesRegex(RuntimeError, "Unknown operation"):
+            client.call("reboot")
+
+    def test_unreachable_supervisor(self):
+        with self.assertRaises(SupervisorUnavailable):
+            SupervisorClient(self.socket_path, timeout=1).call("ping")
+
+    def test_stale_socket_is_replaced_but_a_live_one_is_not(self):
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.socket_path)
+        stale.close()
+        self.serve()
+        self.assertEqual(SupervisorClient(self.socket_path).call("ping")["pid"], os.getpid())
+
+        with self.assertRaisesRegex(RuntimeError, "already listening"):
+            SupervisorServer(self.socket_path)
+
+    def test_stats_are_read_from_the_supervisor(self):
+        server = self.serve()
+        server.operations["detector_stats"] = lambda: {"available": True, "where": "supervisor"}
+        server.operations["queue_stats"] = lambda: {"queue_size": 7}
+
+        with override_settings(STREAM_SUPERVISOR_SOCKET=self.socket_path):
+            self.assertEqual(get_detector_stats(), {"available": True, "where": "supervisor"})
+            self.assertEqual(get_queue_stats(), {"queue_size": 7})
+            data = self.client.get(reverse("frame-processing-stats")).json()["data"]
+
+        self.assertEqual(data["detector"]["where"], "supervisor")
+        self.assertEqual(data["queue_size"], 7)
+
+
+class RendezvousTests(SimpleTestCase):
+    def test_pick_node_is_stable_and_skips_zero_weight(self):
+        nodes = [("a", 1), ("b", 1), ("c", 0)]
+        for i in range(50):
+            stream_id = f"s{i}"
+            winner = pick_node(stream_id, nodes)
+            self.assertIn(winner, ("a", "b"))
+            self.assertEqual(pick_node(stream_id, list(reversed(nodes))), winner)
+        self.assertIsNone(pick_node("s", [("a", 0)]))
+
+    def test_share_follows_weight(self):
+        wins = sum(pick_node(f"stream-{i}", [("big", 2), ("small", 1)]) == "big" for i in range(3000))
+        self.assertAlmostEqual(wins / 3000, 2 / 3, delta=0.04)
+
+    def test_removing_a_node_only_moves_its_streams(self):
+        three = [("a", 1), ("b", 1), ("c", 1)]
+        two = [("a", 1), ("b", 1)]
+        for i in range(200):
+            before = pick_node(f"s{i}", three)
+            if before != "c":
+                self.assertEqual(pick_node(f"s{i}", two), before)
+
+
+class StreamClaimTests(TestCase):
+    def setUp(self):
+        self.addCleanup(setattr, stream_supervisor, "_serving", stream_supervisor._serving)
+        patcher = mock.patch.object(StreamNodeAgent, "_schedule_start")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        VideoStream.objects.create(stream_id="s1", video_source="x.mp4", detection_api_url="http://x/")
+
+    def test_live_lease_cannot_be_claimed(self):
+        now = timezone.now()
+        VideoStream.objects.filter(stream_id="s1").update(lease_owner="a", lease_expires_at=now + timedelta(seconds=30))
+        b = StreamNodeAgent("b", lease_s=30)
+        b._claim(now, [("b", 50, 0)])
+        self.assertEqual(b.claimed, 0)
+        self.assertEqual(VideoStream.objects.get(stream_id="s1").lease_owner, "a")
+
+    def test_expired_lease_goes_to_rendezvous_winner_only(self):
+        now = timezone.now()
+        VideoStream.objects.filter(stream_id="s1").update(lease_owner="dead", lease_expires_at=now - timedelta(seconds=1))
+        nodes = [("a", 50, 0), ("b", 50, 0)]
+        agents = {node_id: StreamNodeAgent(node_id, lease_s=30) for node_id, _, _ in nodes}
+        for agent in agents.values():
+            agent._claim(now, nodes)
+        winner = pick_node("s1", [("a", 50), ("b", 50)])
+        self.assertEqual(VideoStream.objects.get(stream_id="s1").lease_owner, winner)
+        self.assertEqual([agents[n].claimed for n in ("a", "b")], [int(winner == "a"), int(winner == "b")])
+
+    def test_full_node_is_not_a_candidate(self):
+        now = timezone.now()
+        a = StreamNodeAgent("a", lease_s=30)
+        a._claim(now, [("full", 1, 1), ("a", 50, 0)])
+        self.assertEqual(VideoStream.objects.get(stream_id="s1").lease_owner, "a")
+
+
+class FrameRelayTests(SimpleTestCase):
+    def test_slow_viewer_skips_to_newest(self):
+        ring = FrameRing(size=2)
+        for i in range(5):
+            ring.publish(b"%d" % i, float(i))
+        frames = iter_frames(ring, idle_timeout=0.1)
+        self.assertEqual(next(frames)[2], b"4")
+        self.assertEqual(ring.viewers, 1)
+        ring.close()
+        self.assertEqual(list(frames), [])
+        self.assertEqual(ring.viewers, 0)
+
+    def test_viewer_slot_released_on_close(self):
+        with self.settings(STREAM_LIVE_MAX_VIEWERS=1):
+            self.assertTrue(acquire_viewer_slot())
+            self.assertFalse(acquire_viewer_slot())
+            body = LiveResponseBody(iter([(1, 0.0, b"jpeg")]))
+            self.assertIn(b"jpeg", next(body))
+            body.close()
+            body.close()
+            self.assertTrue(acquire_viewer_slot())
+
+
+class AdaptiveIntervalTests(SimpleTestCase):
+    def test_interval_stays_within_bounds(self):
+        sampler = AdaptiveInterval(5.0, 1.0, 60.0)
+        now = 0.0
+        for _ in range(200):
+            now += 1.0
+            interval = sampler.update(now, queue_depth=0, queue_limit=10, active_streams=1, workers=4)
+            self.assertGreaterEqual(interval, 1.0)
+        self.assertEqual(interval, 1.0)
+
+        for _ in range(20):
+            now += 1.0
+            interval = sampler.update(now, queue_depth=10, queue_limit=10, active_streams=1, workers=4)
+            self.assertLessEqual(interval, 60.0)
+        self.assertEqual(interval, 60.0)
+        self.assertGreater(sampler.backoffs, 0)
+
+    def test_congestion_halves_the_rate(self):
+        sampler = AdaptiveInterval(4.0, 1.0, 60.0)
+        self.assertEqual(sampler.update(1.0, 5, 10, 1, 4), 8.0)
+
+    def test_interval_respects_fair_share(self):
+        sampler = AdaptiveInterval(1.0, 1.0, 60.0)
+        sampler.observe(latency_s=2.0, service_s=2.0)
+        # 2 s per detection, 4 streams over 2 workers: at least 4 s apart
+        self.assertEqual(sampler.update(1.0, 0, 10, active_streams=4, workers=2), 4.0)
+
+    def test_no_update_before_period(self):
+        sampler = AdaptiveInterval(4.0, 1.0, 60.0, update_period_s=5.0)
+        first = sampler.update(1.0, 0, 10, 1, 1)
+        self.assertEqual(sampler.update(2.0, 10, 10, 1, 1), first)
+
+
+    def test_stream_shares_the_detection_slots_fairly(self):
+        proc = VideoStreamProcessor(
+            "adaptive-test", "x.mp4", "http://x/", frame_interval=1, cache_size=0, track_min_hits=0,
+            adaptive_sampling=True, min_interval=1.0, max_interval=60.0,
+        )
+        proc._frame_done({"detection_count": 0}, b"jpeg", 1, None, sample_time=0.0, started=1.0, finished=9.0)
+        # 8 s per detection, 2 streams over 4 in-process detection slots
+        with mock.patch.dict(video_processor._active_streams, {"a": None, "b": None}, clear=True), \
+                mock.patch.object(video_processor, "get_detection_slots", return_value=(None, 4)):
+            self.assertEqual(proc._current_interval(now=100.0), 4.0)
+
+
+class FrameQualityGateTests(SimpleTestCase):
+    def test_quality_gate_reasons(self):
+        gate = FrameQualityGate()
+        sharp = road_image(4)
+        self.assertIsNone(gate.check(gray_thumbnail(sharp)))
+        self.assertEqual(gate.check(gray_thumbnail(np.zeros_like(sharp))), "exposure")
+        self.assertEqual(gate.check(gray_thumbnail(cv2.GaussianBlur(sharp, (31, 31), 0))), "blur")
+
+    def test_rejected_frames_are_counted_and_not_queued(self):
+        proc = VideoStreamProcessor(
+            "quality-test", "rtsp://cam/", "http://x/", cache_size=0, track_min_hits=0, quality_gate={},
+        )
+        sink = _ProcessorSink(proc)
+        with mock.patch.object(proc, "_enqueue_detection", return_value=True) as enqueue:
+            self.assertFalse(sink.sample(np.zeros((240, 320, 3), dtype=np.uint8), 1.0))
+            self.assertFalse(sink.sample(cv2.GaussianBlur(road_image(5), (31, 31), 0), 2.0))
+            self.assertTrue(sink.sample(road_image(5), 3.0))
+
+        self.assertEqual(enqueue.call_count, 1)
+        status = proc.get_status()
+        self.assertEqual(status["frames_rejected_exposure"], 1)
+        self.assertEqual(status["frames_rejected_blur"], 1)
+
+
+class SceneChangeGateTests(SimpleTestCase):
+    def test_scene_gate_waits_for_motion(self):
+        gate = SceneChangeGate()
+        frame = cv2.cvtColor(road_image(3), cv2.COLOR_BGR2GRAY)
+        self.assertTrue(gate.check(frame))
+        gate.accept()
+        # An exposure step is not motion
+        self.assertFalse(gate.check(np.clip(frame.astype(np.int16) + 20, 0, 255).astype(np.uint8)))
+        self.assertTrue(gate.static)
+        self.assertTrue(gate.check(np.roll(frame, 40, axis=0)))
+
+    def test_static_scene_is_not_sampled_again(self):
+        proc = VideoStreamProcessor(
+            "scene-test", "rtsp://cam/", "http://x/", cache_size=0, track_min_hits=0, scene_gate={},
+        )
+        sink = _ProcessorSink(proc)
+        frame = road_image(6)
+        with mock.patch.object(proc, "_enqueue_detection", return_value=True) as enqueue:
+            self.assertTrue(sink.sample(frame, 1.0))
+            self.assertFalse(sink.sample(frame.copy(), 2.0))
+            self.assertTrue(sink.sample(np.roll(frame, 40, axis=0), 3.0))
+
+        self.assertEqual(enqueue.call_count, 2)
+        self.assertEqual(proc.get_status()["frames_static"], 1)
+
+    def test_dropped_sample_does_not_become_the_reference(self):
+        proc = VideoStreamProcessor(
+            "scene-drop-test", "rtsp://cam/", "http://x/", cache_size=0, track_min_hits=0, scene_gate={},
+        )
+        sink = _ProcessorSink(proc)
+        frame = road_image(7)
+        with mock.patch.object(proc, "_enqueue_detection", return_value=False):
+            self.assertFalse(sink.sample(frame, 1.0))
+        with mock.patch.object(proc, "_enqueue_detection", return_value=True):
+            self.assertTrue(sink.sample(frame, 2.0))
+
+
+class DistanceIntervalTests(SimpleTestCase):
+    def drive(self, track, speed_mps, seconds, t0=1000.0):
+        metres_per_deg = 111_195.0
+        for t in range(seconds + 1):
+            track.update_fix(12.9716 + speed_mps * t / metres_per_deg, 77.5946, t0 + t)
+        return t0 + seconds
+
+    def test_interval_follows_speed(self):
+        track = DeviceTrack(1)
+        now = self.drive(track, 20.0, 10)
+        self.assertAlmostEqual(DistanceInterval(track, every_m=40, max_s=60).interval(now), 2.0, delta=0.1)
+
+    def test_parked_device_samples_at_max_interval(self):
+        track = DeviceTrack(1)
+        rng = np.random.default_rng(0)
+        for t in range(30):
+            track.update_fix(12.9716 + rng.normal(0, 2e-5), 77.5946 + rng.normal(0, 2e-5), 1000.0 + t)
+        self.assertEqual(DistanceInterval(track, every_m=40, max_s=60).interval(1029.0), 60)
+
+    def test_stale_or_missing_fix_falls_back(self):
+        track = DeviceTrack(1)
+        distance = DistanceInterval(track, every_m=40, stale_s=15)
+        self.assertIsNone(distance.interval(1000.0))
+        now = self.drive(track, 20.0, 5)
+        self.assertIsNotNone(distance.interval(now + 10))
+        self.assertIsNone(distance.interval(now + 16))
+
+    def test_gps_glitch_is_ignored(self):
+        track = DeviceTrack(1)
+        now = self.drive(track, 10.0, 5)
+        track.update_fix(13.5, 77.5946, now + 1)  # ~60 km in a second
+        self.assertAlmostEqual(track.get_fix()[1], 10.0, delta=0.5)
+
+
+class DeviceGPSUpdateTests(TestCase):
+    def test_fix_time_is_recorded_with_position_only(self):
+        user = User.objects.create(username="u", email="u@example.com", phone="1", password="x")
+        device = IOTDevice.objects.create(device_type="esp32", mac_id="aa:bb", registered_by=user, owner=user)
+        url = reverse("device-gps-update", args=[device.pk])
+
+        self.client.post(url, {"ip": "10.0.0.2"}, content_type="application/json")
+        device.refresh_from_db()
+        self.assertIsNone(device.last_location_at)
+
+        self.client.post(url, {"lat": 12.97, "lng": 77.59}, content_type="application/json")
+        device.refresh_from_db()
+        self.assertIsNotNone(device.last_location_at)
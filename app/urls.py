@@ -8,7 +8,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     UserViewSet, IOTDeviceViewSet, PotholeViewSet, AlertViewSet, LoginView,
-    VideoStreamView, VideoStreamStatusView, FrameProcessingView,
+    VideoStreamView, VideoStreamStatusView, VideoStreamLiveView, FrameProcessingView,
     DeviceControlProxyView, DeviceGPSUpdateView, DashboardView
 )
 
@@ -26,6 +26,7 @@ urlpatterns = [
     path('video-stream/status/', VideoStreamStatusView.as_view(), name='video-stream-status'),
     path('video-stream/', VideoStreamView.as_view(), name='video-stream-post'),
     path('video-stream/<str:stream_id>/', VideoStreamView.as_view(), name='video-stream-delete'),
+    path('video-stream/<str:stream_id>/live/', VideoStreamLiveView.as_view(), name='video-stream-live'),
     # Frame processing endpoints
     path('frame-processing/', FrameProcessingView.as_view(), name='frame-processing-stats'),
     path('frame-processing/<str:task_id>/', FrameProcessingView.as_view(), name='frame-processing-task'),
@@ -0,0 +1,146 @@
+"""
+Asyncio client for the Hugging Face Gradio detector API.
+
+A single event loop runs on a dedicated daemon thread and drives every remote
+call through one httpx.AsyncClient, so hundreds of SSE waits can be in flight
+without tying up a thread each. Synchronous callers use submit(), which returns
+a concurrent.futures.Future.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 multiplexing of SSE streams)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# on_upload(nbytes, seconds, ok, timed_out)
+UploadCallback = Callable[[int, float, bool, bool], None]
+
+
+class AsyncGradioClient:
+    def __init__(
+        self,
+        upload_url: str,
+        call_url: str,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        max_in_flight: int = 500,
+        upload_timeout: float = 60,
+        call_timeout: float = 15,
+        result_timeout: float = 60,
+    ):
+        self.upload_url = upload_url
+        self.call_url = call_url
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.max_in_flight = max_in_flight
+        self.upload_timeout = upload_timeout
+        self.call_timeout = call_timeout
+        self.result_timeout = result_timeout
+
+        self._loop = asyncio.new_event_loop()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._in_flight: Optional[asyncio.Semaphore] = None
+
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, args=(ready,), name="DetectorEventLoop", daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def _run_loop(self, ready: threading.Event) -> None:
+        asyncio.set_event_loop(self._loop)
+        # The client and semaphore must be created on the loop that uses them
+        self._client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+            ),
+        )
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        ready.set()
+        self._loop.run_forever()
+
+    async def upload(self, jpeg_bytes: bytes) -> Optional[str]:
+        files = {"files": ("frame.jpg", jpeg_bytes, "image/jpeg")}
+        response = await self._client.post(self.upload_url, files=files, timeout=self.upload_timeout)
+        if response.status_code == 200:
+            return response.json()[0]
+        logger.error("File upload failed: HTTP %s", response.status_code)
+        return None
+
+    async def create_task(self, remote_path: str) -> Optional[str]:
+        payload = {"data": [{"path": remote_path}]}
+        response = await self._client.post(self.call_url, json=payload, timeout=self.call_timeout)
+        if response.status_code != 200:
+            logger.error("Failed to create task: %s", response.text)
+            return None
+        return response.json().get("event_id")
+
+    async def await_result(self, event_id: str) -> Optional[List[list]]:
+        """Reads the SSE stream until 'complete'. Returns raw boxes, or None on a remote error."""
+        result_url = f"{self.call_url}/{event_id}"
+        current_event = None
+
+        async with self._client.stream("GET", result_url, timeout=self.result_timeout) as r:
+            async for line in r.aiter_lines():
+                if not line:
+                    continue
+                if line.startswith("event:"):
+                    current_event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data_str = line[len("data:"):].strip()
+                    if current_event == "complete":
+                        data = json.loads(data_str)
+                        if isinstance(data, list) and len(data) >= 2:
+                            return data[1]  # [annotated_image, detections_list]
+                        return []
+                    elif current_event == "error":
+                        logger.error("Remote AI Error: %s", data_str)
+                        return None
+        logger.error("Result stream for %s ended without a 'complete' event", event_id)
+        return None
+
+    async def predict(self, jpeg_bytes: bytes, on_upload: Optional[UploadCallback] = None) -> Optional[List[list]]:
+        """
+        Upload, create task and wait for the result. Returns raw boxes or None on failure.
+        on_upload(nbytes, seconds, ok, timed_out) is called once the upload step finishes.
+        """
+        async with self._in_flight:
+            try:
+                started = time.monotonic()
+                timed_out = False
+                try:
+                    remote_path = await self.upload(jpeg_bytes)
+                except Exception as e:
+                    remote_path = None
+                    timed_out = isinstance(e, httpx.TimeoutException)
+                    raise
+                finally:
+                    if on_upload is not None:
+                        on_upload(len(jpeg_bytes), time.monotonic() - started, bool(remote_path), timed_out)
+                if not remote_path:
+                    return None
+                event_id = await self.create_task(remote_path)
+                if not event_id:
+                    return None
+                return await self.await_result(event_id)
+            except Exception as e:
+                logger.error("Detector error: %s", str(e))
+                return None
+
+    def submit(self, jpeg_bytes: bytes, on_upload: Optional[UploadCallback] = None) -> Future:
+        """Thread-safe entry point: schedules predict() on the loop and returns a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(self.predict(jpeg_bytes, on_upload), self._loop)
@@ -0,0 +1,355 @@
+"""
+Capture worker processes for OpenCV sources (RTSP/H.264, local files).
+
+cap.read() decodes every frame, and with several such streams in the Django
+process the Python side of that work serialises on the GIL and starves API
+requests. With STREAM_CAPTURE_PROCESSES > 0 those streams are captured in a
+pool of spawned worker processes instead: each worker runs the shared OpenCV
+capture loop per stream, JPEG-encodes sampled frames and sends them back over
+a pipe, where the stream's processor queues them for detection as usual.
+
+New streams go to the worker with the lowest load (sum of its streams' read
+rates); per-stream stats are relayed back once a second. A worker that dies
+is respawned and its streams restarted on it.
+"""
+
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STATS_INTERVAL_S = 1.0
+
+
+# -- worker process side -----------------------------------------------------
+
+
+class _RelaySink:
+    """Capture sink inside a worker: counts frames and ships sampled ones to the parent."""
+
+    def __init__(self, stream_id: str, results, jpeg_quality: int, frame_interval: float, screen=None):
+        from .frame_quality import make_screen
+
+        self.stream_id = stream_id
+        self.frame_interval = frame_interval
+        self.screen = make_screen(screen)
+        self.skipped: Dict[str, int] = {}
+        self.results = results
+        self.jpeg_quality = jpeg_quality
+        self.running = True
+        self.opened = False
+        self.frames_read = 0
+        self.connection_active = False
+        self.last_frame_time: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def frame_read(self, now: float) -> None:
+        self.frames_read += 1
+        self.last_frame_time = now
+
+    def sample(self, frame, now: float) -> bool:
+        import cv2
+
+        if self.screen is not None:
+            reason = self.screen.check_frame(frame)
+            if reason is not None:
+                self.skipped[reason] = self.skipped.get(reason, 0) + 1
+                return False
+        ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            return False
+        self.results.put(("frame", self.stream_id, buffer.tobytes(), now))
+        if self.screen is not None:
+            self.screen.accept()
+        return True
+
+    def state(self, connection_active: bool, error: Optional[str]) -> None:
+        self.connection_active = connection_active
+        if error:
+            self.last_error = error
+        if not self.opened:
+            # First state report answers the parent's start request
+            self.opened = True
+            self.results.put(("opened", self.stream_id, connection_active, error))
+
+
+def _capture_stream(sink: _RelaySink, source: str) -> None:
+    from .opencv_capture import run_opencv_capture
+
+    # The parent may retune the interval while the stream runs (adaptive sampling)
+    run_opencv_capture(source, lambda: sink.frame_interval, sink, lambda: sink.running)
+    sink.connection_active = False
+    if sink.running:
+        sink.results.put(("ended", sink.stream_id, sink.last_error))
+
+
+def _worker_main(index: int, commands, results, jpeg_quality: int) -> None:
+    """Entry point of a capture worker process."""
+    logging.basicConfig(level=logging.INFO)
+    sinks: Dict[str, _RelaySink] = {}
+    counted: Dict[str, tuple] = {}  # stream_id -> (frames_read, time) at the last stats report
+    next_stats = time.monotonic() + STATS_INTERVAL_S
+
+    while True:
+        try:
+            command = commands.get(timeout=max(0.0, next_stats - time.monotonic()))
+        except queue.Empty:
+            command = None
+
+        if command is not None:
+            kind = command[0]
+            if kind == "start":
+                _, stream_id, source, frame_interval, screen = command
+                sink = _RelaySink(stream_id, results, jpeg_quality, frame_interval, screen)
+                sinks[stream_id] = sink
+                threading.Thread(
+                    target=_capture_stream, args=(sink, source),
+                    name=f"Capture-{stream_id}", daemon=True,
+                ).start()
+            elif kind == "interval":
+                sink = sinks.get(command[1])
+                if sink is not None:
+                    sink.frame_interval = command[2]
+            elif kind == "stop":
+                sink = sinks.pop(command[1], None)
+                counted.pop(command[1], None)
+                if sink is not None:
+                    sink.running = False
+            elif kind == "shutdown":
+                for sink in sinks.values():
+                    sink.running = False
+                return
+
+        now = time.monotonic()
+        if now >= next_stats:
+            next_stats = now + STATS_INTERVAL_S
+            for stream_id, sink in sinks.items():
+                frames, then = counted.get(stream_id, (0, now - STATS_INTERVAL_S))
+                counted[stream_id] = (sink.frames_read, now)
+                results.put(("stats", stream_id, {
+                    "frames_read": sink.frames_read,
+                    "read_fps": round((sink.frames_read - frames) / max(now - then, 1e-3), 1),
+                    "connection_active": sink.connection_active,
+                    "last_frame_time": sink.last_frame_time,
+                    "last_error": sink.last_error,
+                    "skipped": dict(sink.skipped),
+                    "scene_static": sink.screen is not None and sink.screen.static,
+                }))
+
+
+# -- parent side -------------------------------------------------------------
+
+
+class _Stream:
+    def __init__(self, stream_id: str, source: str, frame_interval: float, screen, on_sample, on_stats, worker: int):
+        self.stream_id = stream_id
+        self.source = source
+        self.frame_interval = frame_interval
+        self.screen = screen
+        self.on_sample = on_sample
+        self.on_stats = on_stats
+        self.worker = worker
+        self.read_fps = 0.0
+        self.opened: Future = Future()
+
+
+class CapturePool:
+    def __init__(self, processes: int, jpeg_quality: int = 90):
+        self.processes = max(1, int(processes))
+        self.jpeg_quality = jpeg_quality
+        # spawn, not fork: the parent is a threaded Django process
+        self._ctx = multiprocessing.get_context("spawn")
+        self._results = self._ctx.Queue()
+        self._commands: List[Any] = []
+        self._workers: List[Any] = []
+        self._streams: Dict[str, _Stream] = {}
+        self._lock = threading.Lock()
+        self.restarts = 0
+        self._spawned_at = [0.0] * self.processes
+        self._restart_at = [0.0] * self.processes
+        self._fast_failures = [0] * self.processes
+
+        for index in range(self.processes):
+            self._commands.append(self._ctx.Queue())
+            self._workers.append(self._spawn(index))
+
+        self._dispatcher = threading.Thread(target=self._dispatch, name="CapturePoolDispatch", daemon=True)
+        self._dispatcher.start()
+
+    def _spawn(self, index: int):
+        self._spawned_at[index] = time.monotonic()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self._commands[index], self._results, self.jpeg_quality),
+            name=f"CaptureWorker-{index}",
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    def _load(self, index: int) -> float:
+        # A stream that has not reported yet counts as 1 frame/s
+        return sum(max(s.read_fps, 1.0) for s in self._streams.values() if s.worker == index)
+
+    def start_stream(
+        self,
+        stream_id: str,
+        source: str,
+        frame_interval: float,
+        on_sample: Callable[[bytes, float], None],
+        on_stats: Callable[[Dict[str, Any]], None],
+        timeout: float = 30.0,
+        screen: Optional[Dict[str, Any]] = None,
+    ) -> Optional[str]:
+        """
+        Starts capturing on the least-loaded worker and waits until the source
+        opened. `screen` holds FrameScreen options ({"scene": ..., "quality": ...})
+        to screen due frames with in the worker (None = no gates). Returns None
+        on success, else the error message.
+        """
+        with self._lock:
+            if stream_id in self._streams:
+                return f"Stream {stream_id} is already capturing"
+            worker = min(range(self.processes), key=self._load)
+            stream = _Stream(stream_id, source, frame_interval, screen, on_sample, on_stats, worker)
+            self._streams[stream_id] = stream
+            self._commands[worker].put(("start", stream_id, source, frame_interval, screen))
+
+        try:
+            active, error = stream.opened.result(timeout=timeout)
+        except Exception:
+            active, error = False, f"Timed out opening video source: {source}"
+        if not active:
+            self.stop_stream(stream_id)
+            return error or f"Failed to open video source: {source}"
+        return None
+
+    def stop_stream(self, stream_id: str) -> None:
+        with self._lock:
+            stream = self._streams.pop(stream_id, None)
+            if stream is not None:
+                self._commands[stream.worker].put(("stop", stream_id))
+
+    def set_interval(self, stream_id: str, frame_interval: float) -> None:
+        """Changes a running stream's sampling interval."""
+        with self._lock:
+            stream = self._streams.get(stream_id)
+            if stream is not None:
+                stream.frame_interval = frame_interval
+                self._commands[stream.worker].put(("interval", stream_id, frame_interval))
+
+    def stream_worker(self, stream_id: str) -> Optional[int]:
+        stream = self._streams.get(stream_id)
+        return stream.worker if stream else None
+
+    def _dispatch(self) -> None:
+        next_check = time.monotonic() + STATS_INTERVAL_S
+        while True:
+            if time.monotonic() >= next_check:
+                next_check = time.monotonic() + STATS_INTERVAL_S
+                self._check_workers()
+            try:
+                message = self._results.get(timeout=STATS_INTERVAL_S)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+
+            kind, stream_id = message[0], message[1]
+            stream = self._streams.get(stream_id)
+            if stream is None:
+                continue
+            try:
+                if kind == "frame":
+                    stream.on_sample(message[2], message[3])
+                elif kind == "stats":
+                    stream.read_fps = message[2]["read_fps"]
+                    stream.on_stats(message[2])
+                elif kind == "opened":
+                    if not stream.opened.done():
+                        stream.opened.set_result((message[2], message[3]))
+                elif kind == "ended":
+                    stream.on_stats({"connection_active": False, "last_error": message[2] or "Stream ended"})
+            except Exception as e:
+                logger.error("Capture pool: handling %s for stream %s failed: %s", kind, stream_id, str(e))
+
+    def _check_workers(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for index, process in enumerate(self._workers):
+                if process.is_alive():
+                    continue
+                if self._restart_at[index] == 0.0:
+                    # A worker that dies right after starting would otherwise be respawned
+                    # every second; back off exponentially while that keeps happening
+                    quick = now - self._spawned_at[index] < 10.0
+                    self._fast_failures[index] = self._fast_failures[index] + 1 if quick else 0
+                    delay = min(2.0 ** self._fast_failures[index], 60.0) if quick else 0.0
+                    self._restart_at[index] = now + delay
+                    logger.error(
+                        "Capture worker %d exited (code %s), restarting in %.0fs", index, process.exitcode, delay
+                    )
+                    for stream in self._streams.values():
+                        if stream.worker == index:
+                            stream.read_fps = 0.0
+                            stream.on_stats({
+                                "read_fps": 0.0, "connection_active": False, "last_error": "Capture worker exited",
+                            })
+                if now < self._restart_at[index]:
+                    continue
+
+                self._restart_at[index] = 0.0
+                self.restarts += 1
+                self._commands[index] = self._ctx.Queue()
+                self._workers[index] = self._spawn(index)
+                for stream in self._streams.values():
+                    if stream.worker == index:
+                        self._commands[index].put(
+                            ("start", stream.stream_id, stream.source, stream.frame_interval, stream.screen)
+                        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "restarts": self.restarts,
+                "workers": [
+                    {
+                        "pid": process.pid,
+                        "alive": process.is_alive(),
+                        "streams": sum(1 for s in self._streams.values() if s.worker == index),
+                        "load_fps": round(self._load(index), 1),
+                    }
+                    for index, process in enumerate(self._workers)
+                ],
+            }
+
+    def shutdown(self) -> None:
+        for commands in self._commands:
+            commands.put(("shutdown",))
+
+
+_pool: Optional[CapturePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_capture_pool() -> Optional[CapturePool]:
+    """Returns the process-wide capture pool, or None when STREAM_CAPTURE_PROCESSES is 0."""
+    global _pool
+    if _pool is not None:
+        return _pool
+
+    from django.conf import settings
+
+    processes = getattr(settings, 'STREAM_CAPTURE_PROCESSES', 0)
+    if processes <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = CapturePool(processes=processes)
+    return _pool
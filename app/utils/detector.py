@@ -1,142 +1,746 @@
 import cv2
+import io
+import logging
 import numpy as np
 import os
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import time
 import uuid
+import threading
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from PIL import Image
 
-class PotholeDetector:
-    def __init__(self):
+from .async_client import AsyncGradioClient
+from .mosaic import MosaicBatcher
+from .resilience import CircuitBreaker, Timer
+from .upload_tuner import UploadTuner
+
+logger = logging.getLogger(__name__)
+
+
+# DCT-domain JPEG downscaling factors and their imread flags, largest first
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def read_image_size(source):
+    """Reads (width, height) from an image header (bytes or path) without decoding pixels."""
+    try:
+        with Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source) as im:
+            return im.size
+    except Exception:
+        return None
+
+
+def reduced_decode_flag(size, target_size):
+    """
+    Picks the largest reduced-decode factor that still leaves the image at
+    least target_size. Sides are compared long-to-long and short-to-short so
+    an EXIF rotation applied by imread cannot undershoot the target.
+    Returns (factor, imread flag).
+    """
+    if not size or not target_size:
+        return 1, cv2.IMREAD_COLOR
+    long_side, short_side = max(size), min(size)
+    target_long, target_short = max(target_size), min(target_size)
+    for factor, flag in REDUCED_DECODE_FLAGS:
+        if long_side // factor >= target_long and short_side // factor >= target_short:
+            return factor, flag
+    return 1, cv2.IMREAD_COLOR
+
+
+def _full_scale(img, size):
+    """(sx, sy) mapping coordinates in a reduced decode back to the full-resolution image."""
+    full_w, full_h = size
+    img_h, img_w = img.shape[:2]
+    if (img_w > img_h) != (full_w > full_h) and img_w != img_h:
+        full_w, full_h = full_h, full_w  # imread applied an EXIF rotation
+    return full_w / img_w, full_h / img_h
+
+
+def decode_image(data, target_size=None):
+    """
+    Decodes encoded image bytes (JPEG/PNG) into a BGR array.
+    With target_size (width, height), large JPEGs are decoded at 1/2, 1/4 or
+    1/8 scale straight from the DCT coefficients instead of at full size.
+    Returns (image or None if undecodable, (sx, sy) back to full resolution).
+    """
+    if not data:
+        return None, (1.0, 1.0)
+    size = read_image_size(data) if target_size else None
+    factor, flag = reduced_decode_flag(size, target_size)
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flag)
+    if img is None or factor == 1:
+        return img, (1.0, 1.0)
+    return img, _full_scale(img, size)
+
+
+def read_image(image_path, target_size=None):
+    """File counterpart of decode_image(); returns (image or None, (sx, sy))."""
+    size = read_image_size(image_path) if target_size else None
+    factor, flag = reduced_decode_flag(size, target_size)
+    img = cv2.imread(image_path, flag)
+    if img is None or factor == 1:
+        return img, (1.0, 1.0)
+    return img, _full_scale(img, size)
+
+
+# Severity levels by depth heuristic, with their annotation colours (BGR)
+SEVERITY_LEVELS = np.array(['low', 'medium', 'high'])
+SEVERITY_COLORS = {'low': (0, 255, 0), 'medium': (0, 165, 255), 'high': (0, 0, 255)}
+
+
+def as_box_array(detections_data):
+    """
+    Packs raw boxes into an (N, 6) float array of [x1, y1, x2, y2, confidence, class_id],
+    dropping malformed rows.
+    """
+    if isinstance(detections_data, np.ndarray):
+        return detections_data.reshape(-1, 6).astype(np.float64, copy=False)
+    rows = [
+        box_data[:6] for box_data in detections_data or []
+        if isinstance(box_data, (list, tuple)) and len(box_data) >= 6
+    ]
+    if not rows:
+        return np.empty((0, 6), dtype=np.float64)
+    return np.asarray(rows, dtype=np.float64)
+
+
+def scale_boxes(detections_data, sx, sy):
+    """Maps boxes from a resized image back onto the source; returns an (N, 6) array."""
+    boxes = as_box_array(detections_data).copy()
+    boxes[:, [0, 2]] *= sx
+    boxes[:, [1, 3]] *= sy
+    return boxes
+
+
+def compute_detections(img_shape, detections_data):
+    """
+    Applies the depth/severity heuristics to every box in one NumPy pass.
+    Returns the list of detection dicts (no drawing, no encoding).
+    """
+    boxes = as_box_array(detections_data)
+    if len(boxes) == 0:
+        return []
+
+    img_h, img_w = img_shape[:2]
+    rel_area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]) / (img_h * img_w)
+    depth = np.round(rel_area * 50, 2)
+    severity = SEVERITY_LEVELS[(depth > 5).astype(np.intp) + (depth > 15)]
+
+    return [
+        {
+            'bbox': box[:4].tolist(),
+            'confidence': float(box[4]),
+            'severity': str(sev),
+            'depth': float(d),
+        }
+        for box, d, sev in zip(boxes, depth, severity)
+    ]
+
+
+def render_annotation(img, detections):
+    """Draws detections on a copy of img and encodes it; None when there is nothing to draw."""
+    if not detections:
+        return None
+
+    img = img.copy()
+    for det in detections:
+        x1, y1, x2, y2 = (int(v) for v in det['bbox'])
+        color = SEVERITY_COLORS[det['severity']]
+        cv2.rectangle(img, (x1, y1), (x2, y2), color, 3)
+        cv2.putText(img, f"Pothole: {det['depth']}cm", (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+
+    success, buffer = cv2.imencode('.jpg', img)
+    return buffer.tobytes() if success else None
+
+
+def build_detections(img, detections_data, annotate=True):
+    """
+    Shared by every detector backend so they all return the same contract.
+    The annotated JPEG is only rendered when there are detections and annotate
+    is set; callers that defer it can use render_annotation() later.
+    Returns (list of detections, annotated_image_bytes).
+    """
+    detections = compute_detections(img.shape, detections_data)
+    if not annotate:
+        return detections, None
+    return detections, render_annotation(img, detections)
+
+
+def _resolve(future, value):
+    """Sets a result unless the future was already settled or cancelled (e.g. past its deadline)."""
+    if not future.done():
+        try:
+            future.set_result(value)
+        except InvalidStateError:
+            pass
+
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session(pool_maxsize=10):
+    """
+    Returns the process-wide keep-alive session used for Hugging Face calls.
+    Connections are pooled per host (at most pool_maxsize, callers block when
+    exhausted) so upload, task creation and SSE reuse TCP+TLS connections.
+    """
+    global _http_session
+    if _http_session is not None:
+        return _http_session
+
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, pool_block=True)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+
+    return _http_session
+
+
+class DetectionError(Exception):
+    """The detector could not produce a result for an image (not the same as finding no potholes)."""
+
+
+def _failed(error):
+    future = Future()
+    future.set_exception(error)
+    return future
+
+
+class BaseDetector:
+    """
+    Input adapters shared by every backend. Each image is decoded exactly once,
+    at reduced resolution when it is much larger than decode_target, and the
+    annotation is drawn on that same decode; subclasses implement
+    detect_array(), and submit_array() when they can keep several images in
+    flight without holding the caller's thread.
+    """
+
+    # (width, height) the backend scales its input to; None decodes at full size
+    decode_target = None
+
+    def detect_array(self, img, annotate=True):
+        raise NotImplementedError
+
+    def submit_array(self, img, annotate=True):
+        """Future of detect_array(); this default runs it in the calling thread."""
+        future = Future()
+        try:
+            future.set_result(self.detect_array(img, annotate=annotate))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def detect(self, image_path, annotate=True):
+        """Runs detection on an image file. Returns (list of detections, annotated_image_bytes)."""
+        img, scale = read_image(image_path, self.decode_target)
+        if img is None:
+            raise DetectionError(f"Could not read image {image_path}")
+        return self._submit_scaled(img, scale, annotate).result()
+
+    def detect_bytes(self, data, annotate=True):
+        """Runs detection on encoded image bytes without touching the filesystem."""
+        return self.submit_bytes(data, annotate=annotate).result()
+
+    def submit_bytes(self, data, annotate=True):
+        """
+        Queues detection of encoded image bytes and returns a Future of
+        (list of detections, annotated_image_bytes). The image is decoded in
+        the calling thread; remote backends then return without waiting for
+        the result.
+        """
+        img, scale = decode_image(data, self.decode_target)
+        if img is None:
+            return _failed(DetectionError("Could not decode image"))
+        return self._submit_scaled(img, scale, annotate)
+
+    def _submit_scaled(self, img, scale, annotate):
+        """
+        Runs submit_array() on a reduced decode and maps bboxes back to
+        full-resolution coordinates. Depth and severity come from relative
+        area so they are unchanged; the annotated image stays at decode size
+        (never below decode_target), so the original is not decoded again.
+        """
+        sx, sy = scale
+        inner = self.submit_array(img, annotate=annotate)
+        if sx == 1.0 and sy == 1.0:
+            return inner
+
+        scaled = Future()
+
+        def _done(f):
+            try:
+                detections, annotated_image_bytes = f.result()
+            except Exception as e:
+                scaled.set_exception(e)
+                return
+            for det in detections:
+                x1, y1, x2, y2 = det['bbox']
+                det['bbox'] = [x1 * sx, y1 * sy, x2 * sx, y2 * sy]
+            scaled.set_result((detections, annotated_image_bytes))
+
+        inner.add_done_callback(_done)
+        return scaled
+
+    def get_stats(self):
+        """Backend health/timing counters for the frame-processing stats endpoint."""
+        return {}
+
+
+class PotholeDetector(BaseDetector):
+    def __init__(
+        self,
+        upload_workers=2,
+        max_in_flight=8,
+        batch_size=1,
+        batch_max_wait=0.05,
+        transport="async",
+        async_max_in_flight=500,
+        deadline=20.0,
+        hedge=False,
+        breaker=None,
+        upload_tuner=None,
+    ):
         self.space_id = "RohithGangarapu/PotholeYoloV8-NEW"
         self.space_url = "https://rohithgangarapu-potholeyolov8-new.hf.space"
         self.upload_url = f"{self.space_url}/gradio_api/upload"
         self.call_url = f"{self.space_url}/gradio_api/call/predict"
 
-    def _upload_file(self, file_path):
-        try:
-            img = cv2.imread(file_path)
-            if img is None:
-                return None
+        if transport not in ("async", "sync"):
+            raise ValueError(f"Unknown detector transport: {transport}")
+        self.transport = transport
 
-            # 🔥 Resize before upload (CRITICAL)
-            img = cv2.resize(img, (640, 480))
+        if transport == "sync":
+            # Every SSE wait holds a connection, so size the pool for uploads + waits
+            self.session = get_http_session(pool_maxsize=upload_workers + max_in_flight)
 
-            _, buffer = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 75])
+            # Two-stage pipeline: uploads/task creation and SSE waits run on separate
+            # pools, so the next frame uploads while the previous result is streaming.
+            self._upload_pool = ThreadPoolExecutor(max_workers=upload_workers, thread_name_prefix="DetectorUpload")
+            self._result_pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="DetectorResult")
 
+        # Async transport: one event-loop thread holds every in-flight SSE wait (created on first use)
+        self.async_max_in_flight = async_max_in_flight
+        self._async_client = None
+        self._async_client_lock = threading.Lock()
+
+        # Latency budget: one total deadline per inference, a circuit breaker that fails
+        # fast on a cold/overloaded Space, and an optional hedge once the first call passes p90.
+        self.deadline = deadline
+        self.hedge = hedge
+        self.breaker = breaker or CircuitBreaker()
+        self._timer = Timer()
+        self._deadline_misses = 0
+        self._hedges_sent = 0
+        self._hedges_won = 0
+
+        # Upload resolution/quality adapt to measured uplink throughput (a one-level
+        # tuner keeps them fixed); raw boxes are always mapped back to upload_size.
+        self.tuner = upload_tuner or UploadTuner(max_size=self.upload_size, min_width=self.upload_size[0], min_quality=75)
+
+        # Mosaic batching: tile up to batch_size frames queued within batch_max_wait into one call
+        self._batcher = None
+        if batch_size > 1:
+            self._batcher = MosaicBatcher(
+                run_raw=self._submit_raw,
+                finish=self._finish_source,
+                canvas_size=self.upload_size,
+                max_batch=batch_size,
+                max_wait=batch_max_wait,
+            )
+
+    # Size the Space was trained/benchmarked with; raw boxes are reported in this space
+    upload_size = (640, 480)
+    decode_target = upload_size
+
+    def _encode_upload(self, img, settings):
+        # 🔥 Resize before upload (CRITICAL)
+        img = cv2.resize(img, (settings.width, settings.height))
+
+        _, buffer = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, settings.quality])
+        return buffer.tobytes()
+
+    def _upload_image(self, img, settings):
+        data = self._encode_upload(img, settings)
+        started = time.monotonic()
+        remote_path = None
+        timed_out = False
+        try:
             files = {
-                "files": ("frame.jpg", buffer.tobytes(), "image/jpeg")
+                "files": ("frame.jpg", data, "image/jpeg")
             }
 
-            response = requests.post(
+            response = self.session.post(
                 self.upload_url,
                 files=files,
                 timeout=60   # ⬆ increased
             )
 
             if response.status_code == 200:
-                return response.json()[0]
+                remote_path = response.json()[0]
 
         except Exception as e:
+            timed_out = isinstance(e, requests.Timeout)
             print(f"File upload failed: {e}")
 
-        return None
+        self.tuner.record_upload(settings, len(data), time.monotonic() - started, bool(remote_path), timed_out)
+        return remote_path
+
+    def _start_task(self, img, settings):
+        """Stage 1: upload the image and create the inference task. Returns the event id or None."""
+        # 1. Upload the in-memory image
+        print(f"Preparing image for remote detection ({settings.label})...")
+        remote_path = self._upload_image(img, settings)
+        if not remote_path:
+            print("Failed to upload image to remote API.")
+            return None
+
+        # 2. Create Inference Task
+        print("Creating inference task on Hugging Face...")
+        payload = {"data": [{"path": remote_path}]}
+        response = self.session.post(self.call_url, json=payload, timeout=15)
+
+        if response.status_code != 200:
+            print(f"Failed to create task: {response.text}")
+            return None
+
+        return response.json().get("event_id")
+
+    def _await_result(self, event_id):
+        """Stage 2: read the SSE stream until 'complete'. Returns raw boxes, or None on a remote error."""
+        result_url = f"{self.call_url}/{event_id}"
+
+        # 3. Listen for SSE Result
+        print(f"Waiting for AI result (Event: {event_id})...")
+        # Stays None if the stream ends without a 'complete' event
+        detections_data = None
+
+        # We poll until we get the 'complete' event or timeout
+        with self.session.get(result_url, stream=True, timeout=60) as r:
+            current_event = None
+            for line in r.iter_lines():
+                if not line: continue
+                decoded = line.decode('utf-8')
+
+                if decoded.startswith("event:"):
+                    current_event = decoded.replace("event:", "").strip()
+                elif decoded.startswith("data:"):
+                    data_str = decoded.replace("data:", "").strip()
+
+                    if current_event == "complete":
+                        data = json.loads(data_str)
+                        detections_data = []
+                        if isinstance(data, list) and len(data) >= 2:
+                            detections_data = data[1] # [annotated_image, detections_list]
+                        break
+                    elif current_event == "error":
+                        print(f"Remote AI Error: {data_str}")
+                        return None
+
+        return detections_data
+
+    def _collect(self, event_id, raw):
+        try:
+            _resolve(raw, self._await_result(event_id))
+        except Exception as e:
+            logger.error("Detector error: %s", str(e))
+            _resolve(raw, None)
+
+    def _get_async_client(self):
+        if self._async_client is None:
+            with self._async_client_lock:
+                if self._async_client is None:
+                    self._async_client = AsyncGradioClient(
+                        self.upload_url, self.call_url, max_in_flight=self.async_max_in_flight
+                    )
+        return self._async_client
+
+    def _dispatch_raw(self, img, settings):
+        """Sends one inference over the configured transport; Future of raw boxes (upload space) or None."""
+        if self.transport == "async":
+            try:
+                return self._get_async_client().submit(
+                    self._encode_upload(img, settings),
+                    on_upload=lambda *upload: self.tuner.record_upload(settings, *upload),
+                )
+            except Exception as e:
+                logger.error("Detector error: %s", str(e))
+                failed = Future()
+                failed.set_result(None)
+                return failed
+
+        raw = Future()
+
+        def _after_upload(upload_future):
+            try:
+                event_id = upload_future.result()
+            except Exception as e:
+                logger.error("Detector error: %s", str(e))
+                event_id = None
+
+            if not event_id or raw.done():
+                _resolve(raw, None)
+                return
+            self._result_pool.submit(self._collect, event_id, raw)
+
+        self._upload_pool.submit(self._start_task, img, settings).add_done_callback(_after_upload)
+        return raw
+
+    def _dispatch_scaled(self, img):
+        """
+        Dispatches img at the tuner's current settings. Returns a Future of raw
+        boxes mapped back to upload_size (or None), with the settings used in
+        its `meta` dict.
+        """
+        settings = self.tuner.current()
+        scaled = Future()
+        scaled.meta = {"upload": settings}
+        inner = self._dispatch_raw(img, settings)
+        up_w, up_h = self.upload_size
+
+        def _done(f):
+            if f.cancelled():
+                scaled.cancel()
+                return
+            try:
+                value = f.result()
+                if value is not None and (settings.width, settings.height) != self.upload_size:
+                    value = scale_boxes(value, up_w / settings.width, up_h / settings.height)
+            except Exception as e:
+                logger.error("Detector error: %s", str(e))
+                value = None
+            _resolve(scaled, value)
 
-    def detect(self, image_path):
+        inner.add_done_callback(_done)
+        # Cancelling the attempt (deadline/hedge won) must reach the real request
+        scaled.add_done_callback(lambda f: inner.cancel() if f.cancelled() else None)
+        return scaled
+
+    def _submit_raw(self, img):
+        """
+        Uploads img (at the tuner's current settings) and returns a Future of
+        the raw boxes in upload_size space, or None if any remote step failed,
+        the circuit is open or the total deadline passed. raw.meta["upload"]
+        holds the settings of the attempt that produced the value.
+        """
+        raw = Future()
+        raw.meta = {}
+        if not self.breaker.allow_request():
+            raw.set_result(None)
+            return raw
+
+        started = time.monotonic()
+        attempts = []
+        lock = threading.Lock()
+
+        def _settle(value, hedged=False, timed_out=False, meta=None):
+            with lock:
+                if raw.done():
+                    return
+                if meta:
+                    raw.meta = meta
+                raw.set_result(value)
+                if timed_out:
+                    self._deadline_misses += 1
+                if hedged and value is not None:
+                    self._hedges_won += 1
+            Timer.cancel(deadline_handle)
+            if hedge_handle is not None:
+                Timer.cancel(hedge_handle)
+            latency = time.monotonic() - started
+            self.breaker.record(latency, value is not None)
+            if meta:
+                self.tuner.record_latency(meta["upload"], latency, value is not None)
+            # Stop whatever is still running for this frame (async tasks are cancelled outright)
+            for attempt in attempts:
+                attempt.cancel()
+
+        def _launch(hedged=False):
+            try:
+                attempt = self._dispatch_scaled(img)
+            except Exception as e:
+                logger.error("Detector error: %s", str(e))
+                if not hedged:
+                    _settle(None)
+                return
+            attempts.append(attempt)
+
+            def _done(f):
+                if f.cancelled():
+                    return
+                try:
+                    value = f.result()
+                except Exception as e:
+                    logger.error("Detector error: %s", str(e))
+                    value = None
+                # One failed attempt must not mask another that may still succeed
+                if value is None and any(not other.done() for other in attempts if other is not f):
+                    return
+                _settle(value, hedged=hedged, meta=attempt.meta)
+
+            attempt.add_done_callback(_done)
+
+        def _fire_hedge():
+            if raw.done() or self.breaker.state != CircuitBreaker.CLOSED:
+                return
+            self._hedges_sent += 1
+            logger.info("Detector call passed p90, sending hedged request")
+            _launch(hedged=True)
+
+        deadline_handle = self._timer.call_later(self.deadline, lambda: _settle(None, timed_out=True))
+        hedge_handle = None
+        if self.hedge and len(self.breaker.tracker) >= self.breaker.min_requests:
+            p90 = self.breaker.tracker.percentile(90)
+            if p90 is not None and p90 < self.deadline:
+                hedge_handle = self._timer.call_later(p90, _fire_hedge)
+
+        _launch()
+        return raw
+
+    def get_stats(self):
+        return {
+            "backend": "remote",
+            "transport": self.transport,
+            "deadline_s": self.deadline,
+            "deadline_misses": self._deadline_misses,
+            "hedging": self.hedge,
+            "hedges_sent": self._hedges_sent,
+            "hedges_won": self._hedges_won,
+            "circuit_breaker": self.breaker.get_stats(),
+            "upload": self.tuner.get_stats(),
+        }
+
+    def _finish_source(self, img, boxes, annotate=True, upload=None):
+        """
+        4. Local Annotation on the already-decoded source image (boxes in source coordinates).
+        Each detection records the upload settings it was inferred at.
+        Raises DetectionError when the remote call failed (boxes is None).
+        """
+        if boxes is None:
+            raise DetectionError("Remote detection failed")
+        logger.debug("Processing %d remote detections", len(boxes))
+        detections, annotated_image_bytes = build_detections(img, boxes, annotate=annotate)
+        if upload is not None:
+            for det in detections:
+                det['upload'] = upload.as_dict()
+        return detections, annotated_image_bytes
+
+    def submit_array(self, img, annotate=True):
+        """
+        Queues remote detection of a decoded BGR image and returns a Future
+        resolving to (list of detections, annotated_image_bytes), or raising
+        DetectionError if the remote call failed. Callers with several frames
+        in flight get upload/SSE overlap for free.
+        """
+        if self._batcher is not None:
+            return self._batcher.submit(img, annotate=annotate)
+
+        result = Future()
+        img_h, img_w = img.shape[:2]
+        up_w, up_h = self.upload_size
+
+        def _done(raw_future):
+            try:
+                detections_data = raw_future.result()
+                boxes = None
+                if detections_data is not None:
+                    boxes = scale_boxes(detections_data, img_w / up_w, img_h / up_h)
+                result.set_result(self._finish_source(img, boxes, annotate=annotate, **raw_future.meta))
+            except Exception as e:
+                result.set_exception(e)
+
+        self._submit_raw(img).add_done_callback(_done)
+        return result
+
+    def detect_array(self, img, annotate=True):
         """
         Runs remote detection using raw HTTP/SSE requests (bypassing gradio_client).
-        Returns (list of detections, annotated_image_bytes).
+        Returns (list of detections, annotated_image_bytes); raises DetectionError on failure.
         """
-        try:
-            # 1. Upload file if it's local
-            print(f"Preparing image for remote detection...")
-            remote_path = self._upload_file(image_path)
-            if not remote_path:
-                print("Failed to upload image to remote API.")
-                return [], None
-
-            # 2. Create Inference Task
-            print("Creating inference task on Hugging Face...")
-            payload = {"data": [{"path": remote_path}]}
-            response = requests.post(self.call_url, json=payload, timeout=15)
-            
-            if response.status_code != 200:
-                print(f"Failed to create task: {response.text}")
-                return [], None
-
-            event_id = response.json().get("event_id")
-            result_url = f"{self.call_url}/{event_id}"
-
-            # 3. Listen for SSE Result
-            print(f"Waiting for AI result (Event: {event_id})...")
-            detections_data = []
-            
-            # We poll until we get the 'complete' event or timeout
-            with requests.get(result_url, stream=True, timeout=60) as r:
-                current_event = None
-                for line in r.iter_lines():
-                    if not line: continue
-                    decoded = line.decode('utf-8')
-                    
-                    if decoded.startswith("event:"):
-                        current_event = decoded.replace("event:", "").strip()
-                    elif decoded.startswith("data:"):
-                        data_str = decoded.replace("data:", "").strip()
-                        
-                        if current_event == "complete":
-                            data = json.loads(data_str)
-                            if isinstance(data, list) and len(data) >= 2:
-                                detections_data = data[1] # [annotated_image, detections_list]
-                            break
-                        elif current_event == "error":
-                            print(f"Remote AI Error: {data_str}")
-                            return [], None
-
-            # 4. Local Annotation
-            print(f"Processing {len(detections_data)} remote detections...")
-            img = cv2.imread(image_path)
-            if img is None:
-                return [], None
-            
-            img_h, img_w, _ = img.shape
-            detections = []
-
-            for box_data in detections_data:
-                # Expecting [x1, y1, x2, y2, confidence, class_id]
-                if not isinstance(box_data, list) or len(box_data) < 6:
-                    continue
-                
-                x1, y1, x2, y2, conf, cls_id = box_data
-                
-                # Heuristics for depth & severity
-                rel_area = ((x2 - x1) * (y2 - y1)) / (img_h * img_w)
-                depth = round(rel_area * 50, 2)
-                
-                if depth > 15:
-                    severity, color = 'high', (0, 0, 255)
-                elif depth > 5:
-                    severity, color = 'medium', (0, 165, 255)
-                else:
-                    severity, color = 'low', (0, 255, 0)
-                
-                # Draw on image
-                cv2.rectangle(img, (int(x1), int(y1)), (int(x2), int(y2)), color, 3)
-                cv2.putText(img, f"Pothole: {depth}cm", (int(x1), int(y1) - 10), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
-                
-                detections.append({
-                    'bbox': [float(x1), float(y1), float(x2), float(y2)],
-                    'confidence': float(conf),
-                    'severity': severity,
-                    'depth': float(depth),
-                })
-
-            # Encode annotated image
-            success, buffer = cv2.imencode('.jpg', img)
-            annotated_image_bytes = buffer.tobytes() if success else None
-            
-            return detections, annotated_image_bytes
+        return self.submit_array(img, annotate=annotate).result()
 
-        except Exception as e:
-            print(f"Detector error: {str(e)}")
-            return [], None
+
+_detector_instance = None
+_detector_lock = threading.Lock()
+
+
+def get_detector():
+    """
+    Returns the process-wide detector selected by settings.DETECTOR_BACKEND.
+    'remote' uses the Hugging Face Space, 'local' runs the ONNX model in-process.
+    The instance (and the model it loads) is created once per process.
+    """
+    global _detector_instance
+    if _detector_instance is not None:
+        return _detector_instance
+
+    with _detector_lock:
+        if _detector_instance is None:
+            from django.conf import settings
+
+            backend = getattr(settings, 'DETECTOR_BACKEND', 'remote')
+            if backend == 'local':
+                from .local_detector import LocalPotholeDetector
+                _detector_instance = LocalPotholeDetector(
+                    model_path=settings.DETECTOR_MODEL_PATH,
+                    engine=getattr(settings, 'DETECTOR_ENGINE', 'auto'),
+                    num_threads=getattr(settings, 'DETECTOR_NUM_THREADS', 0),
+                )
+            elif backend == 'remote':
+                _detector_instance = PotholeDetector(
+                    upload_workers=getattr(settings, 'DETECTOR_UPLOAD_WORKERS', 2),
+                    max_in_flight=getattr(settings, 'DETECTOR_MAX_IN_FLIGHT', 8),
+                    batch_size=getattr(settings, 'DETECTOR_BATCH_SIZE', 1),
+                    batch_max_wait=getattr(settings, 'DETECTOR_BATCH_MAX_WAIT_MS', 50) / 1000.0,
+                    transport=getattr(settings, 'DETECTOR_TRANSPORT', 'async'),
+                    async_max_in_flight=getattr(settings, 'DETECTOR_ASYNC_MAX_IN_FLIGHT', 500),
+                    upload_tuner=UploadTuner(
+                        max_size=PotholeDetector.upload_size,
+                        min_width=getattr(settings, 'DETECTOR_UPLOAD_MIN_WIDTH', 384),
+                        max_quality=getattr(settings, 'DETECTOR_UPLOAD_MAX_QUALITY', 75),
+                        min_quality=getattr(settings, 'DETECTOR_UPLOAD_MIN_QUALITY', 50),
+                        levels=getattr(settings, 'DETECTOR_UPLOAD_LEVELS', 5),
+                        budget_s=getattr(settings, 'DETECTOR_UPLOAD_BUDGET_S', 2.0),
+                    ),
+                    deadline=getattr(settings, 'DETECTOR_DEADLINE_S', 20.0),
+                    hedge=getattr(settings, 'DETECTOR_HEDGE', False),
+                    breaker=CircuitBreaker(
+                        error_rate_threshold=getattr(settings, 'DETECTOR_BREAKER_ERROR_RATE', 0.5),
+                        p95_threshold=getattr(settings, 'DETECTOR_BREAKER_P95_S', 15.0),
+                        min_requests=getattr(settings, 'DETECTOR_BREAKER_MIN_REQUESTS', 10),
+                        cooldown=getattr(settings, 'DETECTOR_BREAKER_COOLDOWN_S', 30.0),
+                    ),
+                )
+            else:
+                raise ValueError(f"Unknown DETECTOR_BACKEND: {backend}")
+
+    return _detector_instance
+
+
+def get_detector_stats():
+    """
+    Stats of the detector that runs stream detections: the stream
+    supervisor's when one is configured, else this process's. A detector
+    that cannot be created (e.g. a missing local model) is reported as
+    unavailable instead of raising.
+    """
+    from .stream_supervisor import get_supervisor_client
+
+    client = get_supervisor_client()
+    if client is not None:
+        return client.call("detector_stats")
+    try:
+        return get_detector().get_stats()
+    except Exception as e:
+        return {"available": False, "error": str(e)}
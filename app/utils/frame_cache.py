@@ -0,0 +1,105 @@
+"""
+Perceptual-hash result cache for sampled stream frames.
+
+A parked or crawling vehicle keeps sampling nearly the same scene. Each frame
+is reduced to a 64-bit difference hash (dHash) of a tiny grayscale thumbnail;
+a frame within a small Hamming distance of a recent pothole-free one is not
+sent to the detector again. Frames with detections are not cached, since a
+pothole coming into view next to them may not move the hash.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+import cv2
+import numpy as np
+
+# Marker for a hash whose detection is still in flight
+_PENDING = object()
+
+
+def dhash(frame: np.ndarray, hash_size: int = 8) -> int:
+    """Difference hash: sign of horizontal gradients on a (hash_size+1) x hash_size thumbnail."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def dhash_jpeg(jpeg_bytes: bytes, hash_size: int = 8) -> Optional[int]:
+    """dHash straight from JPEG bytes via a 1/8-scale grayscale DCT decode; None if undecodable."""
+    thumb = cv2.imdecode(np.frombuffer(jpeg_bytes, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if thumb is None:
+        return None
+    return dhash(thumb, hash_size)
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class PerceptualHashCache:
+    """
+    Bounded LRU of frame hash -> detection result for one stream.
+    Entries older than max_age seconds are ignored so a static scene is still
+    re-checked now and then.
+    """
+
+    def __init__(self, max_entries: int = 32, max_distance: int = 5, max_age: float = 300.0):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()  # hash -> (result, stored_at)
+        self._lock = threading.Lock()
+
+    def lookup(self, frame_hash: int) -> Optional[Any]:
+        """
+        Returns the result of a recent near-identical frame (None on a miss).
+        A match whose detection is still in flight counts as a hit and returns
+        an empty dict, since that detection already covers this scene.
+        """
+        now = time.time()
+        with self._lock:
+            for cached_hash in reversed(self._entries):
+                result, stored_at = self._entries[cached_hash]
+                if now - stored_at > self.max_age:
+                    continue
+                if hamming(frame_hash, cached_hash) <= self.max_distance:
+                    self._entries.move_to_end(cached_hash)
+                    self.hits += 1
+                    return {} if result is _PENDING else result
+            self.misses += 1
+            return None
+
+    def reserve(self, frame_hash: int) -> None:
+        """Marks a hash as in flight so frames sampled before its result arrives are not resent."""
+        self._put(frame_hash, _PENDING)
+
+    def store(self, frame_hash: int, result: Any) -> None:
+        self._put(frame_hash, result)
+
+    def discard(self, frame_hash: int) -> None:
+        with self._lock:
+            self._entries.pop(frame_hash, None)
+
+    def _put(self, frame_hash: int, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[frame_hash] = (value, time.time())
+            self._entries.move_to_end(frame_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "cache_hits": self.hits,
+                "cache_misses": self.misses,
+                "cache_entries": len(self._entries),
+            }
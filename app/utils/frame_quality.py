@@ -0,0 +1,173 @@
+"""
+Frame-quality gate for sampled stream frames.
+
+Frames from moving vehicles are often motion-blurred, too dark at night or
+blocked by the dashboard, and each still costs a full detector call. The
+gate scores a small grayscale thumbnail (ANALYSIS_WIDTH wide, about 1 ms per
+frame) and rejects:
+
+  exposure   more than max_clipped of the pixels near black or near white;
+  occlusion  more than max_occluded of the road region (lower two thirds,
+             in a grid of cells) flat and edge-free, as behind a dashboard or
+             a hand over the lens;
+  blur       variance of the Laplacian over the road region below
+             min_sharpness.
+
+Checks run in that order, so a blocked or black frame is not also counted
+as blurred. A rejected frame is not sampled; the capture loops offer the
+next frames until one passes.
+
+FrameScreen runs a due frame through the scene-change gate (see
+scene_change) and this one on a single thumbnail.
+"""
+
+from typing import Any, Dict, Optional
+
+import cv2
+import numpy as np
+
+from .scene_change import SCENE_WIDTH, SceneChangeGate
+
+ANALYSIS_WIDTH = 160
+REJECT_REASONS = ("exposure", "occlusion", "blur")
+# Every reason FrameScreen can skip a due frame for
+SKIP_REASONS = ("static",) + REJECT_REASONS
+
+# Grayscale DCT-domain reductions, largest first
+_REDUCED_GRAYSCALE = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+
+OCCLUSION_GRID = 4
+# A cell is featureless below this edge density and intensity spread
+OCCLUSION_EDGE_DENSITY = 0.01
+OCCLUSION_STD = 6.0
+
+
+def _shrink(gray: np.ndarray, width: int) -> np.ndarray:
+    h, w = gray.shape[:2]
+    if w <= width:
+        return gray
+    return cv2.resize(gray, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+
+
+def gray_thumbnail(frame: np.ndarray, width: int = ANALYSIS_WIDTH) -> np.ndarray:
+    """Grayscale copy of a BGR (or already gray) frame, at most `width` pixels wide."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return _shrink(gray, width)
+
+
+def gray_thumbnail_jpeg(data, width: int = ANALYSIS_WIDTH) -> Optional[np.ndarray]:
+    """
+    Grayscale thumbnail straight from JPEG bytes (or a memoryview), decoded at
+    the largest DCT reduction that stays at least `width` wide. None if the
+    data does not decode.
+    """
+    from .detector import read_image_size
+
+    buf = np.frombuffer(data, dtype=np.uint8)
+    size = read_image_size(data)
+    flag = cv2.IMREAD_GRAYSCALE
+    if size:
+        for factor, reduced in _REDUCED_GRAYSCALE:
+            if size[0] // factor >= width:
+                flag = reduced
+                break
+    gray = cv2.imdecode(buf, flag)
+    if gray is None:
+        return None
+    return _shrink(gray, width)
+
+
+class FrameQualityGate:
+    def __init__(self, min_sharpness: float = 50.0, max_clipped: float = 0.65, max_occluded: float = 0.6):
+        self.min_sharpness = min_sharpness
+        self.max_clipped = max_clipped
+        self.max_occluded = max_occluded
+
+    def check(self, gray: np.ndarray) -> Optional[str]:
+        """Rejection reason for a grayscale thumbnail, or None if the frame is usable."""
+        if self.max_clipped < 1.0:
+            hist = np.bincount(gray.ravel(), minlength=256)
+            clipped = max(hist[:25].sum(), hist[231:].sum()) / gray.size
+            if clipped > self.max_clipped:
+                return "exposure"
+
+        road = gray[gray.shape[0] // 3:]
+        if self.max_occluded < 1.0 and self._occluded_fraction(road) > self.max_occluded:
+            return "occlusion"
+
+        if self.min_sharpness > 0 and cv2.Laplacian(road, cv2.CV_64F).var() < self.min_sharpness:
+            return "blur"
+        return None
+
+    @staticmethod
+    def _occluded_fraction(road: np.ndarray) -> float:
+        edges = cv2.Canny(road, 50, 150)
+        h, w = road.shape
+        flat = 0
+        for i in range(OCCLUSION_GRID):
+            rows = slice(i * h // OCCLUSION_GRID, (i + 1) * h // OCCLUSION_GRID)
+            for j in range(OCCLUSION_GRID):
+                cols = slice(j * w // OCCLUSION_GRID, (j + 1) * w // OCCLUSION_GRID)
+                cell = road[rows, cols]
+                if cell.size == 0:
+                    continue
+                edge_free = np.count_nonzero(edges[rows, cols]) < OCCLUSION_EDGE_DENSITY * cell.size
+                if edge_free and cell.std() < OCCLUSION_STD:
+                    flat += 1
+        return flat / OCCLUSION_GRID ** 2
+
+    def check_frame(self, frame: np.ndarray) -> Optional[str]:
+        return self.check(gray_thumbnail(frame))
+
+    def check_jpeg(self, data) -> Optional[str]:
+        """Like check_frame for JPEG bytes; undecodable data is left to the detection path."""
+        gray = gray_thumbnail_jpeg(data)
+        return self.check(gray) if gray is not None else None
+
+
+class FrameScreen:
+    """
+    Scene-change and quality gates for one stream. `scene` and `quality` are
+    keyword arguments for SceneChangeGate / FrameQualityGate (None = off).
+    """
+
+    def __init__(self, scene: Optional[Dict[str, float]] = None, quality: Optional[Dict[str, float]] = None):
+        self.scene = SceneChangeGate(**scene) if scene is not None else None
+        self.quality = FrameQualityGate(**quality) if quality is not None else None
+        # The scene gate alone gets by with a smaller (cheaper) decode
+        self.width = ANALYSIS_WIDTH if self.quality is not None else SCENE_WIDTH
+
+    def check(self, gray: np.ndarray) -> Optional[str]:
+        """Reason to skip a due frame ("static" or a REJECT_REASONS entry), None to sample it."""
+        if self.scene is not None and not self.scene.check(gray):
+            return "static"
+        if self.quality is not None:
+            return self.quality.check(gray)
+        return None
+
+    def check_frame(self, frame: np.ndarray) -> Optional[str]:
+        return self.check(gray_thumbnail(frame, self.width))
+
+    def check_jpeg(self, data) -> Optional[str]:
+        gray = gray_thumbnail_jpeg(data, self.width)
+        return self.check(gray) if gray is not None else None
+
+    def accept(self) -> None:
+        """Call once the frame last checked was sampled."""
+        if self.scene is not None:
+            self.scene.accept()
+
+    @property
+    def static(self) -> bool:
+        return self.scene is not None and self.scene.static
+
+
+def make_screen(options: Optional[Dict[str, Any]]) -> Optional[FrameScreen]:
+    """FrameScreen from {"scene": ..., "quality": ...} options; None if no gate is on."""
+    if not options or (options.get("scene") is None and options.get("quality") is None):
+        return None
+    return FrameScreen(scene=options.get("scene"), quality=options.get("quality"))
@@ -2,6 +2,7 @@ import threading
 import time
 import queue
 import logging
+from collections import OrderedDict
 from typing import Dict, Any, Callable, Optional
 from dataclasses import dataclass
 from enum import Enum
@@ -32,9 +33,13 @@ class Task:
             self.created_at = time.time()
 
 class FrameQueue:
-    def __init__(self, max_workers=2):
+    def __init__(self, max_workers=2, max_results=1000):
         self.task_queue = queue.Queue()
-        self.result_store = {}
+        # Most recent tasks by id, for status lookups; finished ones beyond
+        # max_results are evicted oldest first
+        self.result_store = OrderedDict()
+        self.max_results = max_results
+        self._store_lock = threading.Lock()
         self.workers = []
         self.max_workers = max_workers
         self.is_running = False
@@ -75,11 +80,26 @@ class FrameQueue:
     def add_task(self, task_id: str, function: Callable, *args, **kwargs) -> str:
         """Add a task to the queue"""
         task = Task(id=task_id, function=function, args=args, kwargs=kwargs)
+        with self._store_lock:
+            self.result_store[task_id] = task
+            self.result_store.move_to_end(task_id)
+            self._evict_finished()
         self.task_queue.put(task)
-        self.result_store[task_id] = task
         logger.debug(f"Added task {task_id} to queue")
         return task_id
         
+    def _evict_finished(self):
+        """Drops the oldest finished tasks while the store holds more than max_results."""
+        excess = len(self.result_store) - self.max_results
+        if excess <= 0:
+            return
+        finished = [
+            task_id for task_id, task in self.result_store.items()
+            if task.status in (TaskStatus.COMPLETED, TaskStatus.FAILED)
+        ]
+        for task_id in finished[:excess]:
+            del self.result_store[task_id]
+
     def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
         """Get the status of a task"""
         task = self.result_store.get(task_id)
@@ -99,14 +119,16 @@ class FrameQueue:
         
     def get_queue_stats(self) -> Dict[str, Any]:
         """Get queue statistics"""
-        completed_tasks = [t for t in self.result_store.values() if t.status == TaskStatus.COMPLETED]
-        failed_tasks = [t for t in self.result_store.values() if t.status == TaskStatus.FAILED]
-        pending_tasks = [t for t in self.result_store.values() if t.status == TaskStatus.PENDING]
-        running_tasks = [t for t in self.result_store.values() if t.status == TaskStatus.RUNNING]
+        with self._store_lock:
+            tasks = list(self.result_store.values())
+        completed_tasks = [t for t in tasks if t.status == TaskStatus.COMPLETED]
+        failed_tasks = [t for t in tasks if t.status == TaskStatus.FAILED]
+        pending_tasks = [t for t in tasks if t.status == TaskStatus.PENDING]
+        running_tasks = [t for t in tasks if t.status == TaskStatus.RUNNING]
         
         return {
             'queue_size': self.task_queue.qsize(),
-            'total_tasks': len(self.result_store),
+            'total_tasks': len(tasks),
             'completed_tasks': len(completed_tasks),
             'failed_tasks': len(failed_tasks),
             'pending_tasks': len(pending_tasks),
@@ -138,6 +160,8 @@ class FrameQueue:
                     
                 finally:
                     task.completed_at = time.time()
+                    # Release the frame bytes and futures the arguments hold
+                    task.function, task.args, task.kwargs = None, (), {}
                     self.task_queue.task_done()
                     
             except queue.Empty:
@@ -149,8 +173,9 @@ class FrameQueue:
 frame_queue = FrameQueue(max_workers=2)
 
 def init_frame_queue():
-    """Initialize the global frame queue"""
-    frame_queue.start()
+    """Initialize the global frame queue (no-op if it is already running)"""
+    if not frame_queue.is_running:
+        frame_queue.start()
     
 def shutdown_frame_queue():
     """Shutdown the global frame queue"""
@@ -162,8 +187,16 @@ def add_frame_processing_task(task_id: str, function: Callable, *args, **kwargs)
 
 def get_task_status(task_id: str) -> Optional[Dict[str, Any]]:
     """Get the status of a frame processing task"""
+    from .stream_supervisor import get_supervisor_client
+    client = get_supervisor_client()
+    if client is not None:
+        return client.call("task_status", task_id=task_id)
     return frame_queue.get_task_status(task_id)
 
 def get_queue_stats() -> Dict[str, Any]:
-    """Get frame queue statistics"""
+    """Get frame queue statistics (of the stream supervisor when one is configured)"""
+    from .stream_supervisor import get_supervisor_client
+    client = get_supervisor_client()
+    if client is not None:
+        return client.call("queue_stats")
     return frame_queue.get_queue_stats()
\ No newline at end of file
@@ -0,0 +1,193 @@
+"""
+Live view relay: one upstream camera connection, any number of viewers.
+
+ESP32-CAM boards serve one or two MJPEG clients at most, so viewers must not
+connect to the camera themselves. Each running stream keeps a FrameRing of
+its latest camera JPEGs, filled by the stream's own capture loop, and
+/video-stream/<id>/live/ re-serves them as multipart/x-mixed-replace.
+
+Frames are only copied into the ring while someone is watching (the MJPEG
+parser otherwise hands out views into its buffer without copying). A viewer
+that keeps up gets frames in order. One that falls further behind than the
+ring holds (a slow connection) skips ahead to the newest frame. A viewer with
+a frame-rate cap always gets the newest frame when its interval is up. Either
+way a slow viewer only drops frames for itself; capture and other viewers are
+unaffected.
+
+Every viewer holds a web server thread for as long as it watches, so each
+web process admits at most STREAM_LIVE_MAX_VIEWERS of them and refuses the
+rest; the server must run threaded (gunicorn gthread) workers with more
+threads than that.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, Optional, Tuple
+
+BOUNDARY = "frame"
+
+# (sequence number, capture time, JPEG bytes)
+Frame = Tuple[int, float, bytes]
+
+
+class FrameRing:
+    def __init__(self, size: int = 4):
+        self._frames: deque = deque(maxlen=max(1, int(size)))
+        self._seq = 0
+        self._cond = threading.Condition()
+        self.closed = False
+        self.viewers = 0
+        self.frames_skipped = 0
+
+    def publish(self, jpeg: bytes, timestamp: float) -> None:
+        with self._cond:
+            self._seq += 1
+            self._frames.append((self._seq, timestamp, jpeg))
+            self._cond.notify_all()
+
+    def next_frame(self, after: int, timeout: float, newest: bool = False) -> Optional[Frame]:
+        """
+        Waits for a frame newer than sequence number `after`. Returns the one
+        right after it while it is still in the ring (or the newest one if
+        `newest`), else the newest; None on timeout or when the ring closes.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.closed or self._seq > after, timeout):
+                return None
+            if self.closed or not self._frames:
+                return None
+            oldest = self._frames[0][0]
+            if newest or after < oldest:
+                frame = self._frames[-1]
+            else:
+                frame = self._frames[after - oldest + 1]
+            if after and frame[0] > after + 1:
+                self.frames_skipped += frame[0] - after - 1
+            return frame
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"viewers": self.viewers, "frames_relayed": self._seq, "frames_skipped": self.frames_skipped}
+
+
+def iter_frames(ring: FrameRing, max_fps: float = 0.0, idle_timeout: float = 30.0) -> Iterator[Frame]:
+    """Frames for one viewer until the ring closes or no frame arrives for idle_timeout seconds."""
+    min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+    after = 0
+    next_at = 0.0
+    with ring._cond:
+        ring.viewers += 1
+    try:
+        while True:
+            if min_interval:
+                delay = next_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            frame = ring.next_frame(after, idle_timeout, newest=bool(min_interval))
+            if frame is None:
+                return
+            after = frame[0]
+            next_at = time.monotonic() + min_interval
+            yield frame
+    finally:
+        with ring._cond:
+            ring.viewers -= 1
+
+
+def multipart_part(jpeg: bytes, timestamp: float) -> bytes:
+    header = (
+        f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n"
+        f"X-Timestamp: {timestamp:.3f}\r\n\r\n"
+    ).encode()
+    return header + jpeg + b"\r\n"
+
+
+_viewers = 0
+_viewers_lock = threading.Lock()
+
+
+def acquire_viewer_slot() -> bool:
+    """Takes one of this process's live-view slots; False when STREAM_LIVE_MAX_VIEWERS (0 = no limit) are in use."""
+    global _viewers
+    from django.conf import settings
+
+    limit = getattr(settings, 'STREAM_LIVE_MAX_VIEWERS', 8)
+    with _viewers_lock:
+        if limit > 0 and _viewers >= limit:
+            return False
+        _viewers += 1
+        return True
+
+
+def release_viewer_slot() -> None:
+    global _viewers
+    with _viewers_lock:
+        _viewers = max(0, _viewers - 1)
+
+
+class LiveResponseBody:
+    """
+    multipart/x-mixed-replace body of one viewer. Owns a slot taken with
+    acquire_viewer_slot() and gives it back when the response is closed,
+    which Django does even if the body was never iterated.
+    """
+
+    def __init__(self, frames: Iterator[Frame]):
+        self._frames = iter(frames)
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        _, timestamp, jpeg = next(self._frames)
+        return multipart_part(jpeg, timestamp)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            close = getattr(self._frames, "close", None)
+            if close is not None:
+                close()
+        finally:
+            release_viewer_slot()
+
+
+_rings: Dict[str, FrameRing] = {}
+_rings_lock = threading.Lock()
+
+
+def open_ring(stream_id: str, size: Optional[int] = None) -> FrameRing:
+    """Creates the ring for a starting stream (replacing and closing any previous one)."""
+    if size is None:
+        from django.conf import settings
+
+        size = getattr(settings, 'STREAM_LIVE_BUFFER_FRAMES', 4)
+    ring = FrameRing(size)
+    with _rings_lock:
+        previous = _rings.get(stream_id)
+        _rings[stream_id] = ring
+    if previous is not None:
+        previous.close()
+    return ring
+
+
+def close_ring(stream_id: str, ring: Optional[FrameRing] = None) -> None:
+    """Closes a stream's ring, ending every viewer's response."""
+    with _rings_lock:
+        current = _rings.get(stream_id)
+        if current is None or (ring is not None and current is not ring):
+            return
+        del _rings[stream_id]
+    current.close()
+
+
+def get_ring(stream_id: str) -> Optional[FrameRing]:
+    return _rings.get(stream_id)
@@ -0,0 +1,162 @@
+"""
+Geo helpers and merge-on-write deduplication for potholes.
+
+Without PostGIS, proximity lookups use a fixed lat/lon grid: every pothole
+stores the integer id of the grid cell holding it (indexed together with
+status), so "unresolved potholes within R metres" reads only the cells
+around the point and then checks the exact haversine distance.
+"""
+
+import logging
+import math
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371008.8
+
+# Grid cell edge in degrees (~111 m of latitude); radii larger than a cell scan more rings
+GEO_CELL_DEG = 0.001
+_GEO_COLS = int(round(360 / GEO_CELL_DEG))
+
+SEVERITY_RANK = {'low': 0, 'medium': 1, 'high': 2}
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in metres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def has_location(latitude: Optional[float], longitude: Optional[float]) -> bool:
+    """0, 0 is what uploads without GPS are stored with; never treat it as a real position."""
+    return latitude is not None and longitude is not None and not (latitude == 0.0 and longitude == 0.0)
+
+
+def _cell_indices(latitude: float, longitude: float) -> Tuple[int, int]:
+    row = int(math.floor((latitude + 90.0) / GEO_CELL_DEG))
+    col = int(math.floor((longitude + 180.0) / GEO_CELL_DEG)) % _GEO_COLS
+    return row, col
+
+
+def geo_cell(latitude: float, longitude: float) -> int:
+    """Integer id of the grid cell containing the point."""
+    row, col = _cell_indices(latitude, longitude)
+    return row * _GEO_COLS + col
+
+
+def neighbour_cells(latitude: float, longitude: float, radius_m: float) -> List[int]:
+    """Ids of every grid cell that may hold a point within radius_m of (latitude, longitude)."""
+    row, col = _cell_indices(latitude, longitude)
+    cell_m = GEO_CELL_DEG * math.pi / 180 * EARTH_RADIUS_M
+    rows = max(1, math.ceil(radius_m / cell_m))
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    cols = max(1, math.ceil(radius_m / (cell_m * cos_lat)))
+    cols = min(cols, _GEO_COLS // 2)
+    return [
+        (row + dr) * _GEO_COLS + (col + dc) % _GEO_COLS
+        for dr in range(-rows, rows + 1)
+        for dc in range(-cols, cols + 1)
+    ]
+
+
+def nearest_within(candidates: Iterable, latitude: float, longitude: float, radius_m: float):
+    """Closest object (with .latitude/.longitude) within radius_m, or None."""
+    best, best_distance = None, radius_m
+    for candidate in candidates:
+        distance = haversine_m(latitude, longitude, candidate.latitude, candidate.longitude)
+        if distance <= best_distance:
+            best, best_distance = candidate, distance
+    return best
+
+
+def get_dedup_radius() -> float:
+    from django.conf import settings
+    return float(getattr(settings, 'POTHOLE_DEDUP_RADIUS_M', 10.0))
+
+
+def _lock_cells(cells: List[int]) -> None:
+    """
+    Locks the grid-cell rows for cells until the transaction ends, creating
+    missing ones. Rows are taken in id order so overlapping neighbourhoods
+    cannot deadlock. Row locks on Pothole alone cannot stop two first
+    sightings of a hole from both inserting, since there is no row to lock yet.
+    """
+    from ..models import GeoCellLock
+
+    cells = sorted(set(cells))
+    GeoCellLock.objects.bulk_create([GeoCellLock(cell=cell) for cell in cells], ignore_conflicts=True)
+    list(GeoCellLock.objects.select_for_update().filter(cell__in=cells).order_by('cell').values_list('cell', flat=True))
+
+
+def record_pothole_sighting(
+    *, device, user, depth: float, severity: str, image, latitude: float, longitude: float,
+    radius_m: Optional[float] = None, exclude_ids: Iterable[int] = (),
+):
+    """
+    Merge-on-write: if an unresolved pothole lies within radius_m, count one
+    more sighting on it (last-seen time, and the worse severity with its depth
+    and image) instead of inserting a duplicate row. Concurrent reports near
+    the same point are serialised on the grid cells around it. Points without
+    a GPS fix and a radius of 0 always insert. Potholes in exclude_ids are
+    never matched (the other detections of the same photo).
+    Returns (pothole, created).
+    """
+    from django.db import transaction
+    from django.db.models import F
+    from django.utils import timezone
+    from ..models import Pothole
+
+    radius_m = get_dedup_radius() if radius_m is None else radius_m
+
+    if radius_m > 0 and has_location(latitude, longitude):
+        cells = neighbour_cells(latitude, longitude, radius_m)
+        with transaction.atomic():
+            _lock_cells(cells)
+            candidates = (
+                Pothole.objects.select_for_update()
+                .filter(status='unresolved', geo_cell__in=cells)
+                .exclude(pk__in=list(exclude_ids))
+                .only('id', 'latitude', 'longitude', 'severity', 'depth')
+            )
+            existing = nearest_within(candidates, latitude, longitude, radius_m)
+            if existing is not None:
+                updates = {'sighting_count': F('sighting_count') + 1, 'last_seen_at': timezone.now()}
+                worse = SEVERITY_RANK.get(severity, 0) > SEVERITY_RANK.get(existing.severity, 0)
+                if worse:
+                    updates['severity'] = severity
+                if worse or depth > existing.depth:
+                    updates['depth'] = max(depth, existing.depth)
+                Pothole.objects.filter(pk=existing.pk).update(**updates)
+
+                pothole = Pothole.objects.get(pk=existing.pk)
+                if worse and image is not None:
+                    pothole.image = image
+                    pothole.save(update_fields=['image'])
+                logger.debug("Merged sighting into pothole %s (%d sightings)", pothole.pk, pothole.sighting_count)
+                return pothole, False
+
+            # Inserted while the cells are still locked, so a concurrent report merges into it
+            return _create_pothole(device, user, depth, severity, image, latitude, longitude), True
+
+    return _create_pothole(device, user, depth, severity, image, latitude, longitude), True
+
+
+def _create_pothole(device, user, depth, severity, image, latitude, longitude):
+    from django.utils import timezone
+    from ..models import Pothole
+
+    return Pothole.objects.create(
+        device=device,
+        user=user,
+        depth=depth,
+        severity=severity,
+        image=image,
+        latitude=latitude,
+        longitude=longitude,
+        status='unresolved',
+        last_seen_at=timezone.now(),
+    )
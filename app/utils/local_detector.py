@@ -0,0 +1,194 @@
+"""
+In-process YOLOv8 pothole detector running on CPU.
+
+The exported ONNX model is loaded once per process and executed through
+ONNX Runtime when it is installed, otherwise through OpenCV's DNN module.
+Results use the same (detections, annotated_image_bytes) contract as the
+remote PotholeDetector.
+"""
+
+import logging
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from .detector import BaseDetector, DetectionError, build_detections
+
+try:
+    import onnxruntime as ort
+except ImportError:  # optional dependency, cv2.dnn is used instead
+    ort = None
+
+logger = logging.getLogger(__name__)
+
+# Loaded engines keyed by (model_path, engine, num_threads), shared by all detector instances
+_engine_cache = {}
+_engine_lock = threading.Lock()
+
+
+class _OnnxRuntimeEngine:
+    """ONNX Runtime session; InferenceSession.run is safe to call from many threads."""
+
+    name = "onnxruntime"
+
+    def __init__(self, model_path: str, num_threads: int = 0):
+        options = ort.SessionOptions()
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            model_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def forward(self, blob: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class _OpenCVDnnEngine:
+    """cv2.dnn engine; a Net is not thread-safe, so each thread builds its own from the cached model bytes."""
+
+    name = "opencv"
+
+    def __init__(self, model_path: str, num_threads: int = 0):
+        with open(model_path, "rb") as f:
+            self._model_bytes = np.frombuffer(f.read(), dtype=np.uint8)
+        if num_threads > 0:
+            cv2.setNumThreads(num_threads)
+        self._local = threading.local()
+        # Parse once up front so a broken model fails at load time, not on the first frame
+        self._get_net()
+
+    def _get_net(self):
+        net = getattr(self._local, "net", None)
+        if net is None:
+            net = cv2.dnn.readNetFromONNX(self._model_bytes)
+            net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+            self._local.net = net
+        return net
+
+    def forward(self, blob: np.ndarray) -> np.ndarray:
+        net = self._get_net()
+        net.setInput(blob)
+        return net.forward()
+
+
+def _load_engine(model_path: str, engine: str = "auto", num_threads: int = 0):
+    key = (os.path.abspath(model_path), engine, num_threads)
+    cached = _engine_cache.get(key)
+    if cached is not None:
+        return cached
+
+    with _engine_lock:
+        cached = _engine_cache.get(key)
+        if cached is not None:
+            return cached
+
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Detector model not found: {model_path}")
+
+        if engine == "onnxruntime" or (engine == "auto" and ort is not None):
+            if ort is None:
+                raise ImportError("DETECTOR_ENGINE=onnxruntime but onnxruntime is not installed")
+            loaded = _OnnxRuntimeEngine(model_path, num_threads)
+        elif engine in ("opencv", "auto"):
+            loaded = _OpenCVDnnEngine(model_path, num_threads)
+        else:
+            raise ValueError(f"Unknown detector engine: {engine}")
+
+        logger.info("Loaded pothole model %s with %s engine", model_path, loaded.name)
+        _engine_cache[key] = loaded
+        return loaded
+
+
+class LocalPotholeDetector(BaseDetector):
+    def __init__(
+        self,
+        model_path: str,
+        engine: str = "auto",
+        input_size: int = 640,
+        conf_threshold: float = 0.25,
+        iou_threshold: float = 0.45,
+        num_threads: int = 0,
+    ):
+        self.model_path = model_path
+        self.input_size = int(input_size)
+        self.decode_target = (self.input_size, self.input_size)
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.engine = _load_engine(model_path, engine, num_threads)
+
+    def _letterbox(self, img: np.ndarray):
+        """Resize keeping aspect ratio and pad to a square input, as YOLOv8 was trained."""
+        h, w = img.shape[:2]
+        size = self.input_size
+        scale = min(size / h, size / w)
+        new_w, new_h = int(round(w * scale)), int(round(h * scale))
+        pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+
+        canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+        canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = cv2.resize(
+            img, (new_w, new_h), interpolation=cv2.INTER_LINEAR
+        )
+        return canvas, scale, pad_x, pad_y
+
+    def _infer(self, img: np.ndarray) -> np.ndarray:
+        """Returns raw boxes as an (N, 6) array of [x1, y1, x2, y2, confidence, class_id] in image coordinates."""
+        canvas, scale, pad_x, pad_y = self._letterbox(img)
+        blob = cv2.dnn.blobFromImage(canvas, 1 / 255.0, (self.input_size, self.input_size), swapRB=True)
+
+        # YOLOv8 output: (1, 4 + num_classes, num_anchors) with boxes as cx, cy, w, h
+        output = np.squeeze(self.engine.forward(blob), axis=0).T
+        class_scores = output[:, 4:]
+        class_ids = np.argmax(class_scores, axis=1)
+        confidences = class_scores[np.arange(len(class_ids)), class_ids]
+
+        keep = confidences >= self.conf_threshold
+        if not np.any(keep):
+            return np.empty((0, 6))
+
+        boxes = output[keep, :4]
+        confidences = confidences[keep]
+        class_ids = class_ids[keep]
+
+        # cx, cy, w, h in letterbox space -> x, y, w, h in image space
+        xywh = np.empty_like(boxes)
+        xywh[:, 0] = (boxes[:, 0] - boxes[:, 2] / 2 - pad_x) / scale
+        xywh[:, 1] = (boxes[:, 1] - boxes[:, 3] / 2 - pad_y) / scale
+        xywh[:, 2] = boxes[:, 2] / scale
+        xywh[:, 3] = boxes[:, 3] / scale
+
+        indices = cv2.dnn.NMSBoxes(
+            xywh.tolist(), confidences.tolist(), self.conf_threshold, self.iou_threshold
+        )
+        if len(indices) == 0:
+            return np.empty((0, 6))
+
+        idx = np.array(indices).flatten()
+        img_h, img_w = img.shape[:2]
+        x, y, bw, bh = xywh[idx].T
+        return np.column_stack([
+            np.clip(x, 0, img_w),
+            np.clip(y, 0, img_h),
+            np.clip(x + bw, 0, img_w),
+            np.clip(y + bh, 0, img_h),
+            confidences[idx],
+            class_ids[idx],
+        ]).astype(np.float64)
+
+    def get_stats(self):
+        return {"backend": "local", "engine": self.engine.name, "model_path": self.model_path}
+
+    def detect_array(self, img: np.ndarray, annotate: bool = True):
+        """
+        Runs the YOLOv8 model locally on CPU on a decoded BGR image.
+        Returns (list of detections, annotated_image_bytes); raises DetectionError on failure.
+        """
+        try:
+            return build_detections(img, self._infer(img), annotate=annotate)
+
+        except Exception as e:
+            logger.error("Local detector error: %s", str(e))
+            raise DetectionError(str(e)) from e
@@ -0,0 +1,264 @@
+"""
+Zero-copy MJPEG (multipart/x-mixed-replace) frame parser.
+
+Frames are read with readinto() into one reusable buffer and yielded as
+memoryviews into it, so frames that are not sampled are never copied.
+Parts are delimited by the multipart boundary and, when the camera sends it,
+the part's Content-Length; scanning resumes where the previous search
+stopped instead of restarting at the buffer head. Without a boundary the
+parser falls back to walking JPEG segments, so an EOI inside an embedded
+EXIF thumbnail does not end the frame early.
+"""
+
+import logging
+import re
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+SOI = b"\xff\xd8"
+EOI = b"\xff\xd9"
+
+_BOUNDARY_RE = re.compile(r'boundary="?([^";]+)"?', re.IGNORECASE)
+
+
+def parse_boundary(content_type: Optional[str]) -> Optional[bytes]:
+    """Extracts the multipart boundary from a Content-Type header, without leading dashes."""
+    if not content_type:
+        return None
+    match = _BOUNDARY_RE.search(content_type)
+    if not match:
+        return None
+    boundary = match.group(1).strip()
+    while boundary.startswith("--"):
+        boundary = boundary[2:]
+    return boundary.encode("latin-1") or None
+
+
+def jpeg_end(buf, start: int, stop: int, resume: int = 0):
+    """
+    Walks the JPEG starting with SOI at buf[start]. Marker segments are skipped
+    by their length (so APP1/EXIF thumbnails are never scanned); only
+    entropy-coded data is searched for EOI.
+
+    Returns (end, resume): end is the offset just past EOI, -1 if the image is
+    not complete before stop, or -2 if the segment structure is corrupt. When
+    end is -1, passing resume back continues the scan where it stopped.
+    """
+    pos = max(start + 2, resume)
+    in_scan = resume > start
+    while True:
+        if in_scan:
+            # Entropy-coded data runs until a marker that is not byte stuffing
+            # (FF00), a restart marker (FFD0-FFD7) or a fill byte.
+            pos = buf.find(b"\xff", pos, stop)
+            if pos == -1 or pos + 1 >= stop:
+                return -1, (pos if pos != -1 else stop - 1)
+            nxt = buf[pos + 1]
+            if nxt == 0xFF:
+                pos += 1
+                continue
+            if nxt == 0x00 or 0xD0 <= nxt <= 0xD7:
+                pos += 2
+                continue
+            in_scan = False  # EOI or another segment (progressive JPEG)
+
+        if pos + 2 > stop:
+            return -1, 0
+        if buf[pos] != 0xFF:
+            return -2, 0
+        marker = buf[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker == 0xD9:
+            return pos + 2, 0
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            pos += 2
+            continue
+        if pos + 4 > stop:
+            return -1, 0
+        length = (buf[pos + 2] << 8) | buf[pos + 3]
+        pos += 2 + length
+        if marker == 0xDA:
+            in_scan = True
+
+
+class MJPEGParser:
+    """
+    Incremental parser: iter_frames() pulls from a binary stream with readinto()
+    (e.g. a urllib3 response); feed() takes chunks pushed by an async reader.
+
+    Both yield memoryviews of each JPEG. A view is only valid until
+    the generator is resumed; callers that keep a frame must copy it
+    (bytes(view)).
+    """
+
+    def __init__(
+        self,
+        boundary: Optional[bytes] = None,
+        read_size: int = 64 * 1024,
+        initial_capacity: int = 1024 * 1024,
+        max_frame_size: int = 5 * 1024 * 1024,
+    ):
+        self.boundary = boundary
+        self.delimiter = b"--" + boundary if boundary else None
+        self.read_size = read_size
+        self.max_frame_size = max_frame_size
+
+        self._buf = bytearray(max(initial_capacity, read_size * 2))
+        self._head = 0  # first unconsumed byte
+        self._tail = 0  # end of valid data
+        self._scan = 0  # resume offset for the current search
+
+        self.bytes_read = 0
+        self.frames = 0
+        self.resyncs = 0
+
+    # -- buffer management ------------------------------------------------
+
+    def _reserve(self, n: int) -> None:
+        """Makes room for n more bytes after _tail, compacting/growing the buffer when needed."""
+        if len(self._buf) - self._tail >= n:
+            return
+        pending = self._tail - self._head
+        if pending > self.max_frame_size:
+            # A part larger than any sane frame: drop it and resynchronise
+            logger.warning("MJPEG part exceeds %d bytes, resynchronising", self.max_frame_size)
+            self.resyncs += 1
+            self._head = self._tail = self._scan = 0
+            pending = 0
+        if pending + n > len(self._buf):
+            grown = bytearray(max(len(self._buf) * 2, pending + n))
+            grown[:pending] = self._buf[self._head:self._tail]
+            self._buf = grown
+        elif pending:
+            self._buf[:pending] = self._buf[self._head:self._tail]
+        self._scan = max(0, self._scan - self._head)
+        self._head, self._tail = 0, pending
+
+    def _fill(self, stream) -> int:
+        """Reads up to read_size more bytes from a blocking stream."""
+        self._reserve(self.read_size)
+        with memoryview(self._buf) as view:
+            n = stream.readinto(view[self._tail:self._tail + self.read_size])
+        n = n or 0
+        self._tail += n
+        self.bytes_read += n
+        return n
+
+    # -- frame extraction ---------------------------------------------------
+
+    def _next_part(self) -> Optional[tuple]:
+        """(start, end) of the next complete JPEG in the buffer, or None if more data is needed."""
+        if self.delimiter is not None:
+            return self._next_multipart()
+        return self._next_bare_jpeg()
+
+    def _next_multipart(self) -> Optional[tuple]:
+        buf, delim = self._buf, self.delimiter
+        while True:
+            start = buf.find(delim, self._head, self._tail)
+            if start == -1:
+                # Keep just enough to match a delimiter split across reads
+                self._head = max(self._head, self._tail - len(delim) + 1)
+                return None
+            headers_end = buf.find(b"\r\n\r\n", start + len(delim), self._tail)
+            if headers_end == -1:
+                self._head = start
+                return None
+            body = headers_end + 4
+
+            # Trust Content-Length only while it lands on an EOI; a truncated
+            # part would otherwise swallow the parts after it
+            length = self._content_length(start + len(delim), headers_end)
+            end = body + length if length is not None else -1
+            if end > self._tail:
+                self._head = start
+                return None
+            if end < body + 2 or buf[end - 2:end] != EOI:
+                # Otherwise the part runs to the next delimiter
+                nxt = buf.find(delim, max(body, self._scan), self._tail)
+                if nxt == -1:
+                    self._head = start
+                    self._scan = max(body, self._tail - len(delim) + 1)
+                    return None
+                end = nxt
+                while end > body and buf[end - 1] in (0x0A, 0x0D):
+                    end -= 1
+
+            self._head = end
+            self._scan = end
+            if buf[body:body + 2] == SOI:
+                return body, end
+            self.resyncs += 1  # a non-JPEG part: skip it
+
+    def _content_length(self, headers_start: int, headers_end: int) -> Optional[int]:
+        headers = bytes(self._buf[headers_start:headers_end])
+        for line in headers.split(b"\r\n"):
+            name, sep, value = line.partition(b":")
+            if sep and name.strip().lower() == b"content-length":
+                try:
+                    return int(value.strip())
+                except ValueError:
+                    return None
+        return None
+
+    def _next_bare_jpeg(self) -> Optional[tuple]:
+        buf = self._buf
+        while True:
+            start = buf.find(SOI, self._head, self._tail)
+            if start == -1:
+                self._head = max(self._head, self._tail - 1)
+                self._scan = 0
+                return None
+            resume = self._scan if self._head == start else 0
+            end, resume = jpeg_end(buf, start, self._tail, resume)
+            if end == -1:
+                self._head, self._scan = start, resume
+                return None
+            self._scan = 0
+            if end == -2:
+                # Corrupt segment structure: skip past this SOI
+                self.resyncs += 1
+                self._head = start + 2
+                continue
+            self._head = end
+            return start, end
+
+    def _frames(self) -> Iterator[memoryview]:
+        while True:
+            part = self._next_part()
+            if part is None:
+                return
+            start, end = part
+            self.frames += 1
+            view = memoryview(self._buf)[start:end]
+            try:
+                yield view
+            finally:
+                view.release()
+
+    def iter_frames(self, stream) -> Iterator[memoryview]:
+        """Pull mode: reads the blocking stream until EOF."""
+        while True:
+            yield from self._frames()
+            if self._fill(stream) == 0:
+                return
+
+    def feed(self, data: bytes) -> Iterator[memoryview]:
+        """Push mode for async sources: appends one received chunk and yields the frames it completes."""
+        n = len(data)
+        self._reserve(n)
+        self._buf[self._tail:self._tail + n] = data
+        self._tail += n
+        self.bytes_read += n
+        yield from self._frames()
+
+    def get_stats(self) -> dict:
+        return {
+            "bytes_read": self.bytes_read,
+            "frames": self.frames,
+            "resyncs": self.resyncs,
+            "buffer_size": len(self._buf),
+        }
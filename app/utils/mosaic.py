@@ -0,0 +1,162 @@
+"""
+Mosaic batching for the remote detector.
+
+The Gradio `predict` endpoint only accepts one image, so frames queued within
+a short window are tiled into a single upload-sized mosaic, sent as one
+inference call, and the returned boxes are mapped back to their source frames.
+"""
+
+import logging
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import cv2
+
+logger = logging.getLogger(__name__)
+
+Tile = Tuple[int, int, int, int]  # x, y, width, height inside the mosaic
+
+
+def mosaic_grid(count: int) -> Tuple[int, int]:
+    """Returns (cols, rows) of the smallest near-square grid holding count tiles."""
+    cols = max(1, math.ceil(math.sqrt(count)))
+    rows = max(1, math.ceil(count / cols))
+    return cols, rows
+
+
+def build_mosaic(images: Sequence[np.ndarray], canvas_size: Tuple[int, int]) -> Tuple[np.ndarray, List[Tile]]:
+    """Tiles BGR images row-major onto a canvas_size (width, height) canvas."""
+    canvas_w, canvas_h = canvas_size
+    cols, rows = mosaic_grid(len(images))
+    tile_w, tile_h = canvas_w // cols, canvas_h // rows
+
+    mosaic = np.zeros((canvas_h, canvas_w, 3), dtype=np.uint8)
+    tiles: List[Tile] = []
+    for i, img in enumerate(images):
+        x, y = (i % cols) * tile_w, (i // cols) * tile_h
+        mosaic[y:y + tile_h, x:x + tile_w] = cv2.resize(img, (tile_w, tile_h), interpolation=cv2.INTER_AREA)
+        tiles.append((x, y, tile_w, tile_h))
+    return mosaic, tiles
+
+
+def split_boxes(detections_data, tiles: Sequence[Tile], source_shapes) -> List[np.ndarray]:
+    """
+    Assigns each mosaic box to the tile holding its centre, clips it to that
+    tile and maps it into the source frame's pixel coordinates.
+    Returns one (N, 6) array per tile.
+    """
+    from .detector import as_box_array  # detector imports this module
+
+    boxes = as_box_array(detections_data)
+    tile_arr = np.asarray(tiles, dtype=np.float64).reshape(-1, 4)
+    tx, ty, tw, th = tile_arr.T
+
+    cx = (boxes[:, 0] + boxes[:, 2]) / 2
+    cy = (boxes[:, 1] + boxes[:, 3]) / 2
+    inside = (
+        (cx[:, None] >= tx) & (cx[:, None] < tx + tw)
+        & (cy[:, None] >= ty) & (cy[:, None] < ty + th)
+    )
+    owner = np.where(inside.any(axis=1), inside.argmax(axis=1), -1)
+
+    per_frame: List[np.ndarray] = []
+    for i in range(len(tile_arr)):
+        sel = boxes[owner == i].copy()
+        src_h, src_w = source_shapes[i][:2]
+        x0, y0, w, h = tile_arr[i]
+        sel[:, [0, 2]] = (np.clip(sel[:, [0, 2]], x0, x0 + w) - x0) * (src_w / w)
+        sel[:, [1, 3]] = (np.clip(sel[:, [1, 3]], y0, y0 + h) - y0) * (src_h / h)
+        per_frame.append(sel)
+    return per_frame
+
+
+class MosaicBatcher:
+    """
+    Collects frames for up to max_wait seconds (or until max_batch arrive),
+    runs one remote call per batch and resolves each frame's Future.
+
+    run_raw(img) must return a Future of raw boxes in canvas space (None on failure),
+    optionally carrying a `meta` dict about the call;
+    finish(img, boxes, **kwargs) turns source-space boxes into the detector
+    result and raises for None (failure); kwargs are that meta plus the extra
+    arguments given to submit().
+    """
+
+    def __init__(
+        self,
+        run_raw: Callable[[np.ndarray], Future],
+        finish: Callable[..., tuple],
+        canvas_size: Tuple[int, int],
+        max_batch: int = 4,
+        max_wait: float = 0.05,
+    ):
+        self.run_raw = run_raw
+        self.finish = finish
+        self.canvas_size = canvas_size
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait))
+
+        self._queue: "queue.Queue[Tuple[np.ndarray, Future, dict]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, img: np.ndarray, **finish_kwargs) -> Future:
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((img, future, finish_kwargs))
+        return future
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="MosaicBatcher", daemon=True)
+                self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                self._dispatch(batch)
+            except Exception as e:
+                logger.error("Mosaic batch failed: %s", str(e))
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _dispatch(self, batch) -> None:
+        images = [img for img, _, _ in batch]
+        mosaic, tiles = build_mosaic(images, self.canvas_size)
+        logger.debug("Dispatching mosaic of %d frame(s)", len(batch))
+        self.run_raw(mosaic).add_done_callback(lambda raw_future: self._complete(batch, tiles, raw_future))
+
+    def _complete(self, batch, tiles: List[Tile], raw_future: Future) -> None:
+        try:
+            raw = raw_future.result()
+        except Exception as e:
+            logger.error("Mosaic inference failed: %s", str(e))
+            raw = None
+
+        meta = getattr(raw_future, "meta", {})
+        per_frame = split_boxes(raw, tiles, [img.shape for img, _, _ in batch])
+        for (img, future, finish_kwargs), boxes in zip(batch, per_frame):
+            try:
+                future.set_result(self.finish(img, boxes if raw is not None else None, **meta, **finish_kwargs))
+            except Exception as e:
+                future.set_exception(e)
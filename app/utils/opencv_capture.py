@@ -0,0 +1,212 @@
+"""
+OpenCV capture loop for files, RTSP and other non-MJPEG sources.
+
+Shared by the in-process capture thread and the capture worker processes, so
+it only depends on OpenCV. Results go to a sink object with three methods:
+
+    frame_read(now)                 every frame read from the source
+    sample(frame, now) -> bool      a frame due for detection (BGR ndarray); False
+                                    if it was not taken (e.g. failed the quality
+                                    gate), so a later frame is offered instead
+    state(connection_active, error) connection changes and errors
+
+frame_interval is either a number of seconds or a callable returning the
+current interval (adaptive sampling), consulted at every sampling decision.
+"""
+
+import logging
+import time
+from pathlib import Path
+from typing import Callable, Optional, Union
+from urllib.parse import urlparse
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+# Below this many frames between samples, decoding forward with grab() is cheaper
+# than a seek (which decodes from the previous keyframe anyway)
+SEEK_MIN_FRAMES = 60
+
+# When seeking, a rejected sample is retried this many times, spread over the
+# interval, before moving on to the next one
+SEEK_RETRIES = 8
+
+Interval = Union[float, Callable[[], float]]
+
+
+def _interval_fn(frame_interval: Interval) -> Callable[[], float]:
+    if callable(frame_interval):
+        return frame_interval
+    return lambda: frame_interval
+
+
+def is_url(value: str) -> bool:
+    try:
+        parsed = urlparse(value)
+    except Exception:
+        return False
+    return parsed.scheme in {"http", "https", "rtsp", "rtmp"}
+
+
+def is_local_file(source: str) -> bool:
+    return not is_url(source) and Path(source).exists()
+
+
+def open_capture(source: str) -> Optional[cv2.VideoCapture]:
+    """Opens an OpenCV capture, or returns None if the source cannot be opened."""
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        cap.release()
+        return None
+    # Reduce latency for some streaming sources (best-effort)
+    try:
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    except Exception:
+        pass
+    return cap
+
+
+def _sample_file_by_seeking(cap: cv2.VideoCapture, frame_interval: Interval, sink, is_running) -> bool:
+    """
+    Seeks straight to each sample timestamp, so only sampled frames (and the
+    frames between their nearest keyframe and them) are decoded. Returns False,
+    before reading anything, if the file has no usable fps/frame count or the
+    interval is too short for seeking to pay off.
+    """
+    interval = _interval_fn(frame_interval)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    if not fps or fps <= 0 or not frame_count or frame_count <= 0:
+        return False
+    step = interval() * fps
+    if step < SEEK_MIN_FRAMES:
+        return False
+
+    target = 0.0
+    due_at = 0.0
+    while is_running():
+        index = int(round(target))
+        if index >= frame_count:
+            break
+        if index > 0 and not cap.set(cv2.CAP_PROP_POS_FRAMES, index):
+            # Unseekable after all: walk the rest of the file with grab()
+            _sample_file_by_grabbing(cap, frame_interval, sink, is_running, last_sample_msec=(index - step) / fps * 1000)
+            return True
+        ret, frame = cap.read()
+        if not ret:
+            break
+        now = time.time()
+        sink.frame_read(now)
+        step = interval() * fps
+        if sink.sample(frame, now):
+            target += step
+            due_at = target
+        else:
+            target += max(1.0, step / SEEK_RETRIES)
+            if target >= due_at + step:
+                due_at += step
+                target = due_at
+
+    sink.state(False, "Stream ended or error reading frame")
+    return True
+
+
+def _sample_file_by_grabbing(
+    cap: cv2.VideoCapture, frame_interval: Interval, sink, is_running, last_sample_msec: Optional[float] = None,
+) -> None:
+    """Walks the file with grab() and only retrieve()s (colour-converts) frames due by video time."""
+    interval = _interval_fn(frame_interval)
+    last_sample_wall = 0.0
+    while is_running():
+        if not cap.grab():
+            break
+        now = time.time()
+        sink.frame_read(now)
+
+        # Sample by video time (the first frame sits at 0 ms); wall-clock when
+        # the backend reports no position
+        pos_msec = cap.get(cv2.CAP_PROP_POS_MSEC)
+        by_video_time = pos_msec > 0 or (pos_msec == 0 and last_sample_msec is None)
+        if by_video_time:
+            due = last_sample_msec is None or (pos_msec - last_sample_msec) >= interval() * 1000
+        else:
+            due = (now - last_sample_wall) >= interval()
+
+        if due:
+            ret, frame = cap.retrieve()
+            if ret and sink.sample(frame, now):
+                if by_video_time:
+                    last_sample_msec = pos_msec
+                else:
+                    last_sample_wall = now
+
+    sink.state(False, "Stream ended or error reading frame")
+
+
+def run_opencv_capture(
+    source: str,
+    frame_interval: Interval,
+    sink,
+    is_running: Callable[[], bool],
+    cap: Optional[cv2.VideoCapture] = None,
+    reconnect_delay: float = 2.0,
+) -> None:
+    """
+    Reads the source until is_running() turns false (or a local file ends).
+
+    Skipped frames are only grab()bed; retrieve() (decode output + colour
+    conversion) runs for sampled frames alone. Local files seek directly to
+    each sample timestamp instead of being read through at decode speed.
+    """
+    try:
+        if cap is None:
+            cap = open_capture(source)
+        if cap is None:
+            sink.state(False, f"Failed to open video source: {source}")
+            logger.error("Failed to open video source: %s", source)
+            return
+
+        sink.state(True, None)
+
+        if is_local_file(source):
+            if not _sample_file_by_seeking(cap, frame_interval, sink, is_running):
+                _sample_file_by_grabbing(cap, frame_interval, sink, is_running)
+            return
+
+        interval = _interval_fn(frame_interval)
+        last_sample_wall = 0.0
+        while is_running():
+            if not cap.grab():
+                sink.state(False, "Stream ended or error reading frame")
+                logger.warning("Capture read failed; source=%s", source)
+
+                # For live sources: attempt a simple reconnect loop.
+                time.sleep(reconnect_delay)
+                try:
+                    cap.release()
+                except Exception:
+                    pass
+                cap = cv2.VideoCapture(source)
+                if not cap.isOpened():
+                    continue
+                sink.state(True, None)
+                continue
+
+            now = time.time()
+            sink.frame_read(now)
+
+            if (now - last_sample_wall) >= interval():
+                ret, frame = cap.retrieve()
+                if ret and sink.sample(frame, now):
+                    last_sample_wall = now
+
+    except Exception as e:
+        sink.state(False, str(e))
+        logger.exception("Error in OpenCV capture loop for %s", source)
+    finally:
+        try:
+            if cap is not None:
+                cap.release()
+        except Exception:
+            pass
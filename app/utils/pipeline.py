@@ -0,0 +1,165 @@
+"""
+In-process detection and persistence shared by the upload-image view and the
+stream workers.
+
+Stream frames used to be re-POSTed to this server's own upload-image endpoint,
+so every sampled frame held a web worker, went through DRF parsing and image
+validation, and could deadlock once all sync workers were busy. Both callers
+now run the same functions directly; the loopback HTTP path remains available
+to streams as an option.
+"""
+
+import logging
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from .detector import get_detector
+from .geo import record_pothole_sighting
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DetectionOutcome:
+    detections: List[Dict[str, Any]] = field(default_factory=list)
+    potholes: list = field(default_factory=list)  # Pothole rows created or merged into
+    merged_count: int = 0
+    missing_reporter: bool = False  # detections found but no device/user to record them under
+
+
+def detect_image(data: bytes, annotate: bool = True) -> Tuple[List[Dict[str, Any]], Optional[bytes]]:
+    """
+    Runs the configured detector on encoded image bytes. Returns (detections,
+    annotated_image_bytes); raises DetectionError when detection failed.
+    """
+    return get_detector().detect_bytes(data, annotate=annotate)
+
+
+def submit_image(data: bytes, annotate: bool = True) -> Future:
+    """
+    Like detect_image(), but returns a Future as soon as the image is handed to
+    the detector, so the caller is not held while a remote inference runs.
+    """
+    return get_detector().submit_bytes(data, annotate=annotate)
+
+
+def resolve_reporter(device=None, user=None, device_id=None, user_id=None):
+    """
+    Returns the (device, user) to record detections under, loading them by id
+    when only ids are given; a missing user is inferred from the device owner.
+    """
+    from ..models import IOTDevice, User
+
+    if device is None and device_id is not None:
+        device = IOTDevice.objects.select_related('owner').filter(pk=device_id).first()
+    if user is None and user_id is not None:
+        user = User.objects.filter(pk=user_id).first()
+    if user is None and device is not None:
+        try:
+            user = device.owner
+        except Exception:
+            user = None
+    return device, user
+
+
+def record_detections(
+    detections: List[Dict[str, Any]],
+    *,
+    device,
+    user,
+    latitude: float,
+    longitude: float,
+    image,
+) -> Tuple[list, int]:
+    """
+    Records each detection of one image as a pothole sighting. Detections in
+    one photo share its GPS fix but are different holes, so none of them is
+    merged into a pothole another detection of the same photo created or
+    matched; only earlier reports count as repeats.
+    Returns (potholes, merged_count).
+    """
+    potholes = []
+    merged_count = 0
+    for det in detections:
+        pothole, created = record_pothole_sighting(
+            device=device,
+            user=user,
+            depth=det['depth'],
+            severity=det['severity'],
+            image=image,
+            latitude=latitude,
+            longitude=longitude,
+            exclude_ids=[p.pk for p in potholes],
+        )
+        if not created:
+            merged_count += 1
+        potholes.append(pothole)
+    return potholes, merged_count
+
+
+def process_image(
+    data: bytes,
+    *,
+    image_name: str,
+    device=None,
+    user=None,
+    device_id=None,
+    user_id=None,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    original_image=None,
+) -> DetectionOutcome:
+    """
+    Detects potholes in one encoded image and records them. The annotated
+    image is stored when available, else original_image (or the raw bytes).
+    Without an explicit location the device's last known position is used.
+    """
+    detections, annotated_image_bytes = detect_image(data)
+    return record_image(
+        data, detections, annotated_image_bytes,
+        image_name=image_name, device=device, user=user, device_id=device_id, user_id=user_id,
+        latitude=latitude, longitude=longitude, original_image=original_image,
+    )
+
+
+def record_image(
+    data: bytes,
+    detections: List[Dict[str, Any]],
+    annotated_image_bytes: Optional[bytes],
+    *,
+    image_name: str,
+    device=None,
+    user=None,
+    device_id=None,
+    user_id=None,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    original_image=None,
+) -> DetectionOutcome:
+    """Second half of process_image(): records detections already made on `data`."""
+    from django.core.files.base import ContentFile
+
+    outcome = DetectionOutcome(detections=detections)
+    if not detections:
+        return outcome
+
+    device, user = resolve_reporter(device, user, device_id, user_id)
+    if device is None or user is None:
+        outcome.missing_reporter = True
+        return outcome
+
+    if latitude is None or longitude is None:
+        latitude, longitude = device.last_latitude, device.last_longitude
+
+    if annotated_image_bytes:
+        image = ContentFile(annotated_image_bytes, name=image_name)
+    elif original_image is not None:
+        image = original_image
+    else:
+        image = ContentFile(data, name=image_name)
+
+    outcome.potholes, outcome.merged_count = record_detections(
+        detections, device=device, user=user, latitude=latitude, longitude=longitude, image=image,
+    )
+    return outcome
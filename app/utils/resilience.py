@@ -0,0 +1,176 @@
+"""
+Latency budgeting for remote detection: rolling latency stats, a circuit
+breaker and a single-thread timer used for deadlines and hedged requests.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """Rolling window of (latency seconds, success) samples."""
+
+    def __init__(self, window: int = 100):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool) -> None:
+        with self._lock:
+            self._samples.append((latency, ok))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float, successes_only: bool = True) -> Optional[float]:
+        with self._lock:
+            values = [lat for lat, ok in self._samples if ok or not successes_only]
+        if not values:
+            return None
+        return float(np.percentile(values, p))
+
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self._samples:
+                return 0.0
+            return sum(1 for _, ok in self._samples if not ok) / len(self._samples)
+
+
+class CircuitBreaker:
+    """
+    Opens when, over at least min_requests recent calls, the error rate or the
+    p95 latency crosses its threshold. While open every call fails fast; after
+    cooldown one probe is let through (half-open) to decide whether to close.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        error_rate_threshold: float = 0.5,
+        p95_threshold: float = 15.0,
+        min_requests: int = 10,
+        cooldown: float = 30.0,
+        window: int = 50,
+    ):
+        self.error_rate_threshold = error_rate_threshold
+        self.p95_threshold = p95_threshold
+        self.min_requests = min_requests
+        self.cooldown = cooldown
+
+        self.tracker = LatencyTracker(window=window)
+        self.state = self.CLOSED
+        self.opened_at: Optional[float] = None
+        self.rejected = 0
+        self.trips = 0
+
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, latency: float, ok: bool) -> None:
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+                if ok:
+                    logger.info("Detector circuit closed after successful probe")
+                    self.state = self.CLOSED
+                    self.tracker.reset()
+                    self.tracker.record(latency, ok)
+                else:
+                    self._trip()
+                return
+
+            self.tracker.record(latency, ok)
+            if self.state == self.CLOSED and len(self.tracker) >= self.min_requests:
+                p95 = self.tracker.percentile(95, successes_only=False)
+                if self.tracker.error_rate() >= self.error_rate_threshold or (p95 is not None and p95 >= self.p95_threshold):
+                    self._trip()
+
+    def _trip(self) -> None:
+        logger.warning(
+            "Detector circuit opened (error_rate=%.2f, p95=%s)",
+            self.tracker.error_rate(), self.tracker.percentile(95, successes_only=False),
+        )
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self.state
+        return {
+            "state": state,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "error_rate": round(self.tracker.error_rate(), 3),
+            "p50_s": self.tracker.percentile(50),
+            "p90_s": self.tracker.percentile(90),
+            "p95_s": self.tracker.percentile(95),
+            "samples": len(self.tracker),
+        }
+
+
+class Timer:
+    """One daemon thread running callbacks at deadlines, instead of a threading.Timer per request."""
+
+    def __init__(self, name: str = "DetectorTimer"):
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def call_later(self, delay: float, fn: Callable[[], None]) -> list:
+        """Schedules fn after delay seconds; returns a handle accepted by cancel()."""
+        entry = [time.monotonic() + delay, next(self._counter), fn]
+        with self._cond:
+            heapq.heappush(self._heap, entry)
+            self._cond.notify()
+        return entry
+
+    @staticmethod
+    def cancel(entry: list) -> None:
+        entry[2] = None
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                remaining = self._heap[0][0] - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(timeout=remaining)
+                    continue
+                fn = heapq.heappop(self._heap)[2]
+            if fn is not None:
+                try:
+                    fn()
+                except Exception as e:
+                    logger.error("Detector timer callback failed: %s", str(e))
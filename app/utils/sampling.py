@@ -0,0 +1,253 @@
+"""
+Sampling control for video streams: how often a stream hands a frame to detection.
+
+A fixed frame_interval either overloads a slow detector (frames pile up in
+the queue and get dropped) or leaves an idle one unused. AdaptiveInterval
+tunes each stream's interval between configured bounds with AIMD on the
+sampling rate, once per update period:
+
+  - congestion (the shared frame queue is half full, or frames finishing
+    since the last update waited in it longer than detection itself took)
+    halves the rate;
+  - otherwise the rate grows by a fixed step (1/20 of the min-to-max range);
+  - the interval never drops below the stream's fair share of the detection
+    workers: detection time * active streams / workers.
+
+DistanceInterval samples by road covered instead: every `every_m` metres
+travelled by the streaming device. DevicePositionWatcher reads the GPS fixes
+that devices push (IOTDevice.last_latitude/last_longitude/last_location_at)
+with one query per poll period for all watched devices. Speed is the
+haversine distance since the last fix that was at least GPS_JITTER_M away,
+over the time between the two, so a parked device's jitter reads as a speed
+near zero rather than as movement. The interval is then every_m / speed, at
+most max_s; while the latest fix is older than stale_s it is None and the
+stream falls back to its time-based interval.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from django.db import close_old_connections
+
+from .geo import has_location, haversine_m
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest latency measurement in the moving averages
+LATENCY_ALPHA = 0.3
+
+# Fixes closer than this to the last anchor are treated as GPS noise
+GPS_JITTER_M = 8.0
+# Steps implying a higher speed are GPS glitches and are not counted
+GPS_MAX_SPEED_MPS = 70.0
+
+
+class AdaptiveInterval:
+    def __init__(
+        self,
+        initial_s: float,
+        min_s: float,
+        max_s: float,
+        update_period_s: float = 1.0,
+        increase_steps: int = 20,
+        backoff: float = 0.5,
+        high_water: float = 0.5,
+    ):
+        self.min_s = max(float(min_s), 1e-3)
+        self.max_s = max(float(max_s), self.min_s)
+        self.update_period_s = update_period_s
+        self.backoff = backoff
+        self.high_water = high_water
+        self._step = (1.0 / self.min_s - 1.0 / self.max_s) / max(1, increase_steps)
+        self._interval = min(max(float(initial_s), self.min_s), self.max_s)
+        self._latency: Optional[float] = None  # sample -> result, seconds
+        self._service: Optional[float] = None  # detection alone, seconds
+        self._observed = False  # a detection finished since the last update
+        self._next_update = 0.0
+        self._lock = threading.Lock()
+        self.backoffs = 0
+
+    @property
+    def interval(self) -> float:
+        return self._interval
+
+    def needs_update(self, now: float) -> bool:
+        return now >= self._next_update
+
+    def observe(self, latency_s: float, service_s: float) -> None:
+        """Records one finished detection: end-to-end latency and time spent detecting."""
+        with self._lock:
+            self._observed = True
+            if self._latency is None:
+                self._latency, self._service = latency_s, service_s
+            else:
+                self._latency += LATENCY_ALPHA * (latency_s - self._latency)
+                self._service += LATENCY_ALPHA * (service_s - self._service)
+
+    def update(self, now: float, queue_depth: int, queue_limit: int, active_streams: int, workers: int) -> float:
+        """Returns the current interval, re-tuning it if an update period has passed."""
+        if now < self._next_update:
+            return self._interval
+        with self._lock:
+            if now < self._next_update:
+                return self._interval
+            self._next_update = now + self.update_period_s
+
+            # Only fresh measurements count: at a long interval the averages can be
+            # minutes old and would otherwise hold the rate down after a recovery
+            queued_too_long = self._observed and self._latency - self._service > self._service
+            self._observed = False
+            congested = queue_depth >= self.high_water * queue_limit or queued_too_long
+
+            rate = 1.0 / self._interval
+            if congested:
+                rate *= self.backoff
+                self.backoffs += 1
+            else:
+                rate += self._step
+            interval = min(max(1.0 / rate, self.min_s), self.max_s)
+
+            if self._service is not None:
+                fair_share = self._service * max(1, active_streams) / max(1, workers)
+                interval = max(interval, min(fair_share, self.max_s))
+            self._interval = interval
+            return interval
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "effective_interval": round(self._interval, 3),
+            "effective_fps": round(1.0 / self._interval, 3),
+            "detection_latency_ms": round(self._latency * 1000) if self._latency is not None else None,
+            "sampling_backoffs": self.backoffs,
+        }
+
+
+class DeviceTrack:
+    """Latest GPS fix and speed estimate of one device (shared by its streams)."""
+
+    def __init__(self, device_id: int):
+        self.device_id = device_id
+        self.watchers = 0
+        self.fix_time: Optional[float] = None
+        self.speed_mps = 0.0
+        self._anchor: Optional[Tuple[float, float, float]] = None  # lat, lon, time
+        self._lock = threading.Lock()
+
+    def update_fix(self, latitude: float, longitude: float, fix_time: float) -> None:
+        with self._lock:
+            if self.fix_time is not None and fix_time <= self.fix_time:
+                return
+            self.fix_time = fix_time
+            if self._anchor is None:
+                self._anchor = (latitude, longitude, fix_time)
+                return
+            lat0, lon0, t0 = self._anchor
+            elapsed = fix_time - t0
+            if elapsed <= 0:
+                return
+            distance = haversine_m(lat0, lon0, latitude, longitude)
+            speed = distance / elapsed
+            if speed > GPS_MAX_SPEED_MPS:
+                # Start over from this fix rather than count the jump
+                self._anchor = (latitude, longitude, fix_time)
+                return
+            self.speed_mps = speed
+            if distance >= GPS_JITTER_M:
+                self._anchor = (latitude, longitude, fix_time)
+
+    def get_fix(self) -> Tuple[Optional[float], float]:
+        """(time of the latest fix or None, speed in m/s)."""
+        return self.fix_time, self.speed_mps
+
+
+class DevicePositionWatcher:
+    """Polls the GPS fixes of every device a running stream samples by distance."""
+
+    def __init__(self, poll_s: float = 1.0):
+        self.poll_s = poll_s
+        self._tracks: Dict[int, DeviceTrack] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self, device_id: int) -> DeviceTrack:
+        with self._lock:
+            track = self._tracks.get(device_id)
+            if track is None:
+                track = self._tracks[device_id] = DeviceTrack(device_id)
+            track.watchers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="DevicePositionWatcher", daemon=True)
+                self._thread.start()
+        return track
+
+    def unwatch(self, track: DeviceTrack) -> None:
+        with self._lock:
+            track.watchers -= 1
+            if track.watchers <= 0 and self._tracks.get(track.device_id) is track:
+                del self._tracks[track.device_id]
+
+    def _run(self) -> None:
+        while True:
+            started = time.monotonic()
+            with self._lock:
+                tracks = dict(self._tracks)
+            if tracks:
+                try:
+                    self.poll(tracks)
+                except Exception:
+                    logger.exception("Device position poll failed")
+            time.sleep(max(0.0, self.poll_s - (time.monotonic() - started)))
+
+    def poll(self, tracks: Dict[int, DeviceTrack]) -> None:
+        from ..models import IOTDevice
+
+        close_old_connections()
+        rows = IOTDevice.objects.filter(pk__in=list(tracks), last_location_at__isnull=False).values_list(
+            "pk", "last_latitude", "last_longitude", "last_location_at"
+        )
+        for device_id, latitude, longitude, located_at in rows:
+            if has_location(latitude, longitude):
+                tracks[device_id].update_fix(latitude, longitude, located_at.timestamp())
+
+
+_watcher: Optional[DevicePositionWatcher] = None
+_watcher_lock = threading.Lock()
+
+
+def get_position_watcher() -> DevicePositionWatcher:
+    global _watcher
+    if _watcher is None:
+        with _watcher_lock:
+            if _watcher is None:
+                from django.conf import settings
+
+                _watcher = DevicePositionWatcher(poll_s=getattr(settings, 'STREAM_GPS_POLL_S', 1.0))
+    return _watcher
+
+
+class DistanceInterval:
+    def __init__(self, track: DeviceTrack, every_m: float, stale_s: float = 15.0, max_s: float = 60.0):
+        self.track = track
+        self.every_m = float(every_m)
+        self.stale_s = stale_s
+        self.max_s = max_s
+
+    def interval(self, now: float) -> Optional[float]:
+        """Seconds between samples for the current speed, or None while the GPS fix is stale."""
+        fix_time, speed = self.track.get_fix()
+        if fix_time is None or now - fix_time > self.stale_s:
+            return None
+        if speed * self.max_s <= self.every_m:
+            return self.max_s
+        return self.every_m / speed
+
+    def get_stats(self, now: float) -> Dict[str, Any]:
+        fix_time, speed = self.track.get_fix()
+        return {
+            "sample_every_m": self.every_m,
+            "gps_speed_mps": round(speed, 2),
+            "gps_fix_age_s": round(now - fix_time, 1) if fix_time is not None else None,
+            "gps_fresh": self.interval(now) is not None,
+        }
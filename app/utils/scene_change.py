@@ -0,0 +1,59 @@
+"""
+Scene-change gate: no sampling while the vehicle stands still.
+
+A vehicle waiting at a signal would send the same view to the detector every
+interval. When a frame is due, SceneChangeGate compares a small grayscale
+thumbnail of its road region (lower two thirds, SCENE_WIDTH wide) with the
+one of the last frame that was sampled. The median difference is removed
+first, so an auto-exposure step does not count as motion; the scene has
+changed when more than min_changed of the pixels differ by more than
+pixel_delta grey levels.
+
+An unchanged frame is not sampled and leaves the stream due, so every
+following frame is compared as well (a few hundred pixels each) and the
+first one after the vehicle moves off is sampled straight away. Traffic
+crossing part of the view stays below the threshold; slow creeping adds up
+against the last sampled frame until it does not.
+"""
+
+from typing import Optional
+
+import cv2
+import numpy as np
+
+SCENE_WIDTH = 64
+
+
+class SceneChangeGate:
+    def __init__(self, min_changed: float = 0.1, pixel_delta: float = 8.0):
+        self.min_changed = min_changed
+        self.pixel_delta = pixel_delta
+        self.static = False
+        self._reference: Optional[np.ndarray] = None
+        self._candidate: Optional[np.ndarray] = None
+
+    @staticmethod
+    def _road(gray: np.ndarray) -> np.ndarray:
+        h, w = gray.shape[:2]
+        if w > SCENE_WIDTH:
+            gray = cv2.resize(gray, (SCENE_WIDTH, max(3, round(h * SCENE_WIDTH / w))), interpolation=cv2.INTER_AREA)
+        return gray[gray.shape[0] // 3:].astype(np.int16)
+
+    def check(self, gray: np.ndarray) -> bool:
+        """True if a grayscale frame differs enough from the last sampled one to sample it."""
+        road = self._road(gray)
+        self._candidate = road
+        if self._reference is None or self._reference.shape != road.shape:
+            return True
+        diff = road - self._reference
+        diff -= np.int16(np.median(diff))
+        changed = np.count_nonzero(np.abs(diff) > self.pixel_delta) > self.min_changed * diff.size
+        self.static = not changed
+        return changed
+
+    def accept(self) -> None:
+        """Makes the frame last passed to check() the reference (it was sampled)."""
+        if self._candidate is not None:
+            self._reference = self._candidate
+            self._candidate = None
+        self.static = False
@@ -0,0 +1,133 @@
+"""
+Event-loop stream manager for HTTP/MJPEG camera streams.
+
+A thread per stream spends almost all of its time blocked on a socket, and
+hundreds of them contend on the GIL for very little work. Instead, one event
+loop on a dedicated daemon thread reads every HTTP/MJPEG stream through a
+single httpx.AsyncClient; each stream is a task running its processor's
+capture coroutine. Work that would stall the loop (hashing, JPEG decode,
+enqueueing sampled frames) runs on a small thread pool.
+
+Sources that are not MJPEG over HTTP (files, RTSP, other HTTP video) keep the
+threaded OpenCV capture loop.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Coroutine, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class StreamManager:
+    def __init__(
+        self,
+        decode_workers: int = 4,
+        connect_timeout: float = 5.0,
+        read_timeout: Optional[float] = 30.0,
+        lag_interval: float = 1.0,
+    ):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.lag_interval = lag_interval
+        self.executor = ThreadPoolExecutor(max_workers=max(1, decode_workers), thread_name_prefix="StreamDecode")
+
+        self.loop = asyncio.new_event_loop()
+        self.client: Optional[httpx.AsyncClient] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._loop_lag = 0.0  # seconds the loop was late on its last heartbeat
+        self._max_loop_lag = 0.0
+
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, args=(ready,), name="StreamEventLoop", daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def _run_loop(self, ready: threading.Event) -> None:
+        asyncio.set_event_loop(self.loop)
+        # One connection per camera: no pool cap, and a read timeout so a silently
+        # dead camera is reconnected instead of holding its socket forever
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=0),
+            timeout=httpx.Timeout(self.connect_timeout, read=self.read_timeout),
+            follow_redirects=True,
+        )
+        self.loop.create_task(self._watch_lag())
+        ready.set()
+        self.loop.run_forever()
+
+    async def _watch_lag(self) -> None:
+        """Heartbeat: how late the loop wakes up shows whether streams are starving it."""
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.lag_interval)
+            self._loop_lag = max(0.0, time.monotonic() - started - self.lag_interval)
+            self._max_loop_lag = max(self._max_loop_lag, self._loop_lag)
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Thread-safe: runs a coroutine on the loop and returns a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def spawn(self, key: str, coro: Coroutine) -> None:
+        """Thread-safe: runs a long-lived stream coroutine as a task tracked under key."""
+
+        def _create() -> None:
+            task = self.loop.create_task(coro, name=f"stream:{key}")
+            self._tasks[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+
+        self.loop.call_soon_threadsafe(_create)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Stream task %s failed: %s", key, task.exception())
+
+    def cancel(self, key: str, timeout: float = 5.0) -> None:
+        """Thread-safe: cancels the task for key and waits for it to close its connection."""
+
+        async def _cancel() -> None:
+            task = self._tasks.get(key)
+            if task is None:
+                return
+            task.cancel()
+            await asyncio.wait({task})
+
+        try:
+            self.submit(_cancel()).result(timeout=timeout)
+        except Exception as e:
+            logger.warning("Stream task %s did not stop cleanly: %s", key, str(e))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "streams": len(self._tasks),
+            "loop_lag_ms": round(self._loop_lag * 1000, 1),
+            "max_loop_lag_ms": round(self._max_loop_lag * 1000, 1),
+        }
+
+
+_manager: Optional[StreamManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_stream_manager() -> StreamManager:
+    """Returns the process-wide stream manager, starting its event loop on first use."""
+    global _manager
+    if _manager is not None:
+        return _manager
+
+    with _manager_lock:
+        if _manager is None:
+            from django.conf import settings
+
+            _manager = StreamManager(
+                decode_workers=getattr(settings, 'STREAM_DECODE_WORKERS', 4),
+                read_timeout=getattr(settings, 'STREAM_READ_TIMEOUT_S', 30.0) or None,
+            )
+    return _manager
@@ -0,0 +1,393 @@
+"""
+Multi-node stream sharding with database leases.
+
+With STREAM_SHARDING on, the stream API only writes VideoStream rows; the
+streams themselves run on `python manage.py run_stream_node` processes,
+each with its own VideoStreamProcessors (started through the usual
+start_video_stream in that process).
+
+Every heartbeat (a third of STREAM_LEASE_S) a node:
+
+  - upserts its StreamNode row (capacity, stream count, heartbeat time);
+  - renews the lease of each stream it holds and publishes its status. A
+    renewal that matches no row means the stream was deleted or taken over
+    after our lease lapsed, and the local copy is stopped;
+  - claims unassigned or expired streams for which it wins the rendezvous
+    hash among live nodes (heartbeat within one lease period), weighted by
+    capacity and skipping full nodes. Claims are a conditional UPDATE, so
+    two nodes can never both win the same lease;
+  - hands back a few streams whose rendezvous winner is now another live
+    node with room, so a node joining the cluster takes over its share.
+
+A node that dies stops renewing: its leases expire after STREAM_LEASE_S and
+the next winner claims each stream on its following heartbeat. A node that
+shuts down cleanly releases its leases and deletes its row straight away.
+Lease times use each node's clock, so nodes need NTP-synchronised clocks.
+"""
+
+import json
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from hashlib import blake2b
+from typing import Any, Dict, Iterable, Optional, Sequence, Set, Tuple
+
+from django.db import close_old_connections
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+# Streams handed back per heartbeat while rebalancing, so a joining node does
+# not restart every moved stream at once
+REBALANCE_BATCH = 5
+
+# Node rows are deleted once their heartbeat is this many lease periods old
+STALE_NODE_LEASES = 10
+
+STARTING_STATUS = {"is_running": False, "connection_active": False, "state": "starting"}
+
+
+def rendezvous_score(node_id: str, stream_id: str, weight: float) -> float:
+    """Weighted rendezvous (highest random weight) score of a node for a stream."""
+    digest = blake2b(f"{node_id}\0{stream_id}".encode(), digest_size=8).digest()
+    # Uniform in (0, 1); -w / ln(u) gives each node a share proportional to w
+    u = (int.from_bytes(digest, "big") + 0.5) / 2 ** 64
+    return -weight / math.log(u)
+
+
+def pick_node(stream_id: str, nodes: Iterable[Tuple[str, float]]) -> Optional[str]:
+    """The node, out of (node_id, weight) pairs, that should run the stream."""
+    best, best_score = None, -1.0
+    for node_id, weight in nodes:
+        if weight <= 0:
+            continue
+        score = rendezvous_score(node_id, stream_id, weight)
+        if score > best_score:
+            best, best_score = node_id, score
+    return best
+
+
+def default_node_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def sharding_enabled() -> bool:
+    """True in web processes that should hand streams to the node cluster."""
+    from django.conf import settings
+
+    from . import stream_supervisor
+
+    # Stream nodes (and a supervisor) run their streams themselves
+    return getattr(settings, 'STREAM_SHARDING', False) and not stream_supervisor._serving
+
+
+def _to_json(status: Dict[str, Any]) -> Dict[str, Any]:
+    return json.loads(json.dumps(status, default=str))
+
+
+# -- web side ----------------------------------------------------------------
+
+
+def define_stream(
+    stream_id: str,
+    video_source: str,
+    detection_api_url: str,
+    frame_interval: float = 30,
+    device_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+) -> Tuple[bool, Optional[str]]:
+    """Persists a stream for the cluster to pick up. Returns (success, error_message)."""
+    from ..models import VideoStream
+
+    _, created = VideoStream.objects.get_or_create(
+        stream_id=stream_id,
+        defaults={
+            "video_source": video_source,
+            "detection_api_url": detection_api_url,
+            "frame_interval": frame_interval,
+            "device_id": device_id,
+            "user_id": user_id,
+        },
+    )
+    if not created:
+        return False, f"Stream {stream_id} is already running"
+    return True, None
+
+
+def remove_stream(stream_id: str) -> bool:
+    """Deletes the definition; the owning node stops the stream on its next heartbeat."""
+    from ..models import VideoStream
+
+    deleted, _ = VideoStream.objects.filter(stream_id=stream_id).delete()
+    return deleted > 0
+
+
+def _row_status(row) -> Dict[str, Any]:
+    from django.utils import timezone
+
+    status = dict(row.status or {})
+    leased = bool(row.lease_owner) and row.lease_expires_at is not None and row.lease_expires_at > timezone.now()
+    if not leased:
+        status.update({"is_running": False, "connection_active": False})
+    status.update({
+        "stream_id": row.stream_id,
+        "video_source": row.video_source,
+        "frame_interval": row.frame_interval,
+        "device_id": row.device_id,
+        "user_id": row.user_id,
+        "node": row.lease_owner or None,
+        "lease_active": leased,
+        "lease_expires_at": row.lease_expires_at.isoformat() if row.lease_expires_at else None,
+    })
+    return status
+
+
+def stream_status(stream_id: str) -> Optional[Dict[str, Any]]:
+    from ..models import VideoStream
+
+    row = VideoStream.objects.filter(stream_id=stream_id).first()
+    return _row_status(row) if row is not None else None
+
+
+def all_streams_status() -> Dict[str, Any]:
+    from ..models import VideoStream
+
+    return {row.stream_id: _row_status(row) for row in VideoStream.objects.all()}
+
+
+# -- node side ---------------------------------------------------------------
+
+
+class StreamNodeAgent:
+    """Heartbeat loop of one stream node; runs its streams in this process."""
+
+    def __init__(self, node_id: Optional[str] = None, capacity: int = 50, lease_s: float = 30.0, start_workers: int = 4):
+        from . import stream_supervisor
+
+        # Stream calls made in this process must run here, not be forwarded
+        stream_supervisor._serving = True
+
+        self.node_id = node_id or default_node_id()
+        self.capacity = max(1, int(capacity))
+        self.lease_s = float(lease_s)
+        self.heartbeat_s = self.lease_s / 3
+        self._lock = threading.Lock()
+        self._held: Dict[str, Optional[str]] = {}  # stream_id -> start error (None = running)
+        self._starting: Set[str] = set()
+        self._retry_at: Dict[str, float] = {}
+        # Opening a source can take as long as its connect timeout; starting streams
+        # off the heartbeat thread keeps lease renewals on time
+        self._starter = ThreadPoolExecutor(max_workers=start_workers, thread_name_prefix="StreamNodeStart")
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.claimed = 0
+        self.released = 0
+        self.lost = 0
+
+    def start(self) -> threading.Thread:
+        self._thread = threading.Thread(target=self._run, name="StreamNodeHeartbeat", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            started = time.monotonic()
+            try:
+                close_old_connections()
+                self.tick()
+            except Exception:
+                logger.exception("Stream node %s: heartbeat failed", self.node_id)
+            self._stopping.wait(max(0.0, self.heartbeat_s - (time.monotonic() - started)))
+
+    def _stream_count(self) -> int:
+        return len(self._held) + len(self._starting)
+
+    def tick(self) -> None:
+        """One heartbeat: register, renew, claim and rebalance."""
+        from django.utils import timezone
+
+        from ..models import StreamNode
+
+        now = timezone.now()
+        StreamNode.objects.update_or_create(
+            node_id=self.node_id,
+            defaults={"capacity": self.capacity, "stream_count": self._stream_count(), "heartbeat_at": now},
+        )
+        StreamNode.objects.filter(heartbeat_at__lt=now - timedelta(seconds=self.lease_s * STALE_NODE_LEASES)).delete()
+        nodes = list(
+            StreamNode.objects.filter(heartbeat_at__gte=now - timedelta(seconds=self.lease_s))
+            .values_list("node_id", "capacity", "stream_count")
+        )
+
+        self._renew(now)
+        self._claim(now, nodes)
+        self._rebalance(nodes)
+
+    def _renew(self, now) -> None:
+        from ..models import VideoStream
+        from .video_processor import get_stream_status, stop_video_stream
+
+        expires = now + timedelta(seconds=self.lease_s)
+        with self._lock:
+            held = list(self._held.items()) + [(stream_id, None) for stream_id in self._starting]
+        for stream_id, error in held:
+            if stream_id in self._starting:
+                status = STARTING_STATUS
+            elif error is None:
+                status = get_stream_status(stream_id) or {"is_running": False}
+            else:
+                status = {"is_running": False, "connection_active": False, "last_error": error}
+            renewed = VideoStream.objects.filter(stream_id=stream_id, lease_owner=self.node_id).update(
+                lease_expires_at=expires, status=_to_json(status),
+            )
+            if not renewed:
+                logger.info("Stream node %s: lost stream %s (deleted or taken over)", self.node_id, stream_id)
+                self.lost += 1
+                self._drop(stream_id)
+                stop_video_stream(stream_id)
+            elif error is not None and time.monotonic() >= self._retry_at.get(stream_id, 0.0):
+                self._schedule_start(stream_id)
+
+    def _claim(self, now, nodes: Sequence[Tuple[str, int, int]]) -> None:
+        from ..models import VideoStream
+
+        if self._stream_count() >= self.capacity:
+            return
+        # Nodes that already hold their capacity get no new streams
+        open_nodes = [(node_id, capacity) for node_id, capacity, count in nodes if count < capacity]
+        open_nodes = [n for n in open_nodes if n[0] != self.node_id] + [(self.node_id, self.capacity)]
+
+        # A lease still recorded under our id (e.g. after a restart with a fixed node id) is ours too
+        claimable = (
+            Q(lease_owner="") | Q(lease_owner=self.node_id)
+            | Q(lease_expires_at__lt=now) | Q(lease_expires_at__isnull=True)
+        )
+        expires = now + timedelta(seconds=self.lease_s)
+        for stream_id in VideoStream.objects.filter(claimable).values_list("stream_id", flat=True):
+            if self._stream_count() >= self.capacity:
+                break
+            if stream_id in self._held or stream_id in self._starting:
+                continue
+            if pick_node(stream_id, open_nodes) != self.node_id:
+                continue
+            # Conditional update: only one node's claim can match
+            claimed = VideoStream.objects.filter(claimable, stream_id=stream_id).update(
+                lease_owner=self.node_id, lease_expires_at=expires, status=dict(STARTING_STATUS),
+            )
+            if claimed:
+                self.claimed += 1
+                self._schedule_start(stream_id)
+
+    def _rebalance(self, nodes: Sequence[Tuple[str, int, int]]) -> None:
+        open_nodes = {node_id for node_id, capacity, count in nodes if count < capacity}
+        weights = [(node_id, capacity) for node_id, capacity, _ in nodes]
+        if self.node_id not in {node_id for node_id, _ in weights}:
+            return
+
+        handed_back = 0
+        for stream_id in list(self._held):
+            if handed_back >= REBALANCE_BATCH:
+                break
+            winner = pick_node(stream_id, weights)
+            if winner != self.node_id and winner in open_nodes:
+                logger.info("Stream node %s: handing stream %s to %s", self.node_id, stream_id, winner)
+                self._release(stream_id)
+                handed_back += 1
+
+    def _schedule_start(self, stream_id: str) -> None:
+        with self._lock:
+            self._held.pop(stream_id, None)
+            self._starting.add(stream_id)
+        self._starter.submit(self._start_local, stream_id)
+
+    def _start_local(self, stream_id: str) -> None:
+        from ..models import VideoStream
+        from .video_processor import start_video_stream, stop_video_stream
+
+        try:
+            close_old_connections()
+            row = VideoStream.objects.filter(stream_id=stream_id, lease_owner=self.node_id).first()
+            if row is None:
+                self._drop(stream_id)
+                return
+            success, error = start_video_stream(
+                stream_id, row.video_source, row.detection_api_url,
+                row.frame_interval, row.device_id, row.user_id,
+            )
+        except Exception as e:
+            logger.exception("Stream node %s: starting stream %s failed", self.node_id, stream_id)
+            success, error = False, str(e)
+
+        with self._lock:
+            dropped = stream_id not in self._starting
+            self._starting.discard(stream_id)
+            if not dropped:
+                if success:
+                    self._held[stream_id] = None
+                    self._retry_at.pop(stream_id, None)
+                else:
+                    # Keep the lease (so the stream does not bounce between nodes) and retry later
+                    self._held[stream_id] = error or "Failed to start stream"
+                    self._retry_at[stream_id] = time.monotonic() + self.lease_s
+
+        if dropped:
+            # Deleted or lost while it was opening
+            if success:
+                stop_video_stream(stream_id)
+        elif success:
+            logger.info("Stream node %s: started stream %s", self.node_id, stream_id)
+        else:
+            logger.warning("Stream node %s: stream %s failed to start: %s", self.node_id, stream_id, error)
+
+    def _drop(self, stream_id: str) -> None:
+        with self._lock:
+            self._held.pop(stream_id, None)
+            self._starting.discard(stream_id)
+            self._retry_at.pop(stream_id, None)
+
+    def _release(self, stream_id: str) -> None:
+        from ..models import VideoStream
+        from .video_processor import stop_video_stream
+
+        self._drop(stream_id)
+        stop_video_stream(stream_id)
+        VideoStream.objects.filter(stream_id=stream_id, lease_owner=self.node_id).update(
+            lease_owner="", lease_expires_at=None, status={},
+        )
+        self.released += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "node_id": self.node_id,
+                "capacity": self.capacity,
+                "streams": len(self._held),
+                "starting": len(self._starting),
+                "failing": sum(1 for error in self._held.values() if error is not None),
+                "claimed": self.claimed,
+                "released": self.released,
+                "lost": self.lost,
+            }
+
+    def stop(self) -> None:
+        """Stops the heartbeat and every local stream, and releases the leases."""
+        from ..models import StreamNode
+
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.heartbeat_s + 30)
+        self._starter.shutdown(wait=True, cancel_futures=True)
+        close_old_connections()
+        with self._lock:
+            held = list(self._held) + list(self._starting)
+        for stream_id in held:
+            try:
+                self._release(stream_id)
+            except Exception:
+                logger.exception("Stream node %s: releasing stream %s failed", self.node_id, stream_id)
+        StreamNode.objects.filter(node_id=self.node_id).delete()
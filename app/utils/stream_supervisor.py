@@ -0,0 +1,231 @@
+"""
+Stream supervisor: one process that owns every stream, the frame queue and
+the capture pools, so streams are not pinned to whichever gunicorn worker
+happened to receive the POST.
+
+With STREAM_SUPERVISOR_SOCKET set, the stream/queue functions in
+video_processor and frame_queue forward each call to the supervisor
+(`python manage.py run_stream_supervisor`) over a Unix socket: one JSON line
+{"op": ..., "args": {...}} per connection, answered by one JSON line
+{"ok": true, "result": ...} or {"ok": false, "error": ...}. Unset, streams
+run inside the web process as before.
+
+The "live" operation keeps its connection open after the response line and
+streams a live viewer's frames over it, each as a LIVE_HEADER (length,
+sequence number, timestamp) followed by the JPEG.
+"""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+from contextlib import closing
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_BYTES = 16 * 1024 * 1024
+LIVE_HEADER = struct.Struct(">IQd")
+
+# Set in the supervisor process itself, where calls must run locally
+_serving = False
+
+
+class SupervisorUnavailable(RuntimeError):
+    """The supervisor socket could not be reached or answered garbage."""
+
+
+def _read_line(sock: socket.socket) -> bytes:
+    chunks = []
+    size = 0
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+        if chunk.endswith(b"\n") or size > MAX_MESSAGE_BYTES:
+            break
+    return b"".join(chunks)
+
+
+class SupervisorClient:
+    def __init__(self, socket_path: str, timeout: float = 10.0, start_timeout: float = 60.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+
+    def call(self, op: str, **args) -> Any:
+        """Runs one operation in the supervisor and returns its result."""
+        request = json.dumps({"op": op, "args": args}).encode() + b"\n"
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                # Starting a stream waits for the source to open
+                sock.settimeout(self.start_timeout if op == "start" else self.timeout)
+                sock.connect(self.socket_path)
+                sock.sendall(request)
+                raw = _read_line(sock)
+        except OSError as e:
+            raise SupervisorUnavailable(f"Stream supervisor unavailable at {self.socket_path}: {e}") from e
+
+        try:
+            response = json.loads(raw)
+        except ValueError as e:
+            raise SupervisorUnavailable(f"Invalid response from stream supervisor: {raw[:200]!r}") from e
+        if not response.get("ok"):
+            raise RuntimeError(response.get("error") or f"Stream supervisor failed to run {op}")
+        return response.get("result")
+
+    def open_live(self, stream_id: str, max_fps: float = 0.0, idle_timeout: float = 30.0):
+        """
+        Live (sequence, timestamp, jpeg) frames of a stream running in the
+        supervisor, or None if it is not running there.
+        """
+        request = json.dumps({"op": "live", "args": {"stream_id": stream_id, "max_fps": max_fps}}).encode() + b"\n"
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            sock.sendall(request)
+            reader = sock.makefile("rb")
+            response = json.loads(reader.readline(MAX_MESSAGE_BYTES))
+        except (OSError, ValueError) as e:
+            sock.close()
+            raise SupervisorUnavailable(f"Stream supervisor unavailable at {self.socket_path}: {e}") from e
+
+        if not response.get("ok") or not response.get("result"):
+            reader.close()
+            sock.close()
+            if not response.get("ok"):
+                raise RuntimeError(response.get("error") or "Stream supervisor failed to open the live view")
+            return None
+        # The supervisor ends the stream itself after idle_timeout without frames
+        sock.settimeout(idle_timeout + self.timeout)
+        return self._live_frames(sock, reader)
+
+    @staticmethod
+    def _live_frames(sock: socket.socket, reader) -> Iterator[Tuple[int, float, bytes]]:
+        try:
+            while True:
+                header = reader.read(LIVE_HEADER.size)
+                if len(header) < LIVE_HEADER.size:
+                    return
+                size, seq, timestamp = LIVE_HEADER.unpack(header)
+                jpeg = reader.read(size)
+                if len(jpeg) < size:
+                    return
+                yield seq, timestamp, jpeg
+        except OSError:
+            return
+        finally:
+            reader.close()
+            sock.close()
+
+
+def get_supervisor_client() -> Optional[SupervisorClient]:
+    """Client for the configured supervisor, or None when calls should run in this process."""
+    if _serving:
+        return None
+    from django.conf import settings
+
+    socket_path = getattr(settings, 'STREAM_SUPERVISOR_SOCKET', '')
+    if not socket_path:
+        return None
+    return SupervisorClient(socket_path, timeout=getattr(settings, 'STREAM_SUPERVISOR_TIMEOUT_S', 10.0))
+
+
+# -- server side -------------------------------------------------------------
+
+
+def _operations() -> Dict[str, Callable[..., Any]]:
+    from .detector import get_detector_stats
+    from .frame_queue import get_queue_stats, get_task_status
+    from .video_processor import get_all_streams_status, get_stream_status, start_video_stream, stop_video_stream
+
+    return {
+        "ping": lambda: {"pid": os.getpid()},
+        "start": start_video_stream,
+        "stop": stop_video_stream,
+        "status": get_stream_status,
+        "status_all": get_all_streams_status,
+        "queue_stats": get_queue_stats,
+        "task_status": get_task_status,
+        "detector_stats": get_detector_stats,
+    }
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        line = self.rfile.readline(MAX_MESSAGE_BYTES)
+        if not line:
+            # A connect-only probe, e.g. another supervisor checking the socket
+            return
+        try:
+            request = json.loads(line)
+            if request.get("op") == "live":
+                self._serve_live(**request.get("args", {}))
+                return
+            operation = self.server.operations[request["op"]]
+            response = {"ok": True, "result": operation(**request.get("args", {}))}
+        except KeyError as e:
+            response = {"ok": False, "error": f"Unknown operation or missing field: {e}"}
+        except Exception as e:
+            logger.exception("Supervisor operation failed")
+            response = {"ok": False, "error": str(e)}
+        self.wfile.write(json.dumps(response, default=str).encode() + b"\n")
+
+    def _serve_live(self, stream_id: str, max_fps: float = 0.0) -> None:
+        from .frame_relay import get_ring, iter_frames
+
+        ring = get_ring(stream_id)
+        self.wfile.write(json.dumps({"ok": True, "result": ring is not None}).encode() + b"\n")
+        if ring is None:
+            return
+        try:
+            with closing(iter_frames(ring, max_fps)) as frames:
+                for seq, timestamp, jpeg in frames:
+                    self.wfile.write(LIVE_HEADER.pack(len(jpeg), seq, timestamp))
+                    self.wfile.write(jpeg)
+        except OSError:
+            # Viewer (web worker) went away
+            pass
+
+
+class SupervisorServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str):
+        global _serving
+        _serving = True
+        self.socket_path = socket_path
+        self.operations = _operations()
+
+        # A socket file left behind by a crashed supervisor would make bind() fail
+        if os.path.exists(socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(socket_path)
+            except OSError:
+                os.unlink(socket_path)
+            else:
+                raise RuntimeError(f"Another stream supervisor is already listening on {socket_path}")
+            finally:
+                probe.close()
+
+        super().__init__(socket_path, _Handler)
+        os.chmod(socket_path, 0o660)
+
+    def serve_in_thread(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, name="StreamSupervisor", daemon=True)
+        thread.start()
+        return thread
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,228 @@
+"""
+Cross-frame pothole tracking for video streams.
+
+As a vehicle approaches a pothole, every sampled frame detects it again. The
+tracker associates boxes across frames by IoU against each track's
+motion-predicted box (constant velocity per box coordinate, which also
+captures the pothole growing as it gets closer), so each physical pothole is
+reported once with its best-confidence frame: as soon as its track is
+confirmed, or when a track that was never confirmed ends (a pothole seen in a
+single sampled frame is still a pothole).
+"""
+
+import itertools
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of (N, 4) and (M, 4) x1, y1, x2, y2 boxes as an (N, M) array."""
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def expand_boxes(boxes: np.ndarray, ratio: float) -> np.ndarray:
+    """Grows (N, 4) boxes by ratio of their width/height on every side."""
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    pad = np.tile(boxes[:, 2:] - boxes[:, :2], 2) * ratio
+    return boxes + pad * np.array([-1, -1, 1, 1])
+
+
+def greedy_match(iou: np.ndarray, threshold: float):
+    """Highest-IoU-first one-to-one assignment. Returns a list of (row, col) pairs."""
+    pairs = []
+    if iou.size == 0:
+        return pairs
+    rows, cols = np.nonzero(iou >= threshold)
+    order = np.argsort(-iou[rows, cols], kind="stable")
+    used_rows, used_cols = set(), set()
+    for k in order:
+        r, c = int(rows[k]), int(cols[k])
+        if r in used_rows or c in used_cols:
+            continue
+        used_rows.add(r)
+        used_cols.add(c)
+        pairs.append((r, c))
+    return pairs
+
+
+class Track:
+    """One physical pothole followed across sampled frames."""
+
+    def __init__(self, track_id: int, box: np.ndarray, frame_number: int):
+        self.track_id = track_id
+        self.box = box.astype(np.float64)
+        self.velocity = np.zeros(4)  # per sampled frame
+        self.last_frame = frame_number
+        self.hits = 1
+        self.misses = 0
+        self.emitted = False
+
+        # Best-confidence sighting: detection dict plus the frame it came from
+        self.best_confidence = -1.0
+        self.best_detection: Optional[Dict[str, Any]] = None
+        self.best_frame: Any = None
+        self.best_frame_number: Optional[int] = None
+
+    def predict(self, frame_number: int) -> np.ndarray:
+        return self.box + self.velocity * (frame_number - self.last_frame)
+
+    def update(self, box: np.ndarray, frame_number: int, smoothing: float) -> None:
+        dt = max(1, frame_number - self.last_frame)
+        observed = (box - self.box) / dt
+        self.velocity = observed if self.hits == 1 else smoothing * observed + (1 - smoothing) * self.velocity
+        self.box = box.astype(np.float64)
+        self.last_frame = frame_number
+        self.hits += 1
+        self.misses = 0
+
+    def offer(self, detection: Dict[str, Any], frame: Any, frame_number: int) -> None:
+        confidence = float(detection.get("confidence", 0.0))
+        if confidence > self.best_confidence:
+            self.best_confidence = confidence
+            self.best_detection = detection
+            self.best_frame = frame
+            self.best_frame_number = frame_number
+
+
+class IoUTracker:
+    """
+    Per-stream tracker. Frame results may arrive out of order from the worker
+    pool, so push() buffers them and applies frames strictly by frame number;
+    a failed frame is pushed with detections=None and only advances time.
+
+    A track is confirmed after min_hits matched frames and dropped after
+    max_misses consecutive frames without a match; a track dropped before it
+    was confirmed is reported then, with the best sighting it had. A track seen only once has
+    no velocity yet, so it gets a second chance against its boxes grown by
+    new_track_expand on every side.
+    """
+
+    def __init__(
+        self,
+        iou_threshold: float = 0.2,
+        min_hits: int = 2,
+        max_misses: int = 1,
+        smoothing: float = 0.5,
+        new_track_expand: float = 0.5,
+        max_pending: int = 64,
+    ):
+        self.iou_threshold = iou_threshold
+        self.min_hits = max(1, int(min_hits))
+        self.max_misses = max(0, int(max_misses))
+        self.smoothing = smoothing
+        self.new_track_expand = new_track_expand
+        self.max_pending = max_pending
+
+        self.tracks: List[Track] = []
+        self.confirmed = 0
+        self.unconfirmed = 0
+        self._ids = itertools.count(1)
+        self._next_frame = 1
+        self._pending: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+
+    def push(self, frame_number: int, detections: Optional[Sequence[Dict[str, Any]]], frame: Any = None) -> List[Track]:
+        """Queues one frame's detections; returns the tracks to report after the frames applied now."""
+        confirmed: List[Track] = []
+        with self._lock:
+            if frame_number < self._next_frame:
+                return confirmed
+            self._pending[frame_number] = (detections, frame)
+
+            # A frame that never reports back must not stall the stream forever
+            if len(self._pending) > self.max_pending:
+                self._next_frame = min(self._pending)
+
+            while self._next_frame in self._pending:
+                detections, frame = self._pending.pop(self._next_frame)
+                if detections is not None:
+                    confirmed.extend(self._apply(self._next_frame, detections, frame))
+                self._next_frame += 1
+        return confirmed
+
+    def _apply(self, frame_number: int, detections: Sequence[Dict[str, Any]], frame: Any) -> List[Track]:
+        boxes = np.array([d["bbox"] for d in detections], dtype=np.float64).reshape(-1, 4)
+        predicted = np.array([t.predict(frame_number) for t in self.tracks]).reshape(-1, 4)
+        pairs = greedy_match(iou_matrix(predicted, boxes), self.iou_threshold)
+
+        # Second pass: single-hit tracks vs leftover boxes, both expanded
+        paired_tracks = {t for t, _ in pairs}
+        paired_dets = {d for _, d in pairs}
+        young = [i for i, t in enumerate(self.tracks) if t.hits == 1 and i not in paired_tracks]
+        left = [j for j in range(len(boxes)) if j not in paired_dets]
+        if young and left:
+            iou = iou_matrix(
+                expand_boxes(predicted[young], self.new_track_expand),
+                expand_boxes(boxes[left], self.new_track_expand),
+            )
+            pairs += [(young[r], left[c]) for r, c in greedy_match(iou, self.iou_threshold)]
+
+        matched_tracks = set()
+        matched_dets = set()
+        for t_idx, d_idx in pairs:
+            track = self.tracks[t_idx]
+            track.update(boxes[d_idx], frame_number, self.smoothing)
+            track.offer(detections[d_idx], frame, frame_number)
+            matched_tracks.add(t_idx)
+            matched_dets.add(d_idx)
+
+        report = []
+        survivors = []
+        for t_idx, track in enumerate(self.tracks):
+            if t_idx not in matched_tracks:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    report.extend(self._end(track))
+                    continue
+            survivors.append(track)
+
+        for d_idx in range(len(boxes)):
+            if d_idx not in matched_dets:
+                track = Track(next(self._ids), boxes[d_idx], frame_number)
+                track.offer(detections[d_idx], frame, frame_number)
+                survivors.append(track)
+        self.tracks = survivors
+
+        for track in self.tracks:
+            if not track.emitted and track.hits >= self.min_hits:
+                track.emitted = True
+                self.confirmed += 1
+                report.append(track)
+        return report
+
+    def _end(self, track: Track) -> List[Track]:
+        if track.emitted or track.best_detection is None:
+            return []
+        track.emitted = True
+        self.unconfirmed += 1
+        return [track]
+
+    def flush(self) -> List[Track]:
+        """Ends every active track (stream stopped); returns the ones not reported yet."""
+        with self._lock:
+            report = [t for track in self.tracks for t in self._end(track)]
+            self.tracks = []
+            return report
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "active_tracks": len(self.tracks),
+                "tracks_confirmed": self.confirmed,
+                "tracks_unconfirmed": self.unconfirmed,
+            }
@@ -0,0 +1,202 @@
+"""
+Bandwidth-adaptive upload settings for the remote detector.
+
+Each upload's size and duration feed a rolling throughput estimate. The tuner
+walks a ladder of (width, height, JPEG quality) levels between configured
+bounds: it steps down as soon as uploads overrun the time budget or time out,
+and only steps back up once the next level is predicted to fit comfortably.
+Other failures (HTTP errors, rejected calls) say nothing about bandwidth and
+leave the level alone.
+"""
+
+import logging
+import threading
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class UploadSettings(namedtuple("UploadSettings", ["width", "height", "quality"])):
+    __slots__ = ()
+
+    @property
+    def label(self) -> str:
+        return f"{self.width}x{self.height}@q{self.quality}"
+
+    def as_dict(self) -> dict:
+        return {"width": self.width, "height": self.height, "quality": self.quality}
+
+
+def build_ladder(max_size: Tuple[int, int], min_width: int, max_quality: int, min_quality: int, levels: int) -> List[UploadSettings]:
+    """Evenly spaced levels from (max_size, max_quality) down to (min_width, min_quality), aspect kept."""
+    max_w, max_h = max_size
+    min_width = min(min_width, max_w)
+    min_quality = min(min_quality, max_quality)
+    levels = max(1, int(levels))
+
+    ladder: List[UploadSettings] = []
+    for i in range(levels):
+        t = i / (levels - 1) if levels > 1 else 0.0
+        width = int(round((max_w - t * (max_w - min_width)) / 16) * 16) or 16
+        height = int(round(width * max_h / max_w / 2) * 2)
+        quality = int(round(max_quality - t * (max_quality - min_quality)))
+        settings = UploadSettings(width, height, quality)
+        if not ladder or ladder[-1] != settings:
+            ladder.append(settings)
+    return ladder
+
+
+class _LevelMetrics:
+    __slots__ = ("uploads", "failures", "bytes", "upload_s", "requests", "latency_s")
+
+    def __init__(self):
+        self.uploads = 0
+        self.failures = 0
+        self.bytes: Optional[float] = None  # EWMA of encoded size
+        self.upload_s: Optional[float] = None  # EWMA of upload duration
+        self.requests = 0
+        self.latency_s: Optional[float] = None  # EWMA of end-to-end inference latency
+
+
+def _ewma(current: Optional[float], sample: float, alpha: float) -> float:
+    return sample if current is None else current + alpha * (sample - current)
+
+
+class UploadTuner:
+    """
+    Chooses upload settings from measured uplink throughput.
+
+    budget_s is the upload time a single frame may take; up_ratio is the share
+    of that budget the next level up must be predicted to fit in before the
+    tuner climbs, and probe_interval the number of uploads between climbs.
+    """
+
+    def __init__(
+        self,
+        max_size: Tuple[int, int] = (640, 480),
+        min_width: int = 384,
+        max_quality: int = 75,
+        min_quality: int = 50,
+        levels: int = 5,
+        budget_s: float = 2.0,
+        up_ratio: float = 0.5,
+        probe_interval: int = 10,
+        alpha: float = 0.2,
+    ):
+        self.ladder = build_ladder(max_size, min_width, max_quality, min_quality, levels)
+        self.budget_s = budget_s
+        self.up_ratio = up_ratio
+        self.probe_interval = probe_interval
+        self.alpha = alpha
+
+        self.level = 0
+        self.throughput: Optional[float] = None  # bytes per second
+        self.step_downs = 0
+        self.step_ups = 0
+
+        self._since_change = 0
+        self._metrics: Dict[UploadSettings, _LevelMetrics] = {s: _LevelMetrics() for s in self.ladder}
+        self._lock = threading.Lock()
+
+    @property
+    def adaptive(self) -> bool:
+        return len(self.ladder) > 1
+
+    def current(self) -> UploadSettings:
+        return self.ladder[self.level]
+
+    def record_upload(
+        self, settings: UploadSettings, nbytes: int, seconds: float, ok: bool, timed_out: bool = False,
+    ) -> None:
+        """Feeds one upload's encoded size and duration; may move to another level."""
+        with self._lock:
+            metrics = self._metrics.get(settings)
+            if metrics is None:
+                return
+            metrics.uploads += 1
+            if not ok:
+                metrics.failures += 1
+            else:
+                metrics.bytes = _ewma(metrics.bytes, nbytes, self.alpha)
+                metrics.upload_s = _ewma(metrics.upload_s, seconds, self.alpha)
+                if seconds > 0:
+                    self.throughput = _ewma(self.throughput, nbytes / seconds, self.alpha)
+
+            if settings != self.ladder[self.level]:
+                return  # a stale upload from before the last change
+            self._since_change += 1
+
+            if timed_out or seconds > self.budget_s:
+                self._step(self._fitting_level(self.budget_s, below=self.level))
+            elif ok and self.level > 0 and self._since_change >= self.probe_interval:
+                predicted = self._predicted_seconds(self.level - 1)
+                if predicted is not None and predicted <= self.budget_s * self.up_ratio:
+                    self._step(self.level - 1)
+
+    def record_latency(self, settings: UploadSettings, seconds: float, ok: bool) -> None:
+        """Feeds one end-to-end inference latency, for the settings-vs-latency metrics."""
+        with self._lock:
+            metrics = self._metrics.get(settings)
+            if metrics is None:
+                return
+            metrics.requests += 1
+            if ok:
+                metrics.latency_s = _ewma(metrics.latency_s, seconds, self.alpha)
+
+    def _predicted_seconds(self, level: int) -> Optional[float]:
+        if not self.throughput:
+            return None
+        settings = self.ladder[level]
+        size = self._metrics[settings].bytes
+        if size is None:
+            # Not seen yet: scale the current level's size by pixel count and quality
+            current = self.ladder[self.level]
+            current_size = self._metrics[current].bytes
+            if current_size is None:
+                return None
+            pixels = (settings.width * settings.height) / (current.width * current.height)
+            size = current_size * pixels * settings.quality / current.quality
+        return size / self.throughput
+
+    def _fitting_level(self, budget: float, below: int) -> int:
+        """Highest level under `below` predicted to upload within budget, else the lowest."""
+        for level in range(below + 1, len(self.ladder)):
+            predicted = self._predicted_seconds(level)
+            if predicted is not None and predicted <= budget:
+                return level
+        return len(self.ladder) - 1
+
+    def _step(self, level: int) -> None:
+        if level == self.level:
+            return
+        if level > self.level:
+            self.step_downs += 1
+        else:
+            self.step_ups += 1
+        logger.info("Detector upload settings %s -> %s", self.ladder[self.level].label, self.ladder[level].label)
+        self.level = level
+        self._since_change = 0
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            levels = {}
+            for settings in self.ladder:
+                m = self._metrics[settings]
+                levels[settings.label] = {
+                    "uploads": m.uploads,
+                    "upload_failures": m.failures,
+                    "avg_bytes": round(m.bytes) if m.bytes is not None else None,
+                    "avg_upload_s": round(m.upload_s, 3) if m.upload_s is not None else None,
+                    "requests": m.requests,
+                    "avg_latency_s": round(m.latency_s, 3) if m.latency_s is not None else None,
+                }
+            return {
+                "adaptive": self.adaptive,
+                "current": self.ladder[self.level].as_dict(),
+                "throughput_kbps": round(self.throughput * 8 / 1000, 1) if self.throughput else None,
+                "budget_s": self.budget_s,
+                "step_downs": self.step_downs,
+                "step_ups": self.step_ups,
+                "levels": levels,
+            }
@@ -1,3 +1,4 @@
+import asyncio
 import io
 import logging
 import threading
@@ -5,33 +6,67 @@ import time
 import uuid
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, Optional, Tuple
-from urllib.parse import urlparse
+from typing import Any, Dict, Iterator, Optional, Tuple
 import numpy as np
 import cv2
 import requests
+from django.db import close_old_connections
 
+from . import stream_shard
+from .capture_pool import CapturePool, get_capture_pool
+from .detector import DetectionError, decode_image, render_annotation
+from .frame_cache import PerceptualHashCache, dhash, dhash_jpeg
+from .frame_quality import SKIP_REASONS, FrameScreen, make_screen
 from .frame_queue import add_frame_processing_task, frame_queue, init_frame_queue
+from .frame_relay import FrameRing, close_ring, get_ring, iter_frames, open_ring
+from .mjpeg import MJPEGParser, parse_boundary
+from .opencv_capture import is_local_file, is_url, run_opencv_capture
+from .pipeline import record_detections, record_image, resolve_reporter, submit_image
+from .sampling import AdaptiveInterval, DistanceInterval, get_position_watcher
+from .stream_manager import StreamManager, get_stream_manager
+from .stream_supervisor import get_supervisor_client
+from .tracker import IoUTracker, Track
 
 logger = logging.getLogger(__name__)
 
-# Global dictionary to track active streams
+MJPEG_REQUEST_HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Accept": "multipart/x-mixed-replace",
+}
+
+# How often a file source waiting for room in the detection queue checks again
+QUEUE_WAIT_POLL_S = 0.05
+
+# Global dictionary to track active streams (in the supervisor process when
+# STREAM_SUPERVISOR_SOCKET is set, on the stream nodes with STREAM_SHARDING;
+# the public functions below proxy to those)
 _active_streams: Dict[str, "VideoStreamProcessor"] = {}
 _stream_lock = threading.Lock()
 
+# In-process detections handed to the detector and not finished yet, across all
+# streams. FrameQueue workers only submit frames, so this (not the worker count)
+# bounds concurrent inferences; workers wait for a free slot when it is reached.
+_detection_slots: Optional[threading.BoundedSemaphore] = None
+_detection_slots_limit = 0
+_detection_slots_lock = threading.Lock()
+
+
+def get_detection_slots() -> Tuple[threading.BoundedSemaphore, int]:
+    global _detection_slots, _detection_slots_limit
+    if _detection_slots is None:
+        with _detection_slots_lock:
+            if _detection_slots is None:
+                from django.conf import settings
 
-def _is_probably_url(value: str) -> bool:
-    try:
-        parsed = urlparse(value)
-    except Exception:
-        return False
-    return parsed.scheme in {"http", "https", "rtsp", "rtmp"}
+                _detection_slots_limit = max(1, int(getattr(settings, 'STREAM_DETECTION_MAX_IN_FLIGHT', 32)))
+                _detection_slots = threading.BoundedSemaphore(_detection_slots_limit)
+    return _detection_slots, _detection_slots_limit
 
 
 def _resolve_video_source(video_source: str) -> str:
     """Resolve local relative paths (e.g. sample/sample.mp4) to an absolute path."""
     video_source = (video_source or "").strip()
-    if _is_probably_url(video_source):
+    if is_url(video_source):
         return video_source
 
     p = Path(video_source)
@@ -51,14 +86,56 @@ def _resolve_video_source(video_source: str) -> str:
 @dataclass
 class StreamStats:
     frames_processed: int = 0  # sampled frames (one per interval)
-    frames_sent: int = 0       # successful POSTs to detection endpoint
+    frames_sent: int = 0       # frames successfully run through detection
     frames_failed: int = 0     # failed POSTs / encode failures
     frames_dropped: int = 0    # dropped due to queue backpressure
+    frames_cached: int = 0     # near-duplicates of a recent pothole-free frame, not re-detected
+    frames_static: int = 0     # due frames skipped because the scene had not changed
+    potholes_recorded: int = 0 # confirmed tracks written (or merged) as Pothole sightings
+    frames_rejected_exposure: int = 0   # skipped by the quality gate: too dark / too bright
+    frames_rejected_occlusion: int = 0  # skipped by the quality gate: road view blocked
+    frames_rejected_blur: int = 0       # skipped by the quality gate: motion blur / out of focus
     last_frame_time: Optional[float] = None   # last successful cap.read() wall time
     last_sample_time: Optional[float] = None  # last sampled frame wall time
     last_error: Optional[str] = None
 
 
+class _ProcessorSink:
+    """Feeds the shared OpenCV capture loop into a processor running it on its own thread."""
+
+    def __init__(self, processor: "VideoStreamProcessor"):
+        self.processor = processor
+
+    def frame_read(self, now: float) -> None:
+        with self.processor._stats_lock:
+            self.processor._stats.last_frame_time = now
+
+    def sample(self, frame, now: float) -> bool:
+        ring = self.processor._ring
+        if ring is not None and ring.viewers:
+            ok, buffer = cv2.imencode(".jpg", frame)
+            if ok:
+                ring.publish(buffer.tobytes(), now)
+        screen = self.processor._screen
+        if screen is not None:
+            reason = screen.check_frame(frame)
+            if reason is not None:
+                self.processor._count_skipped(reason)
+                return False
+        if self.processor._paced:
+            self.processor._wait_for_queue_room()
+        if not self.processor._enqueue_detection(frame, now):
+            return False
+        if screen is not None:
+            screen.accept()
+        return True
+
+    def state(self, connection_active: bool, error: Optional[str]) -> None:
+        self.processor.connection_active = connection_active
+        if error:
+            self.processor._set_error(error)
+
+
 class VideoStreamProcessor:
     def __init__(
         self,
@@ -70,15 +147,63 @@ class VideoStreamProcessor:
         user_id: Optional[int] = None,
         request_timeout_s: int = 60,
         max_queue_size: int = 50,
+        cache_size: int = 32,
+        cache_max_distance: int = 5,
+        cache_max_age_s: float = 300.0,
+        track_min_hits: int = 2,
+        track_max_misses: int = 1,
+        track_iou: float = 0.2,
+        detection_mode: str = "inprocess",
+        jpeg_passthrough: bool = True,
+        event_loop: bool = True,
+        adaptive_sampling: bool = False,
+        min_interval: float = 1.0,
+        max_interval: float = 60.0,
+        quality_gate: Optional[Dict[str, float]] = None,
+        scene_gate: Optional[Dict[str, float]] = None,
+        sample_every_m: float = 0.0,
+        gps_stale_s: float = 15.0,
     ):
         self.stream_id = stream_id
         self.video_source = _resolve_video_source(video_source)
         self.detection_api_url = detection_api_url
+        if detection_mode not in ("inprocess", "http"):
+            raise ValueError(f"Unknown stream detection mode: {detection_mode}")
+        # "inprocess" runs the shared pipeline in the worker thread; "http" re-POSTs
+        # each frame to upload-image (one more request per frame)
+        self.detection_mode = detection_mode
+        # MJPEG sources already deliver JPEG: forward those bytes and decode only in the worker
+        self.jpeg_passthrough = jpeg_passthrough
+        # HTTP/MJPEG sources share the stream manager's event loop instead of a thread each
+        self.event_loop = event_loop
         self.frame_interval = int(frame_interval)
         self.device_id = device_id
         self.user_id = user_id
         self.request_timeout_s = request_timeout_s
         self.max_queue_size = max_queue_size
+        # A file is read faster than real time: wait for queue room instead of dropping samples
+        self._paced = is_local_file(self.video_source)
+
+        # Adaptive sampling retunes the interval between min/max from detector load;
+        # frame_interval is then only the starting point
+        self._sampler: Optional[AdaptiveInterval] = None
+        if adaptive_sampling:
+            self._sampler = AdaptiveInterval(self.frame_interval, min_interval, max_interval)
+        self._pushed_interval = float(self.frame_interval)
+
+        # Distance sampling: one frame per sample_every_m metres the device travels,
+        # from its GPS fixes; time-based (as above) while the fix is stale
+        self.sample_every_m = sample_every_m
+        self.gps_stale_s = gps_stale_s
+        self.max_interval = max_interval
+        self._distance: Optional[DistanceInterval] = None
+
+        # Due frames are skipped while the scene is unchanged (SceneChangeGate options)
+        # and when blurred, badly exposed or blocked (FrameQualityGate thresholds);
+        # None turns a gate off
+        self.screen_options = {"scene": scene_gate, "quality": quality_gate}
+        self._screen: Optional[FrameScreen] = make_screen(self.screen_options)
+        self._pool_skipped: Dict[str, int] = {}
 
         self.is_running = False
         self.connection_active = False
@@ -87,6 +212,28 @@ class VideoStreamProcessor:
         self._stats = StreamStats()
         self._stats_lock = threading.Lock()
 
+        # Near-identical frames of a pothole-free scene (parked / crawling vehicle) are not re-detected
+        self._frame_cache: Optional[PerceptualHashCache] = None
+        if cache_size > 0:
+            self._frame_cache = PerceptualHashCache(
+                max_entries=cache_size, max_distance=cache_max_distance, max_age=cache_max_age_s
+            )
+
+        # Repeated sightings of one pothole across frames are recorded once, when its
+        # track is confirmed or ends (track_min_hits=0 records every detection of every frame)
+        self._tracker: Optional[IoUTracker] = None
+        if track_min_hits > 0:
+            self._tracker = IoUTracker(
+                iou_threshold=track_iou, min_hits=track_min_hits, max_misses=track_max_misses
+            )
+
+        self._mjpeg_parser: Optional[MJPEGParser] = None
+        self._last_sample_wall = 0.0
+        self._manager: Optional[StreamManager] = None
+        self._capture_pool: Optional[CapturePool] = None
+        self._capture_stats: Dict[str, Any] = {}
+        self._ring: Optional[FrameRing] = None
+
     def start(self) -> bool:
         if self.is_running:
             return False
@@ -94,6 +241,49 @@ class VideoStreamProcessor:
         # Ensure background workers are running
         init_frame_queue()
 
+        # Live viewers are served from this ring instead of connecting to the camera
+        self._ring = open_ring(self.stream_id)
+        self._watch_distance()
+        if not self._start_capture():
+            close_ring(self.stream_id, self._ring)
+            self._unwatch_distance()
+            return False
+        return True
+
+    def _watch_distance(self) -> None:
+        if self.sample_every_m <= 0 or self._distance is not None:
+            return
+        if self.device_id is None or not is_url(self.video_source):
+            # A file has no live position to follow
+            logger.warning(
+                "Stream %s: distance sampling needs a live source and a device; using the time interval",
+                self.stream_id,
+            )
+            return
+        track = get_position_watcher().watch(self.device_id)
+        self._distance = DistanceInterval(track, self.sample_every_m, self.gps_stale_s, self.max_interval)
+
+    def _unwatch_distance(self) -> None:
+        if self._distance is not None:
+            get_position_watcher().unwatch(self._distance.track)
+            self._distance = None
+
+    def _start_capture(self) -> bool:
+        is_http = self.video_source.startswith(("http://", "https://"))
+        if self.event_loop and is_http:
+            started = self._start_on_event_loop()
+            if started is not None:
+                return started
+            logger.info("Stream %s: source is not MJPEG, using OpenCV capture", self.stream_id)
+
+        # OpenCV sources decode every frame: run them in the capture worker pool when configured.
+        # Local files stay on a thread here, where they can wait for the detection queue
+        # (seeking means they only decode the sampled frames anyway).
+        if (not is_http or self.event_loop) and not self._paced:
+            pool = get_capture_pool()
+            if pool is not None:
+                return self._start_in_pool(pool)
+
         # Fail fast if OpenCV can't open the source.
         # This avoids returning "success" from the API while the background thread immediately errors.
         test_cap = cv2.VideoCapture(self.video_source)
@@ -116,11 +306,25 @@ class VideoStreamProcessor:
 
     def stop(self) -> bool:
         self.is_running = False
+        if self._ring is not None:
+            close_ring(self.stream_id, self._ring)
+        if self._manager is not None:
+            self._manager.cancel(self.stream_id)
+        if self._capture_pool is not None:
+            self._capture_pool.stop_stream(self.stream_id)
         if self._thread:
             self._thread.join(timeout=5)
+        self._unwatch_distance()
+        if self._tracker is not None:
+            for track in self._tracker.flush():
+                self._record_track(track)
         return True
 
     def get_status(self) -> Dict[str, Any]:
+        cache_stats = self._frame_cache.get_stats() if self._frame_cache else {}
+        track_stats = self._tracker.get_stats() if self._tracker else {}
+        parser_stats = self._mjpeg_parser.get_stats() if self._mjpeg_parser else {}
+        ring_stats = self._ring.get_stats() if self._ring else {}
         with self._stats_lock:
             s = self._stats
             return {
@@ -128,11 +332,32 @@ class VideoStreamProcessor:
                 "is_running": self.is_running,
                 "connection_active": self.connection_active,
                 "video_source": self.video_source,
+                "detection_mode": self.detection_mode,
+                "capture": self._capture_kind(),
+                "capture_worker": self._capture_pool.stream_worker(self.stream_id) if self._capture_pool else None,
+                "read_fps": self._capture_stats.get("read_fps"),
                 "frame_interval": self.frame_interval,
+                "sampling": self._sampling_mode(),
+                **self._sampling_stats(),
                 "frames_processed": s.frames_processed,
                 "frames_sent": s.frames_sent,
                 "frames_failed": s.frames_failed,
                 "frames_dropped": s.frames_dropped,
+                "frames_cached": s.frames_cached,
+                "scene_static": self._scene_static(),
+                "frames_static": s.frames_static,
+                "frames_rejected_exposure": s.frames_rejected_exposure,
+                "frames_rejected_occlusion": s.frames_rejected_occlusion,
+                "frames_rejected_blur": s.frames_rejected_blur,
+                "cache_hits": cache_stats.get("cache_hits", 0),
+                "cache_misses": cache_stats.get("cache_misses", 0),
+                "active_tracks": track_stats.get("active_tracks", 0),
+                "tracks_confirmed": track_stats.get("tracks_confirmed", 0),
+                "tracks_unconfirmed": track_stats.get("tracks_unconfirmed", 0),
+                "potholes_recorded": s.potholes_recorded,
+                "bytes_received": parser_stats.get("bytes_read", 0),
+                "mjpeg_resyncs": parser_stats.get("resyncs", 0),
+                "live_viewers": ring_stats.get("viewers", 0),
                 "last_frame_time": s.last_frame_time,
                 "last_sample_time": s.last_sample_time,
                 "last_error": s.last_error,
@@ -140,6 +365,65 @@ class VideoStreamProcessor:
                 "user_id": self.user_id,
             }
 
+    def _sampling_mode(self) -> str:
+        if self._distance is not None:
+            return "distance"
+        return "adaptive" if self._sampler else "fixed"
+
+    def _sampling_stats(self) -> Dict[str, Any]:
+        if self._sampler is not None:
+            stats = self._sampler.get_stats()
+        else:
+            stats = {
+                "effective_interval": float(self.frame_interval),
+                "effective_fps": round(1.0 / max(self.frame_interval, 1e-3), 3),
+            }
+        if self._distance is not None:
+            now = time.time()
+            interval = self._current_interval(now)
+            stats.update(self._distance.get_stats(now))
+            stats["effective_interval"] = round(interval, 3)
+            stats["effective_fps"] = round(1.0 / max(interval, 1e-3), 3)
+        return stats
+
+    def _current_interval(self, now: Optional[float] = None) -> float:
+        """
+        Seconds between samples right now: from the device's speed when sampling
+        by distance with a fresh GPS fix, else the time-based interval (retuned
+        about once a second when adaptive).
+        """
+        now = time.time() if now is None else now
+        if self._distance is not None:
+            interval = self._distance.interval(now)
+            if interval is not None:
+                return interval
+        if self._sampler is None:
+            return self.frame_interval
+        if not self._sampler.needs_update(now):
+            return self._sampler.interval
+        try:
+            queue_depth = frame_queue.task_queue.qsize()
+        except Exception:
+            queue_depth = 0
+        if self.detection_mode == "inprocess":
+            workers = get_detection_slots()[1]
+        else:
+            workers = frame_queue.max_workers
+        return self._sampler.update(
+            now,
+            queue_depth,
+            self.max_queue_size,
+            len(_active_streams),
+            workers,
+        )
+
+    def _capture_kind(self) -> str:
+        if self._manager is not None:
+            return "event_loop"
+        if self._capture_pool is not None:
+            return "process"
+        return "thread"
+
     def _set_error(self, msg: str) -> None:
         with self._stats_lock:
             self._stats.last_error = msg
@@ -160,105 +444,20 @@ class VideoStreamProcessor:
         self._opencv_capture_loop()
 
     def _opencv_capture_loop(self) -> None:
-        cap: Optional[cv2.VideoCapture] = None
-        try:
-            cap = cv2.VideoCapture(self.video_source)
-            if not cap.isOpened():
-                self.connection_active = False
-                self._set_error(f"Failed to open video source: {self.video_source}")
-                logger.error(self._stats.last_error)
-                return
-
-            # Reduce latency for some streaming sources (best-effort)
-            try:
-                cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-            except Exception:
-                pass
-
-            self.connection_active = True
-
-            is_local_file = (not _is_probably_url(self.video_source)) and Path(self.video_source).exists()
-            last_sample_wall = 0.0
-            last_sample_msec: Optional[float] = None
-
-            while self.is_running:
-                ret, frame = cap.read()
-                now = time.time()
-
-                if not ret:
-                    self.connection_active = False
-                    self._set_error("Stream ended or error reading frame")
-                    logger.warning("Stream %s read failed; source=%s", self.stream_id, self.video_source)
-
-                    # For local files: we are done.
-                    if is_local_file:
-                        break
-
-                    # For live sources: attempt a simple reconnect loop.
-                    time.sleep(2)
-                    try:
-                        cap.release()
-                    except Exception:
-                        pass
-                    cap = cv2.VideoCapture(self.video_source)
-                    if not cap.isOpened():
-                        continue
-                    self.connection_active = True
-                    continue
-
-                with self._stats_lock:
-                    self._stats.last_frame_time = now
-
-                # Decide whether to sample based on video time (for files) or wall-clock.
-                should_sample = False
-                if is_local_file:
-                    pos_msec = cap.get(cv2.CAP_PROP_POS_MSEC)
-                    if pos_msec and pos_msec > 0:
-                        if last_sample_msec is None or (pos_msec - last_sample_msec) >= self.frame_interval * 1000:
-                            should_sample = True
-                            last_sample_msec = pos_msec
-                    else:
-                        # Fallback
-                        if (now - last_sample_wall) >= self.frame_interval:
-                            should_sample = True
-                            last_sample_wall = now
-                else:
-                    if (now - last_sample_wall) >= self.frame_interval:
-                        should_sample = True
-                        last_sample_wall = now
-
-                if should_sample:
-                    self._enqueue_detection(frame, now)
-
-                # Yield a tiny bit (cap.read() may already block, but this prevents a hot loop on files)
-                time.sleep(0.001)
-
-        except Exception as e:
-            self.connection_active = False
-            self._set_error(str(e))
-            logger.exception("Error in OpenCV capture loop for %s", self.stream_id)
-        finally:
-            try:
-                if cap is not None:
-                    cap.release()
-            except Exception:
-                pass
+        dynamic = self._sampler is not None or self._distance is not None
+        interval = self._current_interval if dynamic else self.frame_interval
+        run_opencv_capture(self.video_source, interval, _ProcessorSink(self), lambda: self.is_running)
 
     def _mjpeg_capture_loop(self) -> bool:
         """
         Robust MJPEG reader for ESP8266 / ESP32-CAM streams
         """
         try:
-            headers = {
-                "User-Agent": "Mozilla/5.0",
-                "Accept": "multipart/x-mixed-replace"
-            }
-
             resp = requests.get(
                 self.video_source,
                 stream=True,
                 timeout=(5, None),   # IMPORTANT: no read timeout
-                headers=headers
+                headers=MJPEG_REQUEST_HEADERS,
             )
 
             if resp.status_code != 200:
@@ -266,74 +465,19 @@ class VideoStreamProcessor:
                 return False
 
             self.connection_active = True
-            last_sample_wall = 0.0
 
-            buffer = bytearray()
-            MAX_BUFFER = 5 * 1024 * 1024  # 5MB safety
-            
-            resp_iter = resp.iter_content(chunk_size=4096)
+            # Frames are memoryviews into the parser's buffer; only sampled ones are copied
+            parser = MJPEGParser(boundary=parse_boundary(resp.headers.get("Content-Type")))
+            self._mjpeg_parser = parser
 
-            while self.is_running:
-                try:
-                    chunk = next(resp_iter, None)
-                    if chunk is None:
-                        break
-                except StopIteration:
-                    break
-                except Exception as e:
-                    logger.error("Stream %s: Chunk read error: %s", self.stream_id, str(e))
+            for jpg_view in parser.iter_frames(resp.raw):
+                if not self.is_running:
                     break
+                now = time.time()
+                self._relay(jpg_view, now)
+                if self._mark_frame(now):
+                    self._submit_jpeg(jpg_view, now)
 
-                buffer.extend(chunk)
-
-                if len(buffer) > MAX_BUFFER:
-                    logger.warning("Stream %s: Buffer overflow, clearing", self.stream_id)
-                    buffer.clear()
-                    continue
-
-                while True:
-                    # Find start of JPEG
-                    start = buffer.find(b'\xff\xd8')
-                    if start == -1:
-                        # Keep only the last byte if it might be start of a marker
-                        if len(buffer) > 0:
-                            last_byte = buffer[-1:]
-                            buffer.clear()
-                            if last_byte == b'\xff':
-                                buffer.extend(last_byte)
-                        break
-                    
-                    # Discard anything before the start marker
-                    if start > 0:
-                        del buffer[:start]
-                    
-                    # Find end of JPEG (start searching from after the start marker)
-                    end = buffer.find(b'\xff\xd9', 2)
-                    if end == -1:
-                        # Need more data for a full frame
-                        break
-                    
-                    # Extract full frame
-                    jpg_data = buffer[:end + 2]
-                    del buffer[:end + 2]
-                    
-                    now = time.time()
-                    self._stats.last_frame_time = now
-
-                    # Only process at the specified interval
-                    if (now - last_sample_wall) >= self.frame_interval:
-                        try:
-                            frame = cv2.imdecode(
-                                np.frombuffer(jpg_data, dtype=np.uint8),
-                                cv2.IMREAD_COLOR
-                            )
-
-                            if frame is not None:
-                                self._enqueue_detection(frame, now)
-                                last_sample_wall = now
-                        except Exception as e:
-                            logger.error("Stream %s: Decode error: %s", self.stream_id, str(e))
-                            
             return True
 
         except Exception as e:
@@ -343,7 +487,210 @@ class VideoStreamProcessor:
         finally:
             self.connection_active = False
 
-    def _enqueue_detection(self, frame, sample_time: float) -> None:
+    def _relay(self, jpg, now: float) -> None:
+        """Hands a camera JPEG to live viewers (copied out of the parser buffer only while anyone watches)."""
+        ring = self._ring
+        if ring is not None and ring.viewers:
+            ring.publish(bytes(jpg), now)
+
+    def _mark_frame(self, now: float) -> bool:
+        """Records one received frame; True if it is due for sampling."""
+        with self._stats_lock:
+            self._stats.last_frame_time = now
+        return (now - self._last_sample_wall) >= self._current_interval(now)
+
+    def _count_skipped(self, reason: str, count: int = 1) -> None:
+        field = "frames_static" if reason == "static" else f"frames_rejected_{reason}"
+        with self._stats_lock:
+            setattr(self._stats, field, getattr(self._stats, field) + count)
+
+    def _scene_static(self) -> bool:
+        if self._capture_pool is not None:
+            return bool(self._capture_stats.get("scene_static"))
+        return self._screen is not None and self._screen.static
+
+    def _submit_jpeg(self, jpg, now: float) -> None:
+        """
+        Queues one sampled camera JPEG (bytes or memoryview) for detection. A
+        frame the screen skips (static scene, poor quality) leaves the stream
+        due, so the next frame is tried instead.
+        """
+        screen = self._screen
+        try:
+            if screen is not None:
+                reason = screen.check_jpeg(jpg)
+                if reason is not None:
+                    self._count_skipped(reason)
+                    return
+            if self.jpeg_passthrough:
+                # Forward the camera's JPEG as-is: no decode/re-encode on the capture side
+                ok = self._enqueue_detection(None, now, jpeg_bytes=bytes(jpg))
+            else:
+                frame = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
+                ok = frame is not None and self._enqueue_detection(frame, now)
+            if ok:
+                self._last_sample_wall = now
+                if screen is not None:
+                    screen.accept()
+        except Exception as e:
+            logger.error("Stream %s: Decode error: %s", self.stream_id, str(e))
+
+    # -- capture worker processes (OpenCV sources) ------------------------
+
+    def _start_in_pool(self, pool: CapturePool) -> bool:
+        error = pool.start_stream(
+            self.stream_id,
+            self.video_source,
+            self.frame_interval,
+            on_sample=self._on_pool_sample,
+            on_stats=self._on_pool_stats,
+            screen=self.screen_options if self._screen is not None else None,
+        )
+        if error:
+            self.connection_active = False
+            self._set_error(error)
+            logger.error(error)
+            return False
+
+        self.is_running = True
+        self.connection_active = True
+        self._capture_pool = pool
+        return True
+
+    def _on_pool_sample(self, jpeg_bytes: bytes, sample_time: float) -> None:
+        """Sampled frame from a capture worker (already JPEG-encoded there)."""
+        self._relay(jpeg_bytes, sample_time)
+        self._enqueue_detection(None, sample_time, jpeg_bytes=jpeg_bytes)
+
+    def _on_pool_stats(self, stats: Dict[str, Any]) -> None:
+        self._capture_stats = stats
+        if (self._sampler is not None or self._distance is not None) and self._capture_pool is not None:
+            # The worker samples on its own clock; pass it meaningful interval changes
+            interval = self._current_interval()
+            if abs(interval - self._pushed_interval) > 0.05 * self._pushed_interval:
+                self._pushed_interval = interval
+                self._capture_pool.set_interval(self.stream_id, interval)
+        self.connection_active = stats.get("connection_active", self.connection_active)
+        # Skip counts are cumulative per worker run; a lower count means the worker restarted
+        for reason, count in (stats.get("skipped") or {}).items():
+            if reason not in SKIP_REASONS:
+                continue
+            previous = self._pool_skipped.get(reason, 0)
+            delta = count - previous if count >= previous else count
+            self._pool_skipped[reason] = count
+            if delta:
+                self._count_skipped(reason, delta)
+        with self._stats_lock:
+            if stats.get("last_frame_time"):
+                self._stats.last_frame_time = stats["last_frame_time"]
+            if stats.get("last_error"):
+                self._stats.last_error = stats["last_error"]
+
+    # -- event-loop capture (HTTP/MJPEG sources) ---------------------------
+
+    def _start_on_event_loop(self) -> Optional[bool]:
+        """
+        Connects on the shared stream manager's loop and runs the capture there.
+        Returns None if the source turned out not to be MJPEG (caller falls back
+        to the threaded OpenCV path).
+        """
+        manager = get_stream_manager()
+        future = manager.submit(self._open_mjpeg_async(manager))
+        try:
+            response = future.result(timeout=manager.connect_timeout + 5)
+        except Exception as e:
+            future.cancel()
+            self.connection_active = False
+            self._set_error(f"Failed to open video source: {self.video_source} ({e})")
+            logger.error(self._stats.last_error)
+            return False
+        if response is None:
+            return None
+
+        self.is_running = True
+        self._manager = manager
+        manager.spawn(self.stream_id, self._mjpeg_capture_async(manager, response))
+        return True
+
+    async def _open_mjpeg_async(self, manager: StreamManager):
+        """Opens the stream; returns the response, or None if it is not MJPEG."""
+        request = manager.client.build_request("GET", self.video_source, headers=MJPEG_REQUEST_HEADERS)
+        response = await manager.client.send(request, stream=True)
+        if response.status_code != 200:
+            await response.aclose()
+            raise ConnectionError(f"HTTP {response.status_code}")
+        content_type = response.headers.get("content-type", "").lower()
+        if content_type and not content_type.startswith(("multipart/", "image/jpeg")):
+            await response.aclose()
+            return None
+        return response
+
+    async def _mjpeg_capture_async(self, manager: StreamManager, response) -> None:
+        """Reads one MJPEG stream on the manager's loop, reconnecting with backoff until stopped."""
+        loop = asyncio.get_running_loop()
+        backoff = 1.0
+        while self.is_running:
+            if response is None:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                try:
+                    response = await self._open_mjpeg_async(manager)
+                except Exception as e:
+                    self._set_error(str(e))
+                    continue
+                if response is None:
+                    self._set_error("Source is no longer an MJPEG stream")
+                    continue
+
+            try:
+                self.connection_active = True
+                parser = MJPEGParser(boundary=parse_boundary(response.headers.get("content-type")))
+                self._mjpeg_parser = parser
+                async for chunk in response.aiter_raw():
+                    for jpg_view in parser.feed(chunk):
+                        now = time.time()
+                        self._relay(jpg_view, now)
+                        if self._mark_frame(now):
+                            # Copy out of the parser buffer; hashing/decode/enqueue run off the loop
+                            await loop.run_in_executor(manager.executor, self._submit_jpeg, bytes(jpg_view), now)
+                    backoff = 1.0
+                self._set_error("Stream ended")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._set_error(str(e) or type(e).__name__)
+                logger.warning("Stream %s: MJPEG read failed: %s", self.stream_id, self._stats.last_error)
+            finally:
+                self.connection_active = False
+                await response.aclose()
+                response = None
+
+    def _wait_for_queue_room(self) -> None:
+        """Holds a paced (file) source until the frame queue is below max_queue_size."""
+        while self.is_running and frame_queue.task_queue.qsize() >= self.max_queue_size:
+            time.sleep(QUEUE_WAIT_POLL_S)
+
+    def _enqueue_detection(self, frame, sample_time: float, jpeg_bytes: Optional[bytes] = None) -> bool:
+        """
+        Queues one sampled frame for detection, given as decoded pixels or as
+        the source's own JPEG bytes (passthrough). Returns False if the frame
+        was not taken: it could not be read, or the queue was full (so live
+        sources offer a later frame).
+        """
+        # Near-duplicate of a recent frame without potholes (or still in flight): skip it.
+        frame_hash: Optional[int] = None
+        if self._frame_cache is not None:
+            frame_hash = dhash(frame) if frame is not None else dhash_jpeg(jpeg_bytes)
+            if frame_hash is None:
+                with self._stats_lock:
+                    self._stats.frames_failed += 1
+                return False
+            if self._frame_cache.lookup(frame_hash) is not None:
+                with self._stats_lock:
+                    self._stats.frames_cached += 1
+                    self._stats.last_sample_time = sample_time
+                return True
+
         # Backpressure: if queue is too large, drop.
         try:
             qsize = frame_queue.task_queue.qsize()
@@ -354,60 +701,236 @@ class VideoStreamProcessor:
             with self._stats_lock:
                 self._stats.frames_dropped += 1
                 self._stats.last_sample_time = sample_time
-            return
-
-        ok, buffer = cv2.imencode(".jpg", frame)
-        if not ok:
-            with self._stats_lock:
-                self._stats.frames_failed += 1
-                self._stats.last_sample_time = sample_time
-            return
+            return False
 
-        jpg_bytes = buffer.tobytes()
+        if jpeg_bytes is not None:
+            jpg_bytes = jpeg_bytes
+        else:
+            ok, buffer = cv2.imencode(".jpg", frame)
+            if not ok:
+                with self._stats_lock:
+                    self._stats.frames_failed += 1
+                    self._stats.last_sample_time = sample_time
+                return False
+            jpg_bytes = buffer.tobytes()
 
         with self._stats_lock:
             self._stats.frames_processed += 1
             frame_number = self._stats.frames_processed
             self._stats.last_sample_time = sample_time
 
+        if frame_hash is not None:
+            self._frame_cache.reserve(frame_hash)
+
         task_id = f"{self.stream_id}:{frame_number}:{uuid.uuid4().hex[:8]}"
-        add_frame_processing_task(task_id, self._post_frame_to_detection, jpg_bytes, frame_number)
+        add_frame_processing_task(
+            task_id, self._process_frame, jpg_bytes, frame_number, frame_hash, sample_time, task_id,
+        )
+        return True
 
-    def _post_frame_to_detection(self, jpg_bytes: bytes, frame_number: int) -> Dict[str, Any]:
-        """Runs in background worker threads."""
+    def _process_frame(
+        self, jpg_bytes: bytes, frame_number: int, frame_hash: Optional[int] = None,
+        sample_time: Optional[float] = None, task_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Runs in background worker threads. In-process detection only submits
+        the frame: once the detector resolves it, _finish_frame runs as a new
+        task under the same task id, so this worker is not held while a remote
+        inference is in flight.
+        """
+        started = time.time()
+        if self.detection_mode == "http":
+            try:
+                payload = self._post_frame_to_detection(jpg_bytes, frame_number)
+            except Exception as e:
+                self._frame_failed(frame_number, frame_hash, e)
+                raise
+            return self._frame_done(payload, jpg_bytes, frame_number, frame_hash, sample_time, started, time.time())
+
+        slots, _ = get_detection_slots()
+        slots.acquire()
         try:
-            files = {
-                "photo": (f"{self.stream_id}_{frame_number}.jpg", io.BytesIO(jpg_bytes), "image/jpeg")
-            }
-            data: Dict[str, str] = {}
-            if self.device_id is not None:
-                data["deviceId"] = str(self.device_id)
-            if self.user_id is not None:
-                data["userId"] = str(self.user_id)
-
-            resp = requests.post(
-                self.detection_api_url,
-                files=files,
-                data=data,
-                timeout=self.request_timeout_s,
+            # Confirmed tracks are recorded (and annotated) later, once per pothole
+            future = submit_image(jpg_bytes, annotate=self._tracker is None)
+        except Exception as e:
+            slots.release()
+            self._frame_failed(frame_number, frame_hash, e)
+            raise
+
+        def _on_result(f) -> None:
+            slots.release()
+            add_frame_processing_task(
+                task_id or f"{self.stream_id}:{frame_number}:result", self._finish_frame,
+                f, jpg_bytes, frame_number, frame_hash, sample_time, started, time.time(),
             )
-            resp.raise_for_status()
 
-            try:
-                payload = resp.json()
-            except Exception:
-                payload = {"raw": resp.text}
+        future.add_done_callback(_on_result)
+        return {"status": "submitted", "frame_number": frame_number}
 
-            with self._stats_lock:
-                self._stats.frames_sent += 1
+    def _finish_frame(
+        self, future, jpg_bytes: bytes, frame_number: int, frame_hash: Optional[int],
+        sample_time: Optional[float], started: float, finished: float,
+    ) -> Dict[str, Any]:
+        """Records the result of an in-process detection submitted by _process_frame."""
+        try:
+            detections, annotated_image_bytes = future.result()
+            payload = self._record_in_process(jpg_bytes, frame_number, detections, annotated_image_bytes)
+        except Exception as e:
+            self._frame_failed(frame_number, frame_hash, e)
+            raise
+        return self._frame_done(payload, jpg_bytes, frame_number, frame_hash, sample_time, started, finished)
 
-            return payload
+    def _frame_done(
+        self, payload: Dict[str, Any], jpg_bytes: bytes, frame_number: int, frame_hash: Optional[int],
+        sample_time: Optional[float], started: float, finished: float,
+    ) -> Dict[str, Any]:
+        with self._stats_lock:
+            self._stats.frames_sent += 1
+        if self._sampler is not None and sample_time is not None:
+            self._sampler.observe(finished - sample_time, finished - started)
+
+        if frame_hash is not None:
+            if payload.get("detection_count"):
+                # Only pothole-free scenes are skipped; anything new next to a hit must be seen
+                self._frame_cache.discard(frame_hash)
+            else:
+                self._frame_cache.store(frame_hash, payload)
+
+        if self._tracker is not None:
+            reported = self._tracker.push(frame_number, payload.get("detections") or [], jpg_bytes)
+            for track in reported:
+                self._record_track(track)
+
+        return payload
+
+    def _frame_failed(self, frame_number: int, frame_hash: Optional[int], error: Exception) -> None:
+        if frame_hash is not None:
+            self._frame_cache.discard(frame_hash)
+        if self._tracker is not None:
+            # Let later frames through the tracker's reorder buffer
+            for track in self._tracker.push(frame_number, None):
+                self._record_track(track)
+        with self._stats_lock:
+            self._stats.frames_failed += 1
+            self._stats.last_error = str(error)
+
+    def _record_in_process(
+        self, jpg_bytes: bytes, frame_number: int, detections, annotated_image_bytes: Optional[bytes],
+    ) -> Dict[str, Any]:
+        """Records one frame's detections through the shared pipeline (no HTTP hop)."""
+        if self._tracker is not None:
+            return {"detection_count": len(detections), "detections": detections}
+
+        close_old_connections()
+        outcome = record_image(
+            jpg_bytes,
+            detections,
+            annotated_image_bytes,
+            image_name=f"{self.stream_id}_{frame_number}.jpg",
+            device_id=self.device_id,
+            user_id=self.user_id,
+        )
+        with self._stats_lock:
+            self._stats.potholes_recorded += len(outcome.potholes)
+        return {
+            "detection_count": len(outcome.detections),
+            "detections": outcome.detections,
+            "pothole_ids": [pothole.pk for pothole in outcome.potholes],
+        }
 
-        except Exception as e:
+    def _post_frame_to_detection(self, jpg_bytes: bytes, frame_number: int) -> Dict[str, Any]:
+        """Loopback mode: POSTs the frame to this server's upload-image endpoint."""
+        files = {
+            "photo": (f"{self.stream_id}_{frame_number}.jpg", io.BytesIO(jpg_bytes), "image/jpeg")
+        }
+        data: Dict[str, str] = {}
+        if self.device_id is not None:
+            data["deviceId"] = str(self.device_id)
+        if self.user_id is not None:
+            data["userId"] = str(self.user_id)
+
+        # With tracking on, the endpoint only detects; confirmed tracks are recorded here
+        params = {"persist": "false"} if self._tracker is not None else None
+
+        resp = requests.post(
+            self.detection_api_url,
+            files=files,
+            data=data,
+            params=params,
+            timeout=self.request_timeout_s,
+        )
+        resp.raise_for_status()
+
+        # Anything but a detection result is a failure, so it is never cached as "no potholes"
+        try:
+            payload = resp.json()
+        except Exception:
+            raise DetectionError(f"Detection endpoint returned non-JSON: {resp.text[:200]}")
+        if payload.get("status") != "success":
+            raise DetectionError(payload.get("message") or "Detection endpoint rejected the frame")
+        return payload
+
+    def _record_track(self, track: Track) -> None:
+        """Writes one reported track as a Pothole sighting, using its best-confidence frame."""
+        from django.core.files.base import ContentFile
+
+        try:
+            close_old_connections()
+            device, user = resolve_reporter(device_id=self.device_id, user_id=self.user_id)
+            if device is None or user is None:
+                logger.warning(
+                    "Stream %s: pothole track %s not recorded because deviceId/userId is missing",
+                    self.stream_id, track.track_id,
+                )
+                return
+
+            det = track.best_detection
+            img, _ = decode_image(track.best_frame)
+            annotated = render_annotation(img, [det]) if img is not None else None
+            image = ContentFile(
+                annotated or track.best_frame, name=f"{self.stream_id}_{track.best_frame_number}.jpg"
+            )
+
+            potholes, _ = record_detections(
+                [det],
+                device=device,
+                user=user,
+                latitude=device.last_latitude,
+                longitude=device.last_longitude,
+                image=image,
+            )
             with self._stats_lock:
-                self._stats.frames_failed += 1
-                self._stats.last_error = str(e)
-            raise
+                self._stats.potholes_recorded += len(potholes)
+        except Exception as e:
+            logger.error("Stream %s: failed to record pothole track %s: %s", self.stream_id, track.track_id, str(e))
+            self._set_error(str(e))
+        finally:
+            track.best_frame = None  # emitted once; release the frame bytes
+
+
+def _track_min_hits(settings) -> int:
+    if not getattr(settings, "STREAM_TRACKER_ENABLED", True):
+        return 0
+    return max(1, getattr(settings, "STREAM_TRACK_MIN_HITS", 2))
+
+
+def _quality_gate_settings(settings) -> Optional[Dict[str, float]]:
+    if not getattr(settings, "STREAM_QUALITY_GATE", False):
+        return None
+    return {
+        "min_sharpness": getattr(settings, "STREAM_QUALITY_MIN_SHARPNESS", 50.0),
+        "max_clipped": getattr(settings, "STREAM_QUALITY_MAX_CLIPPED", 0.65),
+        "max_occluded": getattr(settings, "STREAM_QUALITY_MAX_OCCLUDED", 0.6),
+    }
+
+
+def _scene_gate_settings(settings) -> Optional[Dict[str, float]]:
+    if not getattr(settings, "STREAM_SCENE_GATE", False):
+        return None
+    return {
+        "min_changed": getattr(settings, "STREAM_SCENE_MIN_CHANGED", 0.1),
+        "pixel_delta": getattr(settings, "STREAM_SCENE_PIXEL_DELTA", 8.0),
+    }
 
 
 def start_video_stream(
@@ -422,12 +945,32 @@ def start_video_stream(
 
     Returns (success, error_message).
     """
+    if stream_shard.sharding_enabled():
+        return stream_shard.define_stream(
+            stream_id, video_source, detection_api_url, frame_interval, device_id, user_id,
+        )
+
+    client = get_supervisor_client()
+    if client is not None:
+        success, err = client.call(
+            "start",
+            stream_id=stream_id,
+            video_source=video_source,
+            detection_api_url=detection_api_url,
+            frame_interval=frame_interval,
+            device_id=device_id,
+            user_id=user_id,
+        )
+        return success, err
+
     with _stream_lock:
         if stream_id in _active_streams:
             msg = f"Stream {stream_id} is already running"
             logger.warning(msg)
             return False, msg
 
+        from django.conf import settings
+
         processor = VideoStreamProcessor(
             stream_id=stream_id,
             video_source=video_source,
@@ -435,6 +978,16 @@ def start_video_stream(
             frame_interval=frame_interval,
             device_id=device_id,
             user_id=user_id,
+            track_min_hits=_track_min_hits(settings),
+            detection_mode=getattr(settings, "STREAM_DETECTION_MODE", "inprocess"),
+            event_loop=getattr(settings, "STREAM_EVENT_LOOP", True),
+            adaptive_sampling=getattr(settings, "STREAM_ADAPTIVE_SAMPLING", False),
+            min_interval=getattr(settings, "STREAM_SAMPLING_MIN_S", 1.0),
+            max_interval=getattr(settings, "STREAM_SAMPLING_MAX_S", 60.0),
+            quality_gate=_quality_gate_settings(settings),
+            scene_gate=_scene_gate_settings(settings),
+            sample_every_m=getattr(settings, "STREAM_SAMPLE_EVERY_M", 0.0),
+            gps_stale_s=getattr(settings, "STREAM_GPS_STALE_S", 15.0),
         )
 
         if processor.start():
@@ -447,6 +1000,13 @@ def start_video_stream(
 
 
 def stop_video_stream(stream_id: str) -> bool:
+    if stream_shard.sharding_enabled():
+        return stream_shard.remove_stream(stream_id)
+
+    client = get_supervisor_client()
+    if client is not None:
+        return client.call("stop", stream_id=stream_id)
+
     with _stream_lock:
         processor = _active_streams.get(stream_id)
         if not processor:
@@ -458,6 +1018,13 @@ def stop_video_stream(stream_id: str) -> bool:
 
 
 def get_stream_status(stream_id: str) -> Optional[Dict[str, Any]]:
+    if stream_shard.sharding_enabled():
+        return stream_shard.stream_status(stream_id)
+
+    client = get_supervisor_client()
+    if client is not None:
+        return client.call("status", stream_id=stream_id)
+
     with _stream_lock:
         processor = _active_streams.get(stream_id)
         if not processor:
@@ -466,5 +1033,31 @@ def get_stream_status(stream_id: str) -> Optional[Dict[str, Any]]:
 
 
 def get_all_streams_status() -> Dict[str, Any]:
+    if stream_shard.sharding_enabled():
+        return stream_shard.all_streams_status()
+
+    client = get_supervisor_client()
+    if client is not None:
+        return client.call("status_all")
+
     with _stream_lock:
         return {stream_id: processor.get_status() for stream_id, processor in _active_streams.items()}
+
+
+def iter_live_frames(stream_id: str, max_fps: float = 0.0) -> Optional[Iterator[Tuple[int, float, bytes]]]:
+    """
+    (sequence, timestamp, jpeg) frames of a running stream for one live viewer,
+    or None if the stream is not running. MJPEG streams relay every camera
+    frame; OpenCV sources (RTSP, files) only their sampled frames.
+    """
+    if stream_shard.sharding_enabled():
+        raise RuntimeError("Live view is not available with STREAM_SHARDING: streams run on the stream nodes")
+
+    client = get_supervisor_client()
+    if client is not None:
+        return client.open_live(stream_id, max_fps)
+
+    ring = get_ring(stream_id)
+    if ring is None:
+        return None
+    return iter_frames(ring, max_fps)
@@ -9,7 +9,10 @@ from rest_framework import viewsets, status
 from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.conf import settings
 from django.contrib.auth.hashers import check_password
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django.views.generic import TemplateView
 import requests
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
@@ -20,12 +23,16 @@ from .serializers import (
     UserSerializer, IOTDeviceSerializer, PotholeSerializer, 
     AlertSerializer, QuickPotholeUploadSerializer, LoginSerializer
 )
-from .utils.detector import PotholeDetector
-from .utils.video_processor import start_video_stream, stop_video_stream, get_stream_status, get_all_streams_status
+from .utils.detector import get_detector_stats
+from .utils.pipeline import detect_image, process_image
+from .utils.video_processor import (
+    start_video_stream, stop_video_stream, get_stream_status, get_all_streams_status, iter_live_frames
+)
+from .utils.frame_relay import BOUNDARY, LiveResponseBody, acquire_viewer_slot, release_viewer_slot
 from .utils.frame_queue import add_frame_processing_task, get_task_status, get_queue_stats
 
-# Initialize detector
-detector = PotholeDetector()
+# The detector (backend chosen by settings.DETECTOR_BACKEND) is created on first use
+# through get_detector(), so a missing local model only fails the views that need it
 
 
 @extend_schema_view(
@@ -188,6 +195,7 @@ class PotholeViewSet(viewsets.ModelViewSet):
         parameters=[
             OpenApiParameter(name='latitude', location=OpenApiParameter.QUERY, type=float, description='Latitude of the pothole'),
             OpenApiParameter(name='longitude', location=OpenApiParameter.QUERY, type=float, description='Longitude of the pothole'),
+            OpenApiParameter(name='persist', location=OpenApiParameter.QUERY, type=bool, description='Set to false to only run detection and return the raw detections without creating records'),
         ],
         request={'multipart/form-data': QuickPotholeUploadSerializer},
     )
@@ -197,6 +205,7 @@ class PotholeViewSet(viewsets.ModelViewSet):
         data = request.data.copy()
         latitude = request.query_params.get('latitude')
         longitude = request.query_params.get('longitude')
+        persist = request.query_params.get('persist', 'true').lower() not in ('0', 'false', 'no')
         
         if latitude: data['latitude'] = latitude
         if longitude: data['longitude'] = longitude
@@ -208,37 +217,36 @@ class PotholeViewSet(viewsets.ModelViewSet):
             
             try:
                 # --- YOLO Pothole Detection Logic ---
-                # Save photo temporarily for detector to read
-                from django.core.files.storage import default_storage
-                from django.core.files.base import ContentFile
-                import os
-                import uuid
-
-                temp_filename = f"temp_{uuid.uuid4()}.jpg"
-                temp_path = default_storage.save(f"tmp/{temp_filename}", ContentFile(photo.read()))
-                full_temp_path = default_storage.path(temp_path)
-                
-                # Run detection
-                try:
-                    detections, annotated_image_bytes = detector.detect(full_temp_path)
-                finally:
-                    # Always clean up temp file
-                    if os.path.exists(full_temp_path):
-                        os.remove(full_temp_path)
-                
-                pothole_records = []
-                if detections:
-                    # If userId is missing but deviceId is present, infer user from device owner
-                    device_obj = validated_data.get('deviceId')
-                    user_obj = validated_data.get('userId')
-                    if user_obj is None and device_obj is not None:
-                        try:
-                            user_obj = device_obj.owner
-                        except Exception:
-                            user_obj = None
+                # Detect straight from the uploaded bytes: one in-memory decode, no temp file
+                photo.seek(0)
+                image_bytes = photo.read()
+
+                # Detection only (e.g. stream workers tracking potholes across frames)
+                if not persist:
+                    detections, _ = detect_image(image_bytes, annotate=False)
+                    return Response({
+                        "status": "success",
+                        "message": f"Detection complete. {len(detections)} pothole(s) found.",
+                        "detection_count": len(detections),
+                        "detections": detections
+                    }, status=status.HTTP_200_OK)
+
+                # Shared with stream workers: detect, then record (merged into a nearby
+                # unresolved pothole when there is one)
+                outcome = process_image(
+                    image_bytes,
+                    image_name=photo.name,
+                    device=validated_data.get('deviceId'),
+                    user=validated_data.get('userId'),
+                    latitude=validated_data.get('latitude', 0.0),
+                    longitude=validated_data.get('longitude', 0.0),
+                    original_image=photo,
+                )
+                detections = outcome.detections
 
+                if detections:
                     # If we still don't have required FKs, don't attempt DB writes (avoid 500)
-                    if device_obj is None or user_obj is None:
+                    if outcome.missing_reporter:
                         return Response({
                             "status": "success",
                             "message": (
@@ -249,29 +257,20 @@ class PotholeViewSet(viewsets.ModelViewSet):
                             "potholes": []
                         }, status=status.HTTP_200_OK)
 
-                    # Store detections
-                    for det in detections:
-                        # Prepare the annotated image for saving
-                        pothole_image = photo
-                        if annotated_image_bytes:
-                            pothole_image = ContentFile(annotated_image_bytes, name=photo.name)
-                        
-                        pothole = Pothole.objects.create(
-                            device=device_obj,
-                            user=user_obj,
-                            depth=det['depth'],
-                            severity=det['severity'],
-                            image=pothole_image, # Store the annotated image
-                            latitude=validated_data.get('latitude', 0.0),
-                            longitude=validated_data.get('longitude', 0.0),
-                            status='unresolved'
+                    pothole_records = [PotholeSerializer(pothole).data for pothole in outcome.potholes]
+                    recorded_count = len(outcome.potholes) - outcome.merged_count
+                    message = f"Detection complete. {len(detections)} pothole(s) found and recorded."
+                    if outcome.merged_count:
+                        message = (
+                            f"Detection complete. {len(detections)} pothole(s) found: "
+                            f"{recorded_count} recorded as new, {outcome.merged_count} merged into an existing report."
                         )
-                        pothole_records.append(PotholeSerializer(pothole).data)
-                    
                     return Response({
                         "status": "success",
-                        "message": f"Detection complete. {len(detections)} pothole(s) found and recorded.",
+                        "message": message,
                         "detection_count": len(detections),
+                        "recorded_count": recorded_count,
+                        "merged_count": outcome.merged_count,
                         "potholes": pothole_records
                     }, status=status.HTTP_201_CREATED)
                 
@@ -557,6 +556,81 @@ class VideoStreamStatusView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class VideoStreamLiveView(APIView):
+    """
+    API View relaying a running stream's camera frames to any number of viewers
+    """
+    
+    @extend_schema(
+        description="Live MJPEG (multipart/x-mixed-replace) view of a running stream, relayed from the "
+                    "stream's own camera connection",
+        tags=['Video Streaming'],
+        parameters=[
+            OpenApiParameter(name='stream_id', location=OpenApiParameter.PATH, type=str, description='Stream ID to watch'),
+            OpenApiParameter(name='fps', location=OpenApiParameter.QUERY, type=float, required=False,
+                             description='Maximum frames per second for this viewer (capped by STREAM_LIVE_MAX_FPS)'),
+        ],
+        responses={
+            (200, 'multipart/x-mixed-replace'): {'type': 'string', 'format': 'binary'},
+            404: {'type': 'object', 'properties': {'status': {'type': 'string'}, 'message': {'type': 'string'}}},
+            503: {'type': 'object', 'properties': {'status': {'type': 'string'}, 'message': {'type': 'string'}}},
+        }
+    )
+    def get(self, request, stream_id=None):
+        """Watch a stream live"""
+        max_fps = getattr(settings, 'STREAM_LIVE_MAX_FPS', 15.0)
+        fps = request.query_params.get('fps')
+        if fps is not None:
+            try:
+                fps = float(fps)
+            except ValueError:
+                fps = 0.0
+            if fps <= 0:
+                return Response({
+                    "status": "error",
+                    "message": "fps must be a positive number"
+                }, status=status.HTTP_400_BAD_REQUEST)
+            max_fps = min(fps, max_fps) if max_fps > 0 else fps
+        
+        # Each viewer holds a server thread until it disconnects; keep some for the API
+        if not acquire_viewer_slot():
+            response = Response({
+                "status": "error",
+                "message": "Too many live viewers, try again later"
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = '30'
+            return response
+        
+        try:
+            frames = iter_live_frames(stream_id, max_fps)
+        except Exception as e:
+            release_viewer_slot()
+            return Response({
+                "status": "error",
+                "message": f"Error opening live view: {str(e)}"
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        
+        if frames is None:
+            release_viewer_slot()
+            return Response({
+                "status": "error",
+                "message": f"Stream {stream_id} not found"
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        response = StreamingHttpResponse(
+            LiveResponseBody(frames),
+            content_type=f'multipart/x-mixed-replace; boundary={BOUNDARY}',
+        )
+        response['Cache-Control'] = 'no-cache, no-store, private'
+        # Stop nginx from buffering the endless response
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def perform_content_negotiation(self, request, force=False):
+        # Viewers ask for multipart/image types no renderer offers; errors still render as JSON
+        return super().perform_content_negotiation(request, force=True)
+
+
 class FrameProcessingView(APIView):
     """
     API View for frame processing queue management
@@ -598,6 +672,7 @@ class FrameProcessingView(APIView):
             # Get queue statistics
             try:
                 queue_stats = get_queue_stats()
+                queue_stats['detector'] = get_detector_stats()
                 return Response({
                     "status": "success",
                     "data": queue_stats
@@ -679,6 +754,7 @@ class DeviceGPSUpdateView(APIView):
 
         if lat is not None: device.last_latitude = lat
         if lng is not None: device.last_longitude = lng
+        if lat is not None or lng is not None: device.last_location_at = timezone.now()
         if ip: device.esp_ip = ip
         
         device.save()
@@ -171,6 +171,105 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Pothole detector
+# 'remote' calls the Hugging Face Space, 'local' runs the YOLOv8 ONNX model in-process on CPU
+DETECTOR_BACKEND = config('DETECTOR_BACKEND', default='remote')
+DETECTOR_MODEL_PATH = config('DETECTOR_MODEL_PATH', default=str(BASE_DIR / 'models' / 'pothole_yolov8.onnx'))
+# 'auto' prefers onnxruntime when installed and falls back to cv2.dnn
+DETECTOR_ENGINE = config('DETECTOR_ENGINE', default='auto')
+DETECTOR_NUM_THREADS = config('DETECTOR_NUM_THREADS', default=0, cast=int)
+# Remote backend transport: 'async' (httpx on one event-loop thread) or 'sync' (pooled requests threads)
+DETECTOR_TRANSPORT = config('DETECTOR_TRANSPORT', default='async')
+DETECTOR_ASYNC_MAX_IN_FLIGHT = config('DETECTOR_ASYNC_MAX_IN_FLIGHT', default=500, cast=int)
+# Sync transport: concurrent uploads and concurrent SSE waits (bounds the keep-alive pool per host)
+DETECTOR_UPLOAD_WORKERS = config('DETECTOR_UPLOAD_WORKERS', default=2, cast=int)
+DETECTOR_MAX_IN_FLIGHT = config('DETECTOR_MAX_IN_FLIGHT', default=8, cast=int)
+# Latency budget: total deadline per inference, optional hedged retry past p90, and a
+# circuit breaker that fails fast once the error rate or p95 latency crosses a threshold
+DETECTOR_DEADLINE_S = config('DETECTOR_DEADLINE_S', default=20.0, cast=float)
+DETECTOR_HEDGE = config('DETECTOR_HEDGE', default=False, cast=bool)
+DETECTOR_BREAKER_ERROR_RATE = config('DETECTOR_BREAKER_ERROR_RATE', default=0.5, cast=float)
+DETECTOR_BREAKER_P95_S = config('DETECTOR_BREAKER_P95_S', default=15.0, cast=float)
+DETECTOR_BREAKER_MIN_REQUESTS = config('DETECTOR_BREAKER_MIN_REQUESTS', default=10, cast=int)
+DETECTOR_BREAKER_COOLDOWN_S = config('DETECTOR_BREAKER_COOLDOWN_S', default=30.0, cast=float)
+# Mosaic batching: tile up to N frames queued within the wait window into one remote call (1 = off)
+DETECTOR_BATCH_SIZE = config('DETECTOR_BATCH_SIZE', default=1, cast=int)
+DETECTOR_BATCH_MAX_WAIT_MS = config('DETECTOR_BATCH_MAX_WAIT_MS', default=50, cast=int)
+# Adaptive upload: resolution/JPEG quality step between these bounds to keep each upload under the budget
+DETECTOR_UPLOAD_MIN_WIDTH = config('DETECTOR_UPLOAD_MIN_WIDTH', default=384, cast=int)
+DETECTOR_UPLOAD_MAX_QUALITY = config('DETECTOR_UPLOAD_MAX_QUALITY', default=75, cast=int)
+DETECTOR_UPLOAD_MIN_QUALITY = config('DETECTOR_UPLOAD_MIN_QUALITY', default=50, cast=int)
+DETECTOR_UPLOAD_LEVELS = config('DETECTOR_UPLOAD_LEVELS', default=5, cast=int)
+DETECTOR_UPLOAD_BUDGET_S = config('DETECTOR_UPLOAD_BUDGET_S', default=2.0, cast=float)
+
+# Follow potholes across sampled frames and record each once with its best frame: when
+# its track reaches STREAM_TRACK_MIN_HITS frames, or when a shorter track ends
+# (False = record the detections of every sampled frame)
+STREAM_TRACKER_ENABLED = config('STREAM_TRACKER_ENABLED', default=True, cast=bool)
+STREAM_TRACK_MIN_HITS = config('STREAM_TRACK_MIN_HITS', default=2, cast=int)
+
+# Detections within this many metres of an unresolved pothole count as another sighting of it (0 = off)
+POTHOLE_DEDUP_RADIUS_M = config('POTHOLE_DEDUP_RADIUS_M', default=10.0, cast=float)
+
+# Stream frames run through detection in the worker thread ('inprocess') or are
+# re-POSTed to this server's upload-image endpoint ('http')
+STREAM_DETECTION_MODE = config('STREAM_DETECTION_MODE', default='inprocess')
+# In-process stream detections in flight at once across all streams (frame workers
+# only submit frames, so remote inferences overlap up to this many)
+STREAM_DETECTION_MAX_IN_FLIGHT = config('STREAM_DETECTION_MAX_IN_FLIGHT', default=32, cast=int)
+# HTTP/MJPEG streams are read on one shared event loop (False = one thread per stream);
+# hashing/decoding of sampled frames runs on STREAM_DECODE_WORKERS threads
+STREAM_EVENT_LOOP = config('STREAM_EVENT_LOOP', default=True, cast=bool)
+STREAM_DECODE_WORKERS = config('STREAM_DECODE_WORKERS', default=4, cast=int)
+# Reconnect a camera that sends nothing for this long (0 = wait forever)
+STREAM_READ_TIMEOUT_S = config('STREAM_READ_TIMEOUT_S', default=30.0, cast=float)
+# Capture live OpenCV sources (RTSP etc.) in this many worker processes (0 = a thread per stream
+# in-process); local files always use a thread so they can wait for the detection queue
+STREAM_CAPTURE_PROCESSES = config('STREAM_CAPTURE_PROCESSES', default=0, cast=int)
+# Unix socket of `manage.py run_stream_supervisor`; when set, web workers forward stream
+# start/stop/status to that process instead of running streams themselves ('' = in-process)
+STREAM_SUPERVISOR_SOCKET = config('STREAM_SUPERVISOR_SOCKET', default='')
+STREAM_SUPERVISOR_TIMEOUT_S = config('STREAM_SUPERVISOR_TIMEOUT_S', default=10.0, cast=float)
+# Multi-node sharding: the stream API stores streams in the database and every
+# `manage.py run_stream_node` claims its share through leases renewed by heartbeat
+STREAM_SHARDING = config('STREAM_SHARDING', default=False, cast=bool)
+# Node identity ('' = hostname:pid) and how many streams it may run (also its hashing weight)
+STREAM_NODE_ID = config('STREAM_NODE_ID', default='')
+STREAM_NODE_CAPACITY = config('STREAM_NODE_CAPACITY', default=50, cast=int)
+# A dead node's streams move to other nodes once its leases are this old
+STREAM_LEASE_S = config('STREAM_LEASE_S', default=30.0, cast=float)
+# Live view (/video-stream/<id>/live/): frames kept per stream for viewers, and the
+# frame-rate ceiling per viewer (0 = camera rate); viewers never add camera connections
+STREAM_LIVE_BUFFER_FRAMES = config('STREAM_LIVE_BUFFER_FRAMES', default=4, cast=int)
+STREAM_LIVE_MAX_FPS = config('STREAM_LIVE_MAX_FPS', default=15.0, cast=float)
+# Live viewers admitted per web process (0 = no limit). Each one holds a server thread,
+# so keep this below the gunicorn thread count (GUNICORN_THREADS) to leave room for the API
+STREAM_LIVE_MAX_VIEWERS = config('STREAM_LIVE_MAX_VIEWERS', default=8, cast=int)
+# Adaptive sampling: tune each stream's interval between these bounds from detection latency,
+# queue depth and stream count (AIMD), starting from its frame_interval (False = fixed interval)
+STREAM_ADAPTIVE_SAMPLING = config('STREAM_ADAPTIVE_SAMPLING', default=False, cast=bool)
+STREAM_SAMPLING_MIN_S = config('STREAM_SAMPLING_MIN_S', default=1.0, cast=float)
+STREAM_SAMPLING_MAX_S = config('STREAM_SAMPLING_MAX_S', default=60.0, cast=float)
+# Skip blurred, badly exposed or blocked frames before detection: minimum Laplacian
+# variance, maximum fraction of near-black/near-white pixels, maximum fraction of the
+# road region that is flat and edge-free
+STREAM_QUALITY_GATE = config('STREAM_QUALITY_GATE', default=False, cast=bool)
+STREAM_QUALITY_MIN_SHARPNESS = config('STREAM_QUALITY_MIN_SHARPNESS', default=50.0, cast=float)
+STREAM_QUALITY_MAX_CLIPPED = config('STREAM_QUALITY_MAX_CLIPPED', default=0.65, cast=float)
+STREAM_QUALITY_MAX_OCCLUDED = config('STREAM_QUALITY_MAX_OCCLUDED', default=0.6, cast=float)
+# Skip due frames while the road view is unchanged (vehicle standing still) and sample
+# again on the first frame where more than MIN_CHANGED of the thumbnail pixels moved by
+# more than PIXEL_DELTA grey levels
+STREAM_SCENE_GATE = config('STREAM_SCENE_GATE', default=False, cast=bool)
+STREAM_SCENE_MIN_CHANGED = config('STREAM_SCENE_MIN_CHANGED', default=0.1, cast=float)
+STREAM_SCENE_PIXEL_DELTA = config('STREAM_SCENE_PIXEL_DELTA', default=8.0, cast=float)
+# Distance sampling: one frame per this many metres the streaming device travels (0 = by
+# time), from its GPS fixes polled every STREAM_GPS_POLL_S; back to the time interval
+# while the latest fix is older than STREAM_GPS_STALE_S
+STREAM_SAMPLE_EVERY_M = config('STREAM_SAMPLE_EVERY_M', default=0.0, cast=float)
+STREAM_GPS_STALE_S = config('STREAM_GPS_STALE_S', default=15.0, cast=float)
+STREAM_GPS_POLL_S = config('STREAM_GPS_POLL_S', default=1.0, cast=float)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+MJPEG Parser Benchmark
+Compares the old bytearray FFD8/FFD9 scanning loop with app.utils.mjpeg.MJPEGParser
+on a recorded ESP32-CAM stream, or on a synthetic multipart stream built from
+JPEG files (optionally with an EXIF thumbnail embedded in every frame).
+
+Record a real stream with:
+    curl -s --max-time 30 http://<esp32-ip>:81/stream -o esp32.mjpeg
+"""
+
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.utils.mjpeg import MJPEGParser  # noqa: E402
+
+BOUNDARY = b"123456789000000000000987654321"
+
+
+def with_exif_thumbnail(jpeg: bytes) -> bytes:
+    """Inserts an APP1 segment holding a small JPEG (with its own FFD9) after SOI."""
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(jpeg))
+    img.thumbnail((160, 120))
+    thumb = io.BytesIO()
+    img.convert("RGB").save(thumb, format="JPEG", quality=70)
+    payload = b"Exif\x00\x00" + thumb.getvalue()
+    segment = b"\xff\xe1" + (len(payload) + 2).to_bytes(2, "big") + payload
+    return jpeg[:2] + segment + jpeg[2:]
+
+
+def synth_stream(frames_dir: Path, count: int, exif: bool, content_length: bool):
+    """Returns (stream bytes, set of the frame payloads it contains)."""
+    jpegs = [p.read_bytes() for p in sorted(frames_dir.glob("*.jpg"))]
+    if not jpegs:
+        raise SystemExit(f"No .jpg files in {frames_dir}")
+    if exif:
+        jpegs = [with_exif_thumbnail(j) for j in jpegs]
+
+    out = bytearray()
+    for i in range(count):
+        jpeg = jpegs[i % len(jpegs)]
+        out += b"--" + BOUNDARY + b"\r\nContent-Type: image/jpeg\r\n"
+        if content_length:
+            out += b"Content-Length: " + str(len(jpeg)).encode() + b"\r\n"
+        out += b"\r\n" + jpeg + b"\r\n"
+    return bytes(out), set(jpegs)
+
+
+def iter_chunks(data: bytes, chunk_size: int):
+    for i in range(0, len(data), chunk_size):
+        yield data[i:i + chunk_size]
+
+
+def legacy_parse(data: bytes, chunk_size: int, on_frame=None) -> int:
+    """The capture loop as it was: extend, find FFD8, find the first FFD9, slice, delete."""
+    frames = 0
+    buffer = bytearray()
+    for chunk in iter_chunks(data, chunk_size):
+        buffer.extend(chunk)
+        while True:
+            start = buffer.find(b"\xff\xd8")
+            if start == -1:
+                if len(buffer) > 0:
+                    last_byte = buffer[-1:]
+                    buffer.clear()
+                    if last_byte == b"\xff":
+                        buffer.extend(last_byte)
+                break
+            if start > 0:
+                del buffer[:start]
+            end = buffer.find(b"\xff\xd9", 2)
+            if end == -1:
+                break
+            jpg_data = buffer[:end + 2]
+            del buffer[:end + 2]
+            frames += 1
+            if on_frame is not None:
+                on_frame(jpg_data)
+    return frames
+
+
+def parser_parse(data: bytes, chunk_size: int, boundary, on_frame=None) -> int:
+    parser = MJPEGParser(boundary=boundary, read_size=chunk_size)
+    frames = 0
+    for view in parser.iter_frames(io.BytesIO(data)):
+        frames += 1
+        if on_frame is not None:
+            on_frame(view)
+    return frames
+
+
+def count_intact(parse, expected: set) -> int:
+    intact = 0
+
+    def check(frame):
+        nonlocal intact
+        intact += bytes(frame) in expected
+
+    parse(check)
+    return intact
+
+
+def run(name, fn, data, repeat):
+    best = float("inf")
+    frames = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        frames = fn()
+        best = min(best, time.perf_counter() - t0)
+    mb_s = len(data) / best / 1e6
+    print(f"  {name:<22} {frames:>6} frames  {best * 1000:8.1f} ms  {mb_s:8.1f} MB/s  {frames / best:9.0f} frames/s")
+    return frames
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark MJPEG frame extraction")
+    ap.add_argument("--input", help="Recorded multipart MJPEG stream (e.g. from curl)")
+    ap.add_argument("--boundary", help="Multipart boundary of --input (default: read from the first line)")
+    ap.add_argument("--frames-dir", default="temp_frames", help="JPEGs used to synthesise a stream")
+    ap.add_argument("--count", type=int, default=500, help="Frames in the synthetic stream")
+    ap.add_argument("--exif", action="store_true", help="Embed an EXIF thumbnail in every synthetic frame")
+    ap.add_argument("--no-content-length", action="store_true", help="Omit Content-Length part headers")
+    ap.add_argument("--chunk-size", type=int, default=4096, help="Bytes per network read")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    if args.input:
+        data = Path(args.input).read_bytes()
+        boundary = args.boundary.encode() if args.boundary else None
+        if boundary is None and data.startswith(b"--"):
+            boundary = data[2:data.index(b"\r\n")].strip()
+        source = args.input
+        expected = None
+    else:
+        data, expected = synth_stream(Path(args.frames_dir), args.count, args.exif, not args.no_content_length)
+        boundary = BOUNDARY
+        source = f"synthetic ({args.count} frames{', EXIF thumbnails' if args.exif else ''})"
+
+    print(f"\n📊 {source}: {len(data) / 1e6:.1f} MB, {args.chunk_size} B reads")
+    run("legacy FFD8/FFD9 loop", lambda: legacy_parse(data, args.chunk_size), data, args.repeat)
+    run("MJPEGParser", lambda: parser_parse(data, args.chunk_size, boundary), data, args.repeat)
+    run("MJPEGParser (bare)", lambda: parser_parse(data, args.chunk_size, None), data, args.repeat)
+
+    if expected is not None:
+        # A frame cut at an embedded thumbnail's FFD9 still counts as a "frame" above
+        print("\n🔍 Intact frames (byte-identical to the source JPEG):")
+        print(f"  legacy FFD8/FFD9 loop  {count_intact(lambda cb: legacy_parse(data, args.chunk_size, cb), expected)}")
+        print(f"  MJPEGParser            {count_intact(lambda cb: parser_parse(data, args.chunk_size, boundary, cb), expected)}")
+        print(f"  MJPEGParser (bare)     {count_intact(lambda cb: parser_parse(data, args.chunk_size, None, cb), expected)}")
+
+
+if __name__ == "__main__":
+    main()